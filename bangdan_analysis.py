@@ -57,11 +57,25 @@ cards 仅考虑card_type == 11的内容，是实际展示的榜单
 
 import os
 import re
+import csv
 import json
+import shutil
+import argparse
+from collections import defaultdict
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from configs.configs import *
-from utils.utils import extract_7z_files, REAR_KEYWORDS
+import pandas as pd
+
+from utils.utils import extract_7z_files, atomic_write_parquet, KeywordMatcher, REAR_KEYWORDS
+
+# 外层json中的type字段（"type":"1" 或 "type":1），前面不能是反斜杠，以免匹配到内层转义的json
+TYPE_PATTERN = re.compile(r'(?<!\\)"type"\s*:\s*"?(\w+)"?')
+HOT_PATTERN = re.compile(r"\d+")
+
+WORKING_DIR = "bangdan_working_data"
+SHARD_DIR = f"{WORKING_DIR}/shards"
 
 
 def get_bangdan_files_dir(year):
@@ -82,6 +96,39 @@ def unzip_all_bangdan_files():
         extract_7z_files(source_folder=bangdan_files_dir, target_folder=unzipped_dir)
 
 
+class TopicTracker(object):
+    """
+    流式维护一天中每个话题的生命周期状态：首次/末次上榜时间、最高热度、最好排名、上榜快照数
+    """
+
+    COLUMNS = ["text", "date", "first_seen", "last_seen", "peak_hot", "peak_rank", "n_snapshots", "rear"]
+
+    def __init__(self):
+        # text -> [first_seen, last_seen, peak_hot, peak_rank, n_snapshots, rear]
+        self.states = {}
+
+    def update(self, crawler_time_stamp, text, hot, rank, rear):
+        timestamp = int(crawler_time_stamp)
+        hot = int(hot) if hot else None
+        state = self.states.get(text)
+        if state is None:
+            self.states[text] = [timestamp, timestamp, hot, rank, 1, rear]
+            return
+        state[0] = min(state[0], timestamp)
+        state[1] = max(state[1], timestamp)
+        if hot is not None and (state[2] is None or hot > state[2]):
+            state[2] = hot
+        state[3] = min(state[3], rank)
+        state[4] += 1
+
+    def to_frame(self, date_str):
+        df = pd.DataFrame(
+            [[text, date_str] + state for text, state in self.states.items()], columns=self.COLUMNS
+        )
+        df["peak_hot"] = df["peak_hot"].astype("Int64")
+        return df
+
+
 class BangdanAnalyzer(object):
 
     def __init__(
@@ -92,111 +139,248 @@ class BangdanAnalyzer(object):
         self.year = year
         self.data_dir = get_bangdan_unzipped_files_dir(year)
         self.bangdan_type = "1"
-        self.rear_pattern = "|".join([f"{''.join([f'(?=.*{word})' for word in keyword.split('&')])}" for keyword in REAR_KEYWORDS])
+        self.rear_matcher = KeywordMatcher({"rear": REAR_KEYWORDS})
     
     
     def get_file_path(self, date: str = None):
         # date should be yyyy-mm-dd format
         return os.path.join(self.data_dir, f"weibo_bangdan.{date}")
 
-    def get_bangdan_text_from_file(self, file_path: str, date: str):
+    def get_snapshot_type(self, raw_json: str):
         """
-        一行bangdan信息的格式：timestamp,date,text,hot,rear
-        例如：1111111111,2022-01-01,这是一个热搜话题,10000000,100
+        不解码整行，直接取外层json的type字段
+        内层bangdan是转义后的字符串，其中的引号前有反斜杠，不会被误匹配
+        匹配失败时返回None，由调用方退回到完整解码
         """
+        match = TYPE_PATTERN.search(raw_json)
+        return match.group(1) if match is not None else None
 
-        bangdan_text_list = []
-        
-        # 考虑file path是否存在
-        if not os.path.exists(file_path):
-            print(f"File not exists: {file_path}")
-            return None
+    def iter_bangdan_snapshots(self, file_path: str):
+        """
+        流式读取一个bangdan文件，只对实时榜（type == self.bangdan_type）的行做完整解码
+        产出 (crawler_time_stamp, bangdan内层dict)
+        """
         with open(file_path, "r", errors="replace") as rfile:
-            for line in rfile.readlines():
-                line = line.strip()
-                line_data = line.split("\t")
+            for line in rfile:
+                line_data = line.strip().split("\t", 1)
                 if len(line_data) < 2:
                     print("line data cannot be splitted")
                     continue
+                raw_json = line_data[1]
+                snapshot_type = self.get_snapshot_type(raw_json)
+                if snapshot_type is not None and snapshot_type != self.bangdan_type:
+                    # 排除不允许的榜单类型
+                    # 不是实时榜
+                    continue
                 try:
-                    data = json.loads(line_data[1])
+                    data = json.loads(raw_json)
                 except json.JSONDecodeError as e:
                     print(f"JSONDecodeError: {e}")
                     # 打印出错误位置
                     print(f"Error at line {e.lineno}, column {e.colno}")
                     # 打印出错误字符位置
-                    print(f"Error at character {e.pos}, {line_data[1][int(e.pos)-20: int(e.pos)+20]}")
+                    print(f"Error at character {e.pos}, {raw_json[int(e.pos)-20: int(e.pos)+20]}")
                     continue
-                crawler_time_stamp = data["crawler_time_stamp"]
                 if data["type"] != self.bangdan_type:
-                    # print(f"wrong data type: {data['type']}")
-                    # 排除不允许的榜单类型
-                    # 不是实时榜
                     continue
-                data = json.loads(data["bangdan"])
-                if type(data) is not dict:
+                try:
+                    bangdan = json.loads(data["bangdan"])
+                except (json.JSONDecodeError, TypeError) as e:
+                    print(f"bad bangdan payload in file {file_path}: {e}")
+                    continue
+                if type(bangdan) is not dict:
                     print(f"bad data type")
-                    print(data)
+                    print(bangdan)
                     continue
-                if "cards" not in data.keys() or data["cards"] is None:
-                    print(f"bad data type in file {file_path}")
+                yield data["crawler_time_stamp"], bangdan
+
+    def iter_bangdan_topics(self, file_path: str):
+        """
+        只遍历 cards[card_type==11].card_group[card_type==4]
+        产出 (crawler_time_stamp, text, hot, rank)，hot缺失时为空字符串或None
+        rank 为话题在这次快照榜单中的位置（从1开始）
+        """
+        for crawler_time_stamp, bangdan in self.iter_bangdan_snapshots(file_path):
+            cards = bangdan.get("cards")
+            if cards is None:
+                print(f"bad data type in file {file_path}")
+                continue
+            rank = 0
+            for card in cards:
+                if str(card.get("card_type")) != "11":
                     continue
-                for card in data["cards"]:
-                    if str(card["card_type"]) != "11":
+                for s_card in card.get("card_group") or []:
+                    if str(s_card.get("card_type")) != "4":
+                        continue
+                    rank += 1
+                    text = s_card.get("desc")
+                    if text is None:
+                        print(f"desc not in keys! file_name {file_path}, data: {s_card}")
+                        continue
+                    if len(text) <= 5:
+                        # 太短的话题丢掉
                         continue
-                    card_group = card["card_group"]
-                    for s_card in card_group:
-                        if str(s_card["card_type"]) != "4":
-                            continue
-                        if "desc" in s_card.keys():
-                            text = s_card["desc"]
-                            if len(text) <= 5:
-                                # 太短的话题丢掉
-                                continue
-
-                            hot = ""
-                            if "desc_extr" in s_card.keys():
-                            # 讨论小于10w的丢掉
-                            # print(s_card["desc_extr"])
-                                hot_number = re.findall(r'\d+', str(s_card["desc_extr"]))
-                                hot = hot_number[0] if len(hot_number) > 0 else None
-                            
-                            is_rear = 1 if re.search(self.rear_pattern, text) is not None else 0
-                                
-
-                            bangdan_text_list.append(f"{crawler_time_stamp},{date},{text},{hot},{is_rear}")
-
-                        else:
-                            print(f"desc not in keys! file_name {file_path}, data: {s_card}")
+
+                    hot = ""
+                    if "desc_extr" in s_card:
+                        hot_number = HOT_PATTERN.search(str(s_card["desc_extr"]))
+                        hot = hot_number.group(0) if hot_number is not None else None
+                    yield crawler_time_stamp, text, hot, rank
+
+    def get_bangdan_text_from_file(self, file_path: str, date: str, tracker=None):
+        """
+        一行bangdan信息的格式：timestamp,date,text,hot,rear
+        例如：1111111111,2022-01-01,这是一个热搜话题,10000000,100
+        返回行的列表，每行为 [timestamp, date, text, hot, rear]，写出时由csv模块负责引号转义
+        tracker 不为None时（TopicTracker），在同一次遍历中更新每个话题的生命周期状态
+        """
+
+        bangdan_text_list = []
+        
+        # 考虑file path是否存在
+        if not os.path.exists(file_path):
+            print(f"File not exists: {file_path}")
+            return None
+        for crawler_time_stamp, text, hot, rank in self.iter_bangdan_topics(file_path):
+            is_rear = 1 if self.rear_matcher.search(text, "rear") else 0
+            bangdan_text_list.append([crawler_time_stamp, date, text, hot, is_rear])
+            if tracker is not None:
+                tracker.update(crawler_time_stamp, text, hot, rank, is_rear)
         return bangdan_text_list
-    
 
+    def get_date_range(self):
+        # 遍历self.year的一整年的每一天，包括闰年的12月31日
+        start_date = datetime(self.year, 1, 1)
+        end_date = datetime(self.year, 12, 31)
+        return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
-    def analyze(self):
-        # 遍历self.year的一整年的每一天 (通过datetime)
-        for date in [datetime(self.year, 1, 1) + timedelta(days=i) for i in range(365)]:
+    def extract_day(self, date_str: str):
+        """
+        解析一天的榜单并写入 bangdan_working_data/shards/{date}.csv，同时写入话题生命周期分片 {date}_topics.parquet
+        先写临时文件再rename，中途崩溃不会留下半个分片
+        返回写入的行数，文件不存在时返回None
+        """
+        file_path = self.get_file_path(date_str)
+        tracker = TopicTracker()
+        bangdan_text_list = self.get_bangdan_text_from_file(file_path, date_str, tracker)
+        if bangdan_text_list is None:
+            return None
+        atomic_write_parquet(tracker.to_frame(date_str), get_topic_shard_path(date_str))
+        write_csv_atomic(get_shard_path(date_str), bangdan_text_list)
+        return len(bangdan_text_list)
+
+    def merge_month(self, month_str: str, dates: list):
+        """
+        将一个月的日分片按日期顺序合并为 bangdan_working_data/{month}.csv（无标题行）
+        合并结果先写临时文件再rename，重复运行得到相同的文件
+        """
+        shard_paths = [get_shard_path(date_str) for date_str in dates if os.path.exists(get_shard_path(date_str))]
+        if not shard_paths:
+            return
+        month_path = f"{WORKING_DIR}/{month_str}.csv"
+        tmp_path = f"{month_path}.tmp"
+        with open(tmp_path, "wb") as wfile:
+            for shard_path in shard_paths:
+                with open(shard_path, "rb") as rfile:
+                    shutil.copyfileobj(rfile, wfile)
+        os.replace(tmp_path, month_path)
+        print(f"merged {len(shard_paths)} days into {month_path}")
+
+    def analyze(self, workers: int = 4, overwrite: bool = False):
+        """
+        多进程逐日解析，每天一个分片；已有分片的日期默认跳过（overwrite=True时重新解析）
+        全部完成后按月合并，话题生命周期分片合并为 topics_{year}.parquet
+        """
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        month_dates = defaultdict(list)
+        todo_dates = []
+        for date in self.get_date_range():
             date_str = date.strftime("%Y-%m-%d")
-            month_str = date.strftime("%Y-%m")
-            file_path = self.get_file_path(date_str)
-            if not os.path.exists(file_path):
-                print(f"File not exists: {file_path}")
+            month_dates[date.strftime("%Y-%m")].append(date_str)
+            if not overwrite and os.path.exists(get_shard_path(date_str)) and os.path.exists(get_topic_shard_path(date_str)):
                 continue
-            bangdan_text_list = self.get_bangdan_text_from_file(file_path, date_str)
-            if bangdan_text_list is None:
+            if not os.path.exists(self.get_file_path(date_str)):
+                print(f"File not exists: {self.get_file_path(date_str)}")
                 continue
-            with open(f"bangdan_working_data/{month_str}.csv", "a") as wfile:
-                wfile.write("\n".join(bangdan_text_list))
-                wfile.write("\n")
-            print(f"processed {date_str} in year {self.year}")
+            todo_dates.append(date_str)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(extract_bangdan_day, self.year, date_str): date_str for date_str in todo_dates}
+            for future in as_completed(futures):
+                date_str = futures[future]
+                try:
+                    row_count = future.result()
+                except Exception as e:
+                    print(f"failed {date_str} in year {self.year}: {e}")
+                    continue
+                print(f"processed {date_str} in year {self.year}, {row_count} rows")
+
+        for month_str, dates in month_dates.items():
+            self.merge_month(month_str, dates)
+        merge_topics(self.year, [d for dates in month_dates.values() for d in dates])
+
+
+def get_shard_path(date_str):
+    return f"{SHARD_DIR}/{date_str}.csv"
+
+
+def get_topic_shard_path(date_str):
+    return f"{SHARD_DIR}/{date_str}_topics.parquet"
+
+
+def get_topics_table_path(year):
+    return f"{WORKING_DIR}/topics_{year}.parquet"
+
+
+def merge_topics(year, dates):
+    """
+    把一年的话题日分片合并为 bangdan_working_data/topics_{year}.parquet，每个话题一行：
+    text, first_date, last_date, first_seen, last_seen, peak_hot, peak_rank, n_snapshots, n_days, rear
+    first_seen / last_seen 为毫秒时间戳，peak_rank 为最好（最小）的排名
+    这是按年汇总的生命周期摘要，一年内多次上榜的话题只有一行；检索窗口用榜单表的逐日记录划分（见 get_text_from_bangdan）
+    """
+    shard_paths = [get_topic_shard_path(d) for d in dates if os.path.exists(get_topic_shard_path(d))]
+    if not shard_paths:
+        return None
+    df = pd.concat([pd.read_parquet(path) for path in shard_paths], ignore_index=True)
+    topics = df.groupby("text").agg(
+        first_date=("date", "min"),
+        last_date=("date", "max"),
+        first_seen=("first_seen", "min"),
+        last_seen=("last_seen", "max"),
+        peak_hot=("peak_hot", "max"),
+        peak_rank=("peak_rank", "min"),
+        n_snapshots=("n_snapshots", "sum"),
+        n_days=("date", "nunique"),
+        rear=("rear", "max"),
+    ).reset_index()
+    atomic_write_parquet(topics, get_topics_table_path(year))
+    print(f"merged {len(shard_paths)} days into {get_topics_table_path(year)}, {len(topics)} topics")
+    return topics
+
+
+def write_csv_atomic(file_path, rows):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", newline="") as wfile:
+        csv.writer(wfile).writerows(rows)
+    os.replace(tmp_path, file_path)
+
+
+def extract_bangdan_day(year, date_str):
+    # 子进程入口，每个进程各自构建analyzer
+    return BangdanAnalyzer(year=year).extract_day(date_str)
 
 
 if __name__ == "__main__":
     # unzip_all_bangdan_files()
-    for year in ANALYSIS_YEARS:
-        # if year in [2020, 2021]:
-        #     continue
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=ANALYSIS_YEARS)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+    for year in args.years:
         print(f"\n\nprocessing year-{year}")
         analyzer = BangdanAnalyzer(
             year=year,
         )
-        analyzer.analyze()
+        analyzer.analyze(workers=args.workers, overwrite=args.overwrite)
@@ -5,155 +5,113 @@
 单行格式为timestamp,date,text,hot,rear
 需要处理为每个月rear为1的proportion，绘制一个趋势图
 """
-import os
-
-from collections import defaultdict
-from datetime import datetime
+import argparse
 
 from matplotlib import pyplot as plt
 import pandas as pd
 
 import seaborn as sns
 
+from bangdan_table import load_bangdan_table
+from utils.figures import FigureJob, render_figures
 
-# 预处理，处理文件中的格式问题
-# for year in ["2019", "2020", "2021", "2022", "2023"]:
-#     for month in range(1, 13):
-#         month_str = f"{year}-{month:02d}"
-#         file_path = f"bangdan_working_data/{month_str}.csv"
-#         if not os.path.exists(file_path):
-#             continue
-#         print(f"cleaning {file_path}")
-
-#         # 遍历每一行，如果这一行用,split之后的长度不是5，则需要做处理（这一行是两行，多于5个元素是忘记换行的结果）
-#         result = []
-#         with open(file_path, "r") as rfile:
-#             for line in rfile:
-#                 line = line.strip()
-#                 if len(line.split(",")) != 5:
-#                     if len(line.split(",")) == 9:
-#                         # 这一行是两行，多于5个元素是忘记换行的结果, 第五个元素的第一个数字是上一行的最后一个元素，后面是下一行的第一个元素
-#                         line_data = line.split(",")
-#                         new_line_data = line_data[:5]
-#                         new_line_data[4] = new_line_data[4][0]
-#                         result.append(",".join(new_line_data))
-#                         new_line_data = line_data[4:]
-#                         new_line_data[0] = new_line_data[0][1:]
-#                         result.append(",".join(new_line_data))
-#                 else:
-#                     result.append(line)
-        
-#         with open(file_path, "w") as wfile:
-#             wfile.write("\n".join(result))
-#             wfile.write("\n")
 
-data_mode = "_strict2"
+# 月度文件由 bangdan_analysis.py 按日分片后原子合并，并使用csv引号转义，不再需要手工修复格式
 
-def run(mode, cutoff, timewindow):
-    month_rear_proportion = defaultdict(float)
+data_mode = "_strict2"
 
-    month_rear_and_no_rear_data = {
-        "month": [],
-        "rear": [],
-        "total": [],
-        "propotion": []
+# 各时间窗口需要去除的异常时段
+EXCLUDED_PERIODS = {
+    "month": ["2020-09", "2020-10"],  # 去除异常低值
+    "season": ["2023-10-12"],
+    "year": [],
+}
+
+
+def get_cutoff_label(cutoff):
+    return cutoff if cutoff is not None else 'nocutoff'
+
+
+def aggregate_rear_proportion(bangdan_df, cutoffs=(None,)):
+    """
+    一次groupby计算所有 mode × cutoff × timewindow 的rear数量与总量
+
+    additive：rear为rear=1的行数，total为行数
+    weighted：每个月每个话题只保留hot最大的一行（is_top），rear为rear=1的行的hot之和，total为hot之和
+    cutoff不为None时只保留hot >= cutoff的行
+
+    返回整理好的长表，列为 mode, cutoff, timewindow, period, rear, total, proportion
+    """
+    has_hot = bangdan_df["hot"].notna()
+    hot = bangdan_df["hot"].fillna(0).astype("int64")
+    rear = bangdan_df["rear"].astype("int64")
+
+    # 每行对每个组合的贡献，按月求和后再汇总到季度、年
+    contributions = {}
+    for cutoff in cutoffs:
+        keep = has_hot & (hot >= cutoff) if cutoff is not None else pd.Series(True, index=bangdan_df.index)
+        top = keep & bangdan_df["is_top"]
+        label = get_cutoff_label(cutoff)
+        contributions[("additive", label, "rear")] = rear * keep
+        contributions[("additive", label, "total")] = keep.astype("int64")
+        contributions[("weighted", label, "rear")] = rear * hot * top
+        contributions[("weighted", label, "total")] = hot * top
+    contributions = pd.DataFrame(contributions)
+    contributions.columns.names = ["mode", "cutoff", "measure"]
+
+    monthly = contributions.groupby(bangdan_df["month"]).sum()
+    month_to_season = bangdan_df[["month", "season"]].drop_duplicates().set_index("month")["season"]
+    window_frames = {
+        "month": monthly,
+        # sort=False 保持时间顺序（季度标签按字符串排序会把10-12排到4-6之前）
+        "season": monthly.groupby(month_to_season.reindex(monthly.index).values, sort=False).sum(),
+        "year": monthly.groupby(monthly.index.str[:4]).sum(),
     }
 
-    season_data = defaultdict(lambda: defaultdict(int))
-    year_data = defaultdict(lambda: defaultdict(int))
-
-    total_data = 0
-    with_hot_data = 0
-
-    for year in ["2019", "2020", "2021", "2022", "2023"]:
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}"
-            
-            season_map = {
-                0: "1-3",
-                1: "4-6",
-                2: "7-9",
-                3: "10-12"
-            }
-            season = season_map[(month - 1) // 3]
-
-            file_path = f"bangdan_working_data/{month_str}{data_mode}.csv"
-            if not os.path.exists(file_path):
-                continue
-            print(f"processing {file_path}")
-
-            # 用pandas读取df，手动指定列明
-            df = pd.read_csv(file_path)
-            
-            # total data记录数据总行数
-            total_data += len(df)
-            
-            if mode == "weighted":
-                df.dropna(subset=["hot"], how="any", inplace=True)
-                df["hot"] = df["hot"].astype(int)
-                # with hot data记录有hot数据的行数
-                with_hot_data += len(df)
-
-                df = df.loc[df.groupby('text')['hot'].idxmax()]
-            if cutoff is not None:
-                df.dropna(subset=["hot"], how="any", inplace=True)
-                df["hot"] = df["hot"].astype(int)
-                df = df[df["hot"] >= cutoff]
-
-            rear_count = df["rear"].sum()
-            total_count = len(df)
-
-            if mode == "weighted":
-                # 用hot的值作为权重, rear count为rear为1的行的hot的和，totalcount为hot的和
-                df["rear"] = df["rear"].astype(int)
-                # rear count为rear为1的行的hot的和
-                rear_count = (df["rear"] * df["hot"]).sum()
-                # totalcount为hot的和
-                total_count = df["hot"].sum()
-
-            if timewindow == "month":
-                if year == "2020" and month in [9, 10]:
-                    # 去除异常低值
-                    continue
-                month_rear_proportion[month_str] = rear_count / total_count if total_count > 0 else 0
-
-                month_rear_and_no_rear_data["month"].append(month_str)
-                month_rear_and_no_rear_data["rear"].append(rear_count)
-                month_rear_and_no_rear_data["total"].append(total_count)
-            elif timewindow == "season":
-                if year == "2023" and season == "10-12":
-                    continue
-                season_data[f"{year}-{season}"]["rear"] += rear_count
-                season_data[f"{year}-{season}"]["total"] += total_count
-            elif timewindow == "year":
-                year_data[year]["rear"] += rear_count
-                year_data[year]["total"] += total_count
-
-    if timewindow == "season":
-        for season, data in season_data.items():
-            month_rear_proportion[season] = data["rear"] / data["total"] if data["total"] > 0 else 0
-            month_rear_and_no_rear_data["month"].append(season)
-            month_rear_and_no_rear_data["rear"].append(data["rear"])
-            month_rear_and_no_rear_data["total"].append(data["total"])
-                
-    elif timewindow == "year":
-        for year, data in year_data.items():
-            month_rear_proportion[year] = data["rear"] / data["total"] if data["total"] > 0 else 0
-            month_rear_and_no_rear_data["month"].append(year)
-            month_rear_and_no_rear_data["rear"].append(data["rear"])
-            month_rear_and_no_rear_data["total"].append(data["total"])
-            month_rear_and_no_rear_data["propotion"].append(data["rear"] / data["total"] if data["total"] > 0 else 0)
-    
-    
-    # 用一个dataframe存储proportion数据
-    month_rear_proportion = pd.DataFrame.from_dict(month_rear_proportion, orient="index", columns=["proportion"])
+    tidy_list = []
+    for timewindow, frame in window_frames.items():
+        frame = frame[~frame.index.isin(EXCLUDED_PERIODS[timewindow])]
+        frame.index.name = "period"
+        tidy = frame.stack(level=["mode", "cutoff"]).reset_index()
+        tidy["timewindow"] = timewindow
+        tidy_list.append(tidy)
+    tidy = pd.concat(tidy_list, ignore_index=True)
+    tidy["proportion"] = (tidy["rear"] / tidy["total"]).where(tidy["total"] > 0, 0)
+    return tidy[["mode", "cutoff", "timewindow", "period", "rear", "total", "proportion"]]
+
+
+def run(mode, cutoff, timewindow, rear_proportion_df):
+    """
+    rear_proportion_df 为 aggregate_rear_proportion 的结果，从中取出一个组合输出表格
+    返回折线图的 FigureJob
+    """
+    cutoff_label = get_cutoff_label(cutoff)
+    data = rear_proportion_df[
+        (rear_proportion_df["mode"] == mode)
+        & (rear_proportion_df["cutoff"] == cutoff_label)
+        & (rear_proportion_df["timewindow"] == timewindow)
+    ]
 
     # 存储month_rear_and_no_rear_data excel
-    month_rear_and_no_rear_data = pd.DataFrame.from_dict(month_rear_and_no_rear_data)
-    month_rear_and_no_rear_data.to_excel(f"month_rear_and_no_rear_data_{mode}_{timewindow}_{cutoff if cutoff is not None else 'nocutoff'}.xlsx")
-    # 折线图-proportion的变化
-    sns.set(style="ticks")
+    month_rear_and_no_rear_data = data[["period", "rear", "total", "proportion"]].rename(
+        columns={"period": "month", "proportion": "propotion"}
+    ).reset_index(drop=True)
+    month_rear_and_no_rear_data.to_excel(f"month_rear_and_no_rear_data_{mode}_{timewindow}_{cutoff_label}.xlsx")
+
+    # 用一个dataframe存储proportion数据
+    month_rear_proportion = data.set_index("period")[["proportion"]]
+
+    # 折线图-proportion的变化，由 render_figures 统一渲染
+    return FigureJob(
+        render=plot_rear_proportion,
+        data=month_rear_proportion,
+        output_path=f"img{data_mode}/rear_proportion_trend_{mode}_{timewindow}_{cutoff_label}.pdf",
+        kwargs={"timewindow": timewindow},
+        style="ticks",
+    )
+
 
+def plot_rear_proportion(month_rear_proportion, output_path, timewindow):
     plt.figure(figsize=(10, 6))
     sns.lineplot(data=month_rear_proportion, marker="o", linewidth=4, alpha=1)
     # sns.regplot(data=month_rear_proportion, scatter=False, color=sns.color_palette()[0], line_kws={"linestyle": "--", "linewidth": 2, "alpha": 0.3}, ci=None)
@@ -164,11 +122,7 @@ def run(mode, cutoff, timewindow):
     plt.xticks(rotation=45)
     plt.tight_layout()
 
-    if os.path.exists(f"img{data_mode}") is False:
-        os.mkdir(f"img{data_mode}")
-
-    plt.savefig(f"img{data_mode}/rear_proportion_trend_{mode}_{timewindow}_{cutoff if cutoff is not None else 'nocutoff'}.pdf", format="pdf")
-
+    plt.savefig(output_path, format="pdf")
 
     # 用同一个坐标中的两个面积图展示rear和no rear的数量
     # plt.figure(figsize=(10, 6))
@@ -180,20 +134,29 @@ def run(mode, cutoff, timewindow):
     # plt.legend(["Rear", "No Rear"])
     # plt.grid()
     # plt.tight_layout()
-    # plt.savefig(f"img{data_mode}/rear_and_no_rear_trend_{mode}_{timewindow}_{cutoff if cutoff is not None else 'nocutoff'}.pdf", format="pdf")
-
-    # 打印hot缺失值比例
-    print(f"hot缺失值比例: {1 - with_hot_data / total_data}")
+    # plt.savefig(f"img{data_mode}/rear_and_no_rear_trend_{mode}_{timewindow}_{cutoff_label}.pdf", format="pdf")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--force", action="store_true", help="忽略图表缓存全部重画")
+    args = parser.parse_args()
+
     mode = ["additive", "weighted"]
     # mode = ["weighted"]
     cutoff = [None]
     # cutoff = [None, 100000, 500000]
     timewindow = ["month", "season", "year"]
     timewindow = ["year"]
+    bangdan_df = load_bangdan_table(data_mode)
+    # 打印hot缺失值比例
+    print(f"hot缺失值比例: {bangdan_df['hot'].isna().mean()}")
+
+    rear_proportion_df = aggregate_rear_proportion(bangdan_df, cutoff)
+    rear_proportion_df.to_csv(f"rear_proportion{data_mode}.csv", index=False)
+    jobs = []
     for m in mode:
         for c in cutoff:
             for t in timewindow:
-                run(m, c, t)
+                jobs.append(run(m, c, t, rear_proportion_df))
+    render_figures(jobs, force=args.force)
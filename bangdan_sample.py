@@ -1,36 +1,25 @@
-import os
-
 import pandas as pd
 
+from bangdan_table import load_bangdan_table, COLUMNS
+
 all_rear_df = []
 sampled_rear_df = []
 
-for year in ["2019", "2020", "2021", "2022", "2023"]:
-    for month in range(1, 13):
-        month_str = f"{year}-{month:02d}"
-
-        file_path = f"bangdan_working_data/{month_str}.csv"
-        if not os.path.exists(file_path):
-            continue
-        print(f"processing {file_path}")
-
-        # 用pandas读取df，手动指定列明
-        df = pd.read_csv(file_path, header=None, names=["timestamp", "date", "text", "hot", "rear"])
-        df["rear"] = df["rear"].astype(int)
-        df = df[df["rear"] == 1]
+# 原始月度文件（bangdan_working_data/{month}.csv）合并后的表
+bangdan_df = load_bangdan_table(data_mode="")
 
-        # 去除hot缺失的行
-        df.dropna(subset=["hot"], how="any", inplace=True)
-        df["hot"] = df["hot"].astype(int)
+# 只保留rear为1、且是当月该话题hot最大的一行（hot缺失的行已排除）
+rear_df = bangdan_df[(bangdan_df["rear"] == 1) & bangdan_df["is_top"]]
 
-        #根据text列进行去重，保留hot最大的一行
-        df = df.loc[df.groupby('text')['hot'].idxmax()]
+for month_str, df in rear_df.groupby("month", sort=True):
+    print(f"processing {month_str}")
+    df = df[COLUMNS]
 
-        all_rear_df.append(df)
+    all_rear_df.append(df)
 
-        # 从df中随机抽取10条数据，考虑到不足10的情况
-        sampled_df = df.sample(n=10, replace=True) if len(df) >= 10 else df.sample(n=len(df), replace=True)
-        sampled_rear_df.append(sampled_df)
+    # 从df中随机抽取10条数据，考虑到不足10的情况
+    sampled_df = df.sample(n=10, replace=True) if len(df) >= 10 else df.sample(n=len(df), replace=True)
+    sampled_rear_df.append(sampled_df)
 
 
 all_rear_df = pd.concat(all_rear_df)
@@ -41,4 +30,4 @@ print(len(all_rear_df))
 print(len(sampled_rear_df))
 
 all_rear_df.to_csv("all_rear_data.csv", index=False)
-sampled_rear_df.to_csv("sampled_rear_data.csv", index=False)
\ No newline at end of file
+sampled_rear_df.to_csv("sampled_rear_data.csv", index=False)
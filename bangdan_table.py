@@ -0,0 +1,109 @@
+"""
+把 bangdan_working_data 中的月度榜单文件合并为一张带类型的 parquet 表，供各分析脚本共用
+
+输入：bangdan_working_data/{yyyy-mm}{data_mode}.csv
+- data_mode == "" 为 bangdan_analysis.py 的原始输出，无标题行
+- data_mode == "_strict2" 等为清洗后的文件，有标题行
+
+输出：bangdan_working_data/bangdan{data_mode}.parquet
+列：timestamp, date, text, hot, rear, month, season, year, is_top
+- hot 为可空整数，缺失为 <NA>
+- month 为 yyyy-mm，season 为 yyyy-1-3 这样的季度标签，year 为 yyyy（均为字符串）
+- is_top 标记同一月份内同一话题 hot 最大的一行（只在 hot 非空的行中选），
+  等价于此前各脚本中的 df.loc[df.groupby('text')['hot'].idxmax()]
+"""
+
+import os
+import argparse
+
+import pandas as pd
+
+WORKING_DIR = "bangdan_working_data"
+YEARS = ["2019", "2020", "2021", "2022", "2023"]
+COLUMNS = ["timestamp", "date", "text", "hot", "rear"]
+
+SEASON_MAP = {
+    0: "1-3",
+    1: "4-6",
+    2: "7-9",
+    3: "10-12"
+}
+
+
+def get_table_path(data_mode="_strict2"):
+    return f"{WORKING_DIR}/bangdan{data_mode}.parquet"
+
+
+def get_month_files(data_mode="_strict2"):
+    """返回存在的 (month_str, file_path) 列表，按月份排序"""
+    month_files = []
+    for year in YEARS:
+        for month in range(1, 13):
+            month_str = f"{year}-{month:02d}"
+            file_path = f"{WORKING_DIR}/{month_str}{data_mode}.csv"
+            if os.path.exists(file_path):
+                month_files.append((month_str, file_path))
+    return month_files
+
+
+def read_month_file(file_path, data_mode="_strict2"):
+    if data_mode == "":
+        # 原始输出没有标题行，手动指定列名
+        return pd.read_csv(file_path, header=None, names=COLUMNS)
+    return pd.read_csv(file_path)[COLUMNS]
+
+
+def build_bangdan_table(data_mode="_strict2"):
+    """读取所有月度文件一次，生成带类型和时间窗口列的表并写入parquet"""
+    df_list = []
+    for month_str, file_path in get_month_files(data_mode):
+        print(f"processing {file_path}")
+        df = read_month_file(file_path, data_mode)
+        df["month"] = month_str
+        df_list.append(df)
+    df = pd.concat(df_list, ignore_index=True)
+
+    df["timestamp"] = pd.to_numeric(df["timestamp"], errors="coerce").astype("Int64")
+    df["date"] = df["date"].astype(str)
+    df["text"] = df["text"].astype(str)
+    df["hot"] = pd.to_numeric(df["hot"], errors="coerce").astype("Int64")
+    df["rear"] = df["rear"].astype("int8")
+
+    month_num = df["month"].str[5:].astype(int)
+    df["year"] = df["month"].str[:4]
+    df["season"] = df["year"] + "-" + ((month_num - 1) // 3).map(SEASON_MAP)
+
+    # 每个月内每个话题hot最大的一行
+    with_hot = df[df["hot"].notna()]
+    top_index = with_hot.groupby(["month", "text"])["hot"].idxmax()
+    df["is_top"] = False
+    df.loc[top_index.values, "is_top"] = True
+
+    table_path = get_table_path(data_mode)
+    tmp_path = f"{table_path}.tmp"
+    df.to_parquet(tmp_path, engine="fastparquet", index=False)
+    os.replace(tmp_path, table_path)
+    print(f"saved {len(df)} rows to {table_path}")
+    return df
+
+
+def is_stale(data_mode="_strict2"):
+    """parquet不存在，或任一月度文件比它新时需要重建"""
+    table_path = get_table_path(data_mode)
+    if not os.path.exists(table_path):
+        return True
+    table_mtime = os.path.getmtime(table_path)
+    return any(os.path.getmtime(file_path) > table_mtime for _, file_path in get_month_files(data_mode))
+
+
+def load_bangdan_table(data_mode="_strict2", rebuild=False):
+    if rebuild or is_stale(data_mode):
+        return build_bangdan_table(data_mode)
+    return pd.read_parquet(get_table_path(data_mode), engine="fastparquet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_mode", type=str, default="_strict2")
+    args = parser.parse_args()
+    build_bangdan_table(args.data_mode)
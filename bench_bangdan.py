@@ -0,0 +1,85 @@
+"""
+用合成的榜单快照压测 bangdan_analysis 的解析流程，不依赖线上的 weibo_bangdan.{date} 文件
+
+分别测量：快照解析（iter_bangdan_snapshots / iter_bangdan_topics）、育儿话题判定（KeywordMatcher 与旧的前瞻正则对比）、
+get_bangdan_text_from_file 整体（以及同时维护话题生命周期）、日分片与月度csv写入；报告吞吐量和 tracemalloc 峰值内存
+
+用法：
+python bench_bangdan.py --date 2020-01-01 --snapshots 288
+结果追加到 logs/bench_bangdan.jsonl
+"""
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+
+from bangdan_analysis import BangdanAnalyzer, TopicTracker, write_csv_atomic
+from utils.utils import KeywordMatcher, REAR_KEYWORDS
+from utils.profiling import bench
+from utils.synthetic import write_bangdan_file
+
+# 改用 KeywordMatcher 之前 BangdanAnalyzer 使用的正则，保留用于对比
+LEGACY_REAR_PATTERN = "|".join(
+    ["".join([f"(?=.*{word})" for word in keyword.split("&")]) for keyword in REAR_KEYWORDS]
+)
+
+
+def run_benchmarks(date, file_path, output_dir, measure_memory=True):
+    date_str = date.strftime("%Y-%m-%d")
+    analyzer = BangdanAnalyzer(year=date.year)
+    matcher = KeywordMatcher({"rear": REAR_KEYWORDS})
+    legacy_pattern = re.compile(LEGACY_REAR_PATTERN)
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        n_lines = sum(1 for _ in f)
+    n_snapshots = sum(1 for _ in analyzer.iter_bangdan_snapshots(file_path))
+    texts = [text for _, text, _, _ in analyzer.iter_bangdan_topics(file_path)]
+    rows = analyzer.get_bangdan_text_from_file(file_path, date_str)
+
+    # 两种判定方式的结果应当一致
+    mismatches = sum((legacy_pattern.search(text) is not None) != matcher.search(text, "rear") for text in texts)
+    print(f"lines={n_lines} snapshots={n_snapshots} topics={len(texts)} rear={sum(r[4] for r in rows)} mismatches={mismatches}")
+
+    month_rows = rows * 30
+    benchmarks = [
+        ("snapshots", lambda: list(analyzer.iter_bangdan_snapshots(file_path)), n_lines),
+        ("topics", lambda: list(analyzer.iter_bangdan_topics(file_path)), n_lines),
+        ("rear_matcher", lambda: [matcher.search(text, "rear") for text in texts], len(texts)),
+        ("rear_regex", lambda: [legacy_pattern.search(text) is not None for text in texts], len(texts)),
+        ("file_to_rows", lambda: analyzer.get_bangdan_text_from_file(file_path, date_str), n_lines),
+        ("rows_and_topics", lambda: analyzer.get_bangdan_text_from_file(file_path, date_str, TopicTracker()), n_lines),
+        ("shard_write", lambda: write_csv_atomic(f"{output_dir}/{date_str}.csv", rows), len(rows)),
+        ("month_write", lambda: write_csv_atomic(f"{output_dir}/{date:%Y-%m}.csv", month_rows), len(month_rows)),
+    ]
+    return [bench(name, func, n, measure_memory) for name, func, n in benchmarks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", type=str, default="2020-01-01")
+    parser.add_argument("--snapshots", type=int, default=288)
+    parser.add_argument("--topics_per_snapshot", type=int, default=50)
+    parser.add_argument("--malformed_rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--output_dir", type=str, default="bench_working_data")
+    parser.add_argument("--no_memory", action="store_true", help="不测峰值内存（省去第二次运行）")
+    args = parser.parse_args()
+
+    date = datetime.strptime(args.date, "%Y-%m-%d")
+    data_dir = f"{args.output_dir}/bangdan_{args.snapshots}_{args.topics_per_snapshot}_{args.malformed_rate}_{args.seed}"
+    file_path = f"{data_dir}/{date.year}/weibo_bangdan.{args.date}"
+    if not os.path.exists(file_path):
+        write_bangdan_file(
+            data_dir, date, REAR_KEYWORDS, snapshots=args.snapshots, topics_per_snapshot=args.topics_per_snapshot,
+            malformed_rate=args.malformed_rate, seed=args.seed,
+        )
+
+    results = run_benchmarks(date, file_path, args.output_dir, measure_memory=not args.no_memory)
+    os.makedirs("logs", exist_ok=True)
+    with open("logs/bench_bangdan.jsonl", "a", encoding="utf-8") as f:
+        for result in results:
+            result.update(date=args.date, snapshots=args.snapshots, malformed_rate=args.malformed_rate,
+                          time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
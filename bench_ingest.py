@@ -0,0 +1,85 @@
+"""
+用合成数据压测 get_text_from_keyword 的抽取流程，不依赖GPFS上的原始数据
+
+分别测量：matcher（match_chunk）、parser（parse_line）、cleaner（clean_weibo_text_series / weibo_text_cleaner）、
+parquet writer，以及完整的 process_file；报告 lines/sec 和 tracemalloc 峰值内存
+
+用法：
+python bench_ingest.py --date 2020-01-01 --lines 200000 --match_rate 0.01
+结果追加到 logs/bench_ingest.jsonl，便于比较优化前后
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from get_text_from_keyword import (
+    CHILD_KEYWORDS, QUALITY_KEYWORDS, OUTPUT_COLUMNS, build_keyword_automatons, match_chunk, parse_line, process_file,
+)
+from utils.utils import weibo_text_cleaner, clean_weibo_text_series, atomic_write_parquet
+from utils.profiling import StageProfiler, bench
+from utils.synthetic import write_freshdata_file, get_layout
+
+def run_benchmarks(date, file_path, output_dir, measure_memory=True):
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        lines = [line.strip() for line in f]
+    automation1, automation2 = build_keyword_automatons()
+    profiler = StageProfiler()
+
+    hits = match_chunk(lines, automation1, automation2)
+    records = [parse_line(date, line, profiler) for line in lines]
+    records = [r for r in records if r is not None]
+    contents = pd.Series([r[7] for r in records])
+    results = []
+    for line, kids in hits:
+        record = parse_line(date, line, profiler)
+        if record is not None:
+            results.extend((kid,) + record for kid in kids)
+    results_df = pd.DataFrame(results, columns=OUTPUT_COLUMNS)
+    parquet_path = f"{output_dir}/bench_{date:%Y-%m-%d}.parquet"
+
+    print(f"layout={get_layout(date)} lines={len(lines)} hits={len(hits)} parsed={len(records)} results={len(results)}")
+    benchmarks = [
+        ("matcher", lambda: match_chunk(lines, automation1, automation2), len(lines)),
+        ("parser", lambda: [parse_line(date, line, profiler) for line in lines], len(lines)),
+        ("cleaner", lambda: clean_weibo_text_series(contents), len(contents)),
+        ("cleaner_scalar", lambda: [weibo_text_cleaner(c) for c in contents], len(contents)),
+        ("parquet_writer", lambda: atomic_write_parquet(results_df, parquet_path), len(results_df)),
+        ("process_file", lambda: process_file(date, file_path), len(lines)),
+    ]
+    return [bench(name, func, n, measure_memory) for name, func, n in benchmarks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", type=str, default="2020-01-01")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--match_rate", type=float, default=0.01)
+    parser.add_argument("--retweet_ratio", type=float, default=0.4)
+    parser.add_argument("--line_length", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--output_dir", type=str, default="bench_working_data")
+    parser.add_argument("--no_memory", action="store_true", help="不测峰值内存（省去第二次运行）")
+    args = parser.parse_args()
+
+    date = datetime.strptime(args.date, "%Y-%m-%d")
+    file_path = (
+        f"{args.output_dir}/freshdata_{args.date}_{args.lines}_{args.match_rate}_"
+        f"{args.retweet_ratio}_{args.line_length}_{args.seed}"
+    )
+    if not os.path.exists(file_path):
+        write_freshdata_file(
+            file_path, date, args.lines, CHILD_KEYWORDS, QUALITY_KEYWORDS, match_rate=args.match_rate,
+            retweet_ratio=args.retweet_ratio, line_length=args.line_length, seed=args.seed,
+        )
+
+    results = run_benchmarks(date, file_path, args.output_dir, measure_memory=not args.no_memory)
+    os.makedirs("logs", exist_ok=True)
+    with open("logs/bench_ingest.jsonl", "a", encoding="utf-8") as f:
+        for result in results:
+            result.update(date=args.date, match_rate=args.match_rate, retweet_ratio=args.retweet_ratio,
+                          line_length=args.line_length, time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
@@ -0,0 +1,336 @@
+"""
+列式语料（utils/corpus.py）上的字符二元组（bigram）倒排索引，用于临时的关键词查询
+
+corpus_index/
+|-date=2020-01-01/
+|---meta.json                  # 版本、分段列表，最后写入，存在即说明这一天的索引完整
+|---seg-00000.codes.npy        # 有序的bigram编码
+|---seg-00000.starts.npy       # 每个bigram的倒排表在 .bin 中的起始位置（按值计）
+|---seg-00000.lengths.npy      # 每个bigram的倒排表长度
+|---seg-00000.blocks.npy       # .bin 中每块的字节偏移
+|---seg-00000.weibo_ids.npy    # 段内文档号 -> weibo_id，只在需要返回 weibo_id 时读取
+|---seg-00000.bin              # 倒排表：段内文档号的差分（uint32），每 BLOCK_SIZE 个值一块，逐块zlib压缩
+
+各数组单独存为 .npy，查询时以 mmap 方式打开，searchsorted 只会读到用到的页，不需要把整个索引读进内存
+
+查询时，每条规则中每个词的所有bigram的倒排表求交得到候选，再读取候选所在的row group，用 KeywordMatcher 核对原文
+规则写法与 utils.REAR_KEYWORDS 相同，可以用 & 表示同时出现；exclude 中的规则命中则排除
+
+用法：
+python corpus_index.py --action build --years 2020 2021
+python corpus_index.py --action count --keywords 鸡娃 躺平 --start 2016-01-01 --end 2023-12-31
+"""
+
+import os
+import json
+import zlib
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.utils import KeywordMatcher
+from utils.corpus import (
+    CORPUS_DIR, TEXT_COLUMNS, get_corpus_partition_file, corpus_partition_exists, iter_corpus_batches, get_post_texts,
+)
+
+INDEX_DIR = "corpus_index"
+# 索引格式变化时递增，旧版本的索引会被重建
+INDEX_VERSION = "2"
+# 每段的文档数，段内文档号占20位
+SEGMENT_ROWS = 500000
+DOC_BITS = 20
+BLOCK_SIZE = 65536
+SEGMENT_ARRAYS = ["codes", "starts", "lengths", "blocks", "weibo_ids"]
+
+
+def get_index_dir(date_str, index_dir=INDEX_DIR):
+    return f"{index_dir}/date={date_str}"
+
+
+def load_index_meta(date_str, index_dir=INDEX_DIR):
+    meta_path = f"{get_index_dir(date_str, index_dir)}/meta.json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def bigram_codes(text):
+    """文本中每个相邻字符对的编码：前一个字符的码位左移21位再加后一个字符的码位"""
+    codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    return (codepoints[:-1] << 21) | codepoints[1:]
+
+
+def build_segment(texts):
+    """
+    一段文本的倒排表，返回 (codes, starts, lengths, deltas)
+    deltas 中每个倒排表的第一个值为文档号，其余为与前一个文档号的差
+    """
+    if len(texts) >= (1 << DOC_BITS):
+        raise ValueError(f"segment too large: {len(texts)} rows")
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    # 用 \x00 分隔各文档，跨文档或含 \x00 的bigram丢掉
+    codepoints = np.frombuffer("\x00".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    docs = np.repeat(np.arange(len(texts), dtype=np.int64), lengths + 1)[:len(codepoints)]
+    valid = (codepoints[:-1] != 0) & (codepoints[1:] != 0)
+    codes = ((codepoints[:-1] << 21) | codepoints[1:])[valid]
+    keys = np.unique((codes << DOC_BITS) | docs[:-1][valid])
+
+    codes = keys >> DOC_BITS
+    docs = keys & ((1 << DOC_BITS) - 1)
+    is_start = np.ones(len(keys), dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(is_start)
+    deltas = np.diff(docs, prepend=0)
+    deltas[starts] = docs[starts]
+    return codes[starts], starts, np.diff(np.append(starts, len(keys))), deltas.astype(np.uint32)
+
+
+def save_array(file_path, array):
+    with open(f"{file_path}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{file_path}.tmp", file_path)
+
+
+def write_segment(prefix, texts, weibo_ids):
+    codes, starts, lengths, deltas = build_segment(texts)
+    block_offsets = [0]
+    with open(f"{prefix}.bin.tmp", "wb") as f:
+        for block_start in range(0, len(deltas), BLOCK_SIZE):
+            block = zlib.compress(deltas[block_start:block_start + BLOCK_SIZE].tobytes(), 6)
+            f.write(block)
+            block_offsets.append(block_offsets[-1] + len(block))
+    os.replace(f"{prefix}.bin.tmp", f"{prefix}.bin")
+    arrays = {
+        "codes": codes, "starts": starts, "lengths": lengths, "blocks": np.array(block_offsets, dtype=np.int64),
+        "weibo_ids": np.asarray(weibo_ids, dtype=np.int64),
+    }
+    for name in SEGMENT_ARRAYS:
+        save_array(f"{prefix}.{name}.npy", arrays[name])
+
+
+def build_day_index(date_str, corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR, segment_rows=SEGMENT_ROWS):
+    """
+    为一天的语料分区建索引，已是当前版本的跳过
+    返回 (status, 行数)，status 为 skipped / missing / built
+    """
+    meta = load_index_meta(date_str, index_dir)
+    if meta is not None and meta["version"] == INDEX_VERSION:
+        return "skipped", meta["num_rows"]
+    if not corpus_partition_exists(date_str, corpus_dir):
+        return "missing", 0
+
+    day_dir = get_index_dir(date_str, index_dir)
+    os.makedirs(day_dir, exist_ok=True)
+    # 旧版本的 seg-*.npz 不再使用
+    for file_name in os.listdir(day_dir):
+        if file_name.endswith(".npz"):
+            os.remove(f"{day_dir}/{file_name}")
+    segments = []
+    row_start = 0
+    batches = iter_corpus_batches(date_str, ["weibo_id"] + TEXT_COLUMNS, segment_rows, corpus_dir)
+    for idx, batch in enumerate(batches):
+        name = f"seg-{idx:05d}"
+        weibo_ids = batch.column("weibo_id").fill_null(0).to_numpy(zero_copy_only=False)
+        write_segment(f"{day_dir}/{name}", get_post_texts(batch), weibo_ids)
+        segments.append({"name": name, "row_start": row_start, "num_rows": batch.num_rows})
+        row_start += batch.num_rows
+
+    meta = {"version": INDEX_VERSION, "date": date_str, "num_rows": row_start, "segments": segments}
+    with open(f"{day_dir}/meta.json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{day_dir}/meta.json.tmp", f"{day_dir}/meta.json")
+    return "built", row_start
+
+
+def build_index(years, workers=4, corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+    date_strs = []
+    for year in years:
+        start_date = datetime(year, 1, 1)
+        date_strs += [(start_date + timedelta(days=n)).strftime("%Y-%m-%d") for n in range((datetime(year, 12, 31) - start_date).days + 1)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build_day_index, date_str, corpus_dir, index_dir): date_str for date_str in date_strs}
+        for future in as_completed(futures):
+            date_str = futures[future]
+            try:
+                status, num_rows = future.result()
+            except Exception as e:
+                print(f"failed {date_str}: {e}")
+                continue
+            if status != "missing":
+                print(f"{status} {date_str}: {num_rows} rows")
+
+
+class IndexSegment(object):
+
+    def __init__(self, prefix, row_start, num_rows):
+        self.prefix = prefix
+        self.row_start = row_start
+        self.num_rows = num_rows
+        self.codes = np.load(f"{prefix}.codes.npy", mmap_mode="r")
+        self.starts = np.load(f"{prefix}.starts.npy", mmap_mode="r")
+        self.lengths = np.load(f"{prefix}.lengths.npy", mmap_mode="r")
+        self.block_offsets = np.load(f"{prefix}.blocks.npy", mmap_mode="r")
+        self.bin_path = f"{prefix}.bin"
+        self.blocks = {}
+        self._weibo_ids = None
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def weibo_ids(self):
+        if self._weibo_ids is None:
+            self._weibo_ids = np.load(f"{self.prefix}.weibo_ids.npy", mmap_mode="r")
+        return self._weibo_ids
+
+    def read_block(self, block_idx):
+        if block_idx not in self.blocks:
+            block_start, block_end = int(self.block_offsets[block_idx]), int(self.block_offsets[block_idx + 1])
+            with open(self.bin_path, "rb") as f:
+                f.seek(block_start)
+                raw = f.read(block_end - block_start)
+            self.blocks[block_idx] = np.frombuffer(zlib.decompress(raw), dtype=np.uint32)
+        return self.blocks[block_idx]
+
+    def postings(self, code):
+        """一个bigram的文档号（有序），不存在时为空数组"""
+        idx = np.searchsorted(self.codes, code)
+        if idx >= len(self.codes) or self.codes[idx] != code:
+            return np.empty(0, dtype=np.int64)
+        start, length = int(self.starts[idx]), int(self.lengths[idx])
+        first_block, last_block = start // BLOCK_SIZE, (start + length - 1) // BLOCK_SIZE
+        deltas = np.concatenate([self.read_block(b) for b in range(first_block, last_block + 1)])
+        offset = start - first_block * BLOCK_SIZE
+        return np.cumsum(deltas[offset:offset + length], dtype=np.int64)
+
+    def candidates(self, word):
+        """可能包含 word 的文档号；单字词无法用bigram过滤，返回None表示全部文档"""
+        codes = np.unique(bigram_codes(word))
+        if len(codes) == 0:
+            return None
+        lists = sorted((self.postings(code) for code in codes), key=len)
+        docs = lists[0]
+        for other in lists[1:]:
+            if len(docs) == 0:
+                break
+            docs = np.intersect1d(docs, other, assume_unique=True)
+        return docs
+
+    def rule_candidates(self, rules):
+        """任意一条规则（& 连接的词都出现）可能命中的文档号"""
+        result = []
+        for rule in rules:
+            docs = None
+            for word in (w for w in rule.split("&") if w):
+                word_docs = self.candidates(word)
+                if word_docs is None:
+                    continue
+                docs = word_docs if docs is None else np.intersect1d(docs, word_docs, assume_unique=True)
+            if docs is None:
+                return np.arange(len(self), dtype=np.int64)
+            result.append(docs)
+        return np.unique(np.concatenate(result)) if result else np.empty(0, dtype=np.int64)
+
+
+def query_day(date_str, keywords, exclude=(), corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR, meta=None, with_ids=True):
+    """
+    一天中命中 keywords 任意一条规则、且不命中 exclude 任何规则的微博
+    with_ids 为True时返回 weibo_id 数组，否则返回当天的行号数组（只计数时不读取 weibo_ids）
+    meta 为已读取的 meta.json，索引不存在时返回None
+    """
+    meta = meta if meta is not None else load_index_meta(date_str, index_dir)
+    if meta is None:
+        return None
+    day_dir = get_index_dir(date_str, index_dir)
+
+    segments = [
+        IndexSegment(f"{day_dir}/{segment_meta['name']}", segment_meta["row_start"], segment_meta["num_rows"])
+        for segment_meta in meta["segments"]
+    ]
+    rows = [segment.rule_candidates(keywords) + segment.row_start for segment in segments]
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    if len(rows) == 0:
+        return rows
+
+    # 核对原文：只读取候选所在的row group
+    matcher = KeywordMatcher({"include": keywords, "exclude": exclude})
+    parquet_file = pq.ParquetFile(get_corpus_partition_file(date_str, corpus_dir))
+    row_group_starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    keep = np.zeros(len(rows), dtype=bool)
+    row_group_of = np.searchsorted(row_group_starts, rows, side="right") - 1
+    for row_group in np.unique(row_group_of):
+        selected = np.flatnonzero(row_group_of == row_group)
+        texts = get_post_texts(parquet_file.read_row_group(int(row_group), columns=TEXT_COLUMNS))
+        for i in selected:
+            fired = matcher.match(texts[rows[i] - row_group_starts[row_group]])
+            keep[i] = len(fired["include"]) > 0 and len(fired["exclude"]) == 0
+    rows = rows[keep]
+    if not with_ids:
+        return rows
+
+    # 只读取有命中的段的 weibo_ids
+    segment_starts = np.array([segment.row_start for segment in segments], dtype=np.int64)
+    segment_of = np.searchsorted(segment_starts, rows, side="right") - 1
+    weibo_ids = np.empty(len(rows), dtype=np.int64)
+    for segment_idx in np.unique(segment_of):
+        selected = segment_of == segment_idx
+        segment = segments[segment_idx]
+        weibo_ids[selected] = segment.weibo_ids[rows[selected] - segment.row_start]
+    return weibo_ids
+
+
+def get_date_strs(start_date, end_date):
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [(start + timedelta(days=n)).strftime("%Y-%m-%d") for n in range((end - start).days + 1)]
+
+
+def find_weibo_ids(keywords, start_date, end_date, exclude=(), corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+    """返回 DataFrame(date, weibo_id)，没有索引的日期跳过"""
+    frames = []
+    for date_str in get_date_strs(start_date, end_date):
+        weibo_ids = query_day(date_str, keywords, exclude, corpus_dir, index_dir)
+        if weibo_ids is not None:
+            frames.append(pd.DataFrame({"date": date_str, "weibo_id": weibo_ids}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["date", "weibo_id"])
+
+
+def count_per_day(keywords, start_date, end_date, exclude=(), corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+    """返回 DataFrame(date, count, total_count)，total_count 为当天的微博总数；没有索引的日期跳过"""
+    rows = []
+    for date_str in get_date_strs(start_date, end_date):
+        meta = load_index_meta(date_str, index_dir)
+        if meta is None:
+            continue
+        hits = query_day(date_str, keywords, exclude, corpus_dir, index_dir, meta=meta, with_ids=False)
+        rows.append([date_str, len(hits), meta["num_rows"]])
+    return pd.DataFrame(rows, columns=["date", "count", "total_count"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--action", type=str, default="count", choices=["build", "count", "ids"])
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2024)))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--keywords", type=str, nargs="+", default=[])
+    parser.add_argument("--exclude", type=str, nargs="*", default=[])
+    parser.add_argument("--start", type=str, default="2016-01-01")
+    parser.add_argument("--end", type=str, default="2023-12-31")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.action == "build":
+        build_index(args.years, args.workers)
+    else:
+        query = count_per_day if args.action == "count" else find_weibo_ids
+        result = query(args.keywords, args.start, args.end, args.exclude)
+        output = args.output or f"corpus_query_{args.action}_{'_'.join(args.keywords)}_{args.start}_{args.end}.csv"
+        result.to_csv(output, index=False)
+        print(result.tail(20).to_string(index=False))
+        print(f"saved to {output}")
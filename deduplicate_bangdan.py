@@ -25,32 +25,54 @@ import os
 import pandas as pd
 from datetime import datetime, timedelta
 import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.utils import atomic_write_parquet, read_parquet_metadata
 
 TEXT_DIR = "text_data"
 
-def deduplicate_parquet(year):
+# 去重逻辑变化时递增，已是当前版本的文件会被跳过
+DEDUP_VERSION = "1"
+
+
+def deduplicate_day(parquet_path):
+    """
+    对一天的数据按weibo_id去重，先写临时文件再rename替换原文件，并在文件尾记录 dedup_version（与已有的键值对合并）
+    """
+    if not os.path.exists(parquet_path):
+        return "missing"
+    metadata = read_parquet_metadata(parquet_path)
+    if metadata.get("dedup_version") == DEDUP_VERSION:
+        return "skipped"
+
+    df = pd.read_parquet(parquet_path)
+    if df.empty:
+        os.remove(parquet_path)
+        return "removed"
+
+    df.drop_duplicates(subset='weibo_id', inplace=True)
+    # 保留 text_file_cleaner 等写入的其他标记
+    atomic_write_parquet(df, parquet_path, {**metadata, "dedup_version": DEDUP_VERSION})
+    return "deduplicated"
+
+
+def deduplicate_parquet(year, workers=4):
     # 生成一个list，包括从2020-01-01到2020-12-31的日期
     start_date = datetime(year, 1, 1)
     end_date = datetime(year, 12, 31)
     date_range = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    parquet_paths = [f"{TEXT_DIR}/{date.strftime('%Y-%m-%d')}.parquet" for date in date_range]
 
-    for date in date_range:
-        date_str = date.strftime('%Y-%m-%d')
-        parquet_path = f"{TEXT_DIR}/{date_str}.parquet"
-
-        if not os.path.exists(parquet_path):
-            continue
-
-        df = pd.read_parquet(parquet_path)
-        if df.empty:
-            os.remove(parquet_path)
-            continue
-
-        df.drop_duplicates(subset='weibo_id', inplace=True)
-        df.to_parquet(parquet_path, engine='fastparquet', index=False)
+    status_count = defaultdict(int)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for status in executor.map(deduplicate_day, parquet_paths):
+            status_count[status] += 1
+    print(dict(status_count))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--year', type=int, required=True, default=2020)
+    parser.add_argument('--workers', type=int, default=4)
     args = parser.parse_args()
-    deduplicate_parquet(args.year)
\ No newline at end of file
+    deduplicate_parquet(args.year, args.workers)
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+把 weibo_freshdata.*.7z 一次性转换为按天分区的列式语料（见 utils/corpus.py）
+
+每天：解压 -> 逐行解析为紧凑的列（id、时间戳、转发标记、互动数、正文、转发原文）-> 分块写入zstd parquet -> 删除解压文件
+已存在的分区直接跳过，可以随时中断后重新运行
+
+用法：
+python freshdata_corpus.py --years 2020 2021 --workers 2
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from get_text_from_keyword import unzip_one_fresh_data_file, delete_unzipped_fresh_data_file
+from utils.corpus import CORPUS_DIR, CORPUS_COLUMNS, CorpusPartitionWriter, corpus_partition_exists
+
+CHUNK_SIZE = 500000
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_corpus_line(date, line):
+    """
+    按日期对应的格式解析一行（与 get_text_from_keyword.parse_line 相同的三种格式）
+    返回 CORPUS_COLUMNS 顺序的元组，解析失败返回None
+    """
+    if date == datetime(2020, 6, 30):
+        line_data = line.strip().strip('"').split('","')
+    elif date >= datetime(2019, 8, 9):
+        line_data = line.strip().split("\t")
+        try:
+            data = json.loads(line_data[1])
+            return (
+                to_int(data["weibo_id"]), to_int(data["user_id"]), data.get("user_type"),
+                to_int(data["crawler_time_stamp"]), to_int(data["time_stamp"]), to_int(data["is_retweet"]),
+                to_int(data["zhuan"]), to_int(data["ping"]), to_int(data["zhan"]),
+                data["weibo_content"], data.get("r_weibo_content") or None,
+            )
+        except (IndexError, KeyError, json.JSONDecodeError):
+            return None
+    else:
+        line_data = line.strip().split("\t")
+    if len(line_data) < 24:
+        return None
+    return (
+        to_int(line_data[8]), to_int(line_data[4]), line_data[7],
+        to_int(line_data[2]), to_int(line_data[17]), to_int(line_data[3]),
+        to_int(line_data[10]), to_int(line_data[11]), to_int(line_data[12]),
+        line_data[9], line_data[22] or None,
+    )
+
+
+def convert_file(date, file_path, date_str, corpus_dir=CORPUS_DIR):
+    """逐块解析 file_path 并写入 date_str 的分区，返回 (写入行数, 解析失败行数)"""
+    bad_lines = 0
+    with CorpusPartitionWriter(date_str, corpus_dir) as writer:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            rows = []
+            for line in f:
+                row = parse_corpus_line(date, line)
+                if row is None:
+                    bad_lines += 1
+                    continue
+                rows.append(row)
+                if len(rows) == CHUNK_SIZE:
+                    writer.write(dict(zip(CORPUS_COLUMNS, map(list, zip(*rows)))))
+                    rows = []
+            if rows:
+                writer.write(dict(zip(CORPUS_COLUMNS, map(list, zip(*rows)))))
+        num_rows = writer.num_rows
+    return num_rows, bad_lines
+
+
+def convert_day(year, date_str, corpus_dir=CORPUS_DIR):
+    """
+    转换一天的数据，返回 (status, 行数, 解析失败行数)，status 为 skipped / missing / converted
+    """
+    if corpus_partition_exists(date_str, corpus_dir):
+        return "skipped", 0, 0
+    file_path = unzip_one_fresh_data_file(year, date_str)
+    if file_path is None:
+        return "missing", 0, 0
+    try:
+        num_rows, bad_lines = convert_file(datetime.strptime(date_str, "%Y-%m-%d"), file_path, date_str, corpus_dir)
+    finally:
+        delete_unzipped_fresh_data_file(year, date_str)
+    return "converted", num_rows, bad_lines
+
+
+def convert_year(year, workers=2, corpus_dir=CORPUS_DIR):
+    """并行转换一年，每个进程同时只解压一天，workers 受限于解压后的磁盘占用"""
+    start_date = datetime(year, 1, 1)
+    end_date = datetime(year, 12, 31)
+    date_strs = [
+        (start_date + timedelta(days=n)).strftime("%Y-%m-%d") for n in range((end_date - start_date).days + 1)
+    ]
+    date_strs = [date_str for date_str in date_strs if not corpus_partition_exists(date_str, corpus_dir)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_day, year, date_str, corpus_dir): date_str for date_str in date_strs}
+        for future in as_completed(futures):
+            date_str = futures[future]
+            try:
+                status, num_rows, bad_lines = future.result()
+            except Exception as e:
+                print(f"failed {date_str}: {e}")
+                continue
+            print(f"{status} {date_str}: {num_rows} rows, {bad_lines} bad lines")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2024)))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--corpus_dir", type=str, default=CORPUS_DIR)
+    args = parser.parse_args()
+    for year in args.years:
+        convert_year(year, args.workers, args.corpus_dir)
@@ -25,6 +25,9 @@ from concurrent.futures import ProcessPoolExecutor
 
 from configs.configs import *
 from utils.utils import *
+from utils.profiling import StageProfiler
+from utils.automaton import get_automaton
+from bangdan_table import load_bangdan_table
 
 import argparse
 
@@ -88,6 +91,10 @@ def unzip_one_fresh_data_file(year, date):
     result = extract_single_7z_file(
         file_path=zipped_file_path, target_folder=unzipped_dir
     )
+    if result["status"] == "error":
+        print(f"文件 {zipped_file_path} 解压出错：{result['error']}")
+        return None
+    print(format_extract_result(result))
 
     if os.path.exists(unzipped_file_path):
         print(f"文件 {unzipped_file_path} 解压成功。")
@@ -111,60 +118,97 @@ def process_chunk_special(chunk, automation, result_set):
             except:
                 continue
 
-def process_chunk(chunk, automaton, result_set):
-    for line in chunk:
-        for end_index, (kid, keyword) in automaton.iter(line):
-            """
-            40984940671        {"id":"40984940671","crawler_time":"2020-01-01 04:27:59","crawler_time_stamp":"1577824079000","is_retweet":"0","user_id":"5706021763","nick_name":"诗词歌赋","tou_xiang":"https:\/\/tvax2.sinaimg.cn\/crop.0.0.1002.1002.50\/006e9SV5ly8g4yg7ozexlj30ru0ruabp.jpg?KID=imgbed,tva&Expires=1577834878&ssig=lHvYHGBxwq","user_type":"黄V","weibo_id":"4455589780114474","weibo_content":"给自己设立一个目标，给自己未来一个明确的希望，给自己的生活一个方向灯。冲着这个方向而努力，不断去超越自己，提高自己的水平，不能让自己有懈怠的时候。早安! ","zhuan":"0","ping":"0","zhan":"0","url":"Ink8W0tMm","device":"Redmi Note 7 Pro","locate":"","time":"2019-12-31 15:54:07","time_stamp":"1577778847","r_user_id":"","r_nick_name":"","r_user_type":"","r_weibo_id":"","r_weibo_content":"","r_zhuan":"","r_ping":"","r_zhan":"","r_url":"","r_device":"","r_location":"","r_time":"","r_time_stamp":"","pic_content":"","src":"4","tag":"106750860151","vedio":"0","vedio_image":"","edited":"0","r_edited":"","isLongText":"0","r_isLongText":"","lat":"","lon":"","d":"2020-01-01"}
-            """
-            line_data = line.strip().split("\t")
-            try:
-                data = json.loads(line_data[1])
-            except IndexError as e:
-                print(f"IndexError occurred: {e}")
-                continue
-            except json.JSONDecodeError as e:
-                print(f"JSONDecodeError: {e}")
-                # 打印出错误位置
-                print(f"Error at line {e.lineno}, column {e.colno}")
-                # 打印出错误字符位置
-                print(f"Error at character {e.pos}, {line_data[1][int(e.pos)-20: int(e.pos)+20]}")
-                continue
-            
-            try:
-                weibo_content = data['weibo_content'].replace('\n', ' ') if data['is_retweet'] == "0" else data['weibo_content'].replace('\n', ' ') + '//' + data['r_weibo_content'].replace('\n', ' ')
-                result_set.add((kid,data['weibo_id'],data['user_id'],data['time_stamp'],data['is_retweet'],data['zhuan'],data['ping'],data['zhan'],weibo_content))
-            except KeyError:
+def parse_line(line, profiler):
+    """
+    40984940671        {"id":"40984940671","crawler_time":"2020-01-01 04:27:59","crawler_time_stamp":"1577824079000","is_retweet":"0","user_id":"5706021763","nick_name":"诗词歌赋","tou_xiang":"https:\/\/tvax2.sinaimg.cn\/crop.0.0.1002.1002.50\/006e9SV5ly8g4yg7ozexlj30ru0ruabp.jpg?KID=imgbed,tva&Expires=1577834878&ssig=lHvYHGBxwq","user_type":"黄V","weibo_id":"4455589780114474","weibo_content":"给自己设立一个目标，给自己未来一个明确的希望，给自己的生活一个方向灯。冲着这个方向而努力，不断去超越自己，提高自己的水平，不能让自己有懈怠的时候。早安! ","zhuan":"0","ping":"0","zhan":"0","url":"Ink8W0tMm","device":"Redmi Note 7 Pro","locate":"","time":"2019-12-31 15:54:07","time_stamp":"1577778847","r_user_id":"","r_nick_name":"","r_user_type":"","r_weibo_id":"","r_weibo_content":"","r_zhuan":"","r_ping":"","r_zhan":"","r_url":"","r_device":"","r_location":"","r_time":"","r_time_stamp":"","pic_content":"","src":"4","tag":"106750860151","vedio":"0","vedio_image":"","edited":"0","r_edited":"","isLongText":"0","r_isLongText":"","lat":"","lon":"","d":"2020-01-01"}
+    """
+    line_data = line.strip().split("\t")
+    try:
+        data = json.loads(line_data[1])
+    except IndexError as e:
+        print(f"IndexError occurred: {e}")
+        profiler.count("json_errors")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"JSONDecodeError: {e}")
+        # 打印出错误位置
+        print(f"Error at line {e.lineno}, column {e.colno}")
+        # 打印出错误字符位置
+        print(f"Error at character {e.pos}, {line_data[1][int(e.pos)-20: int(e.pos)+20]}")
+        profiler.count("json_errors")
+        return None
+
+    try:
+        weibo_content = data['weibo_content'].replace('\n', ' ') if data['is_retweet'] == "0" else data['weibo_content'].replace('\n', ' ') + '//' + data['r_weibo_content'].replace('\n', ' ')
+        return (data['weibo_id'],data['user_id'],data['time_stamp'],data['is_retweet'],data['zhuan'],data['ping'],data['zhan'],weibo_content)
+    except KeyError:
+        return None
+
+
+def process_chunk(chunk, automaton, text_to_id, result_set, profiler=None):
+    """
+    先用自动机筛出命中的行（match阶段），再逐行解析（parse阶段），每行只解析一次
+    自动机按月构建（value 为 (话题, 话题)），只保留当天检索窗口内的话题，text_to_id: {话题: id}
+    """
+    profiler = profiler if profiler is not None else StageProfiler()
+    with profiler.stage("match"):
+        hits = []
+        for line in chunk:
+            kids = {text_to_id[keyword] for end_index, (_, keyword) in automaton.iter(line) if keyword in text_to_id}
+            if kids:
+                hits.append((line, kids))
+    profiler.count("matched_lines", len(hits))
+
+    with profiler.stage("parse"):
+        for line, kids in hits:
+            record = parse_line(line, profiler)
+            if record is None:
                 continue
+            for kid in kids:
+                result_set.add((kid,) + record)
+
 
+def get_keyword_automaton(texts):
+    """话题集合的自动机，value 为 (话题, 话题)；同一组话题只构建一次，见 utils.automaton"""
+    return get_automaton((text, text) for text in sorted(set(texts)))
 
 
-def process_file(file_path, keywords):
+def process_file(file_path, keywords, profiler=None, automaton=None):
     """
     处理单个文件并完成存储
+    keywords: 当天检索的 {id: 话题}
+    automaton: 覆盖 keywords 的自动机（通常是整月的，见 get_month_texts），为None时只用 keywords 构建
+    profiler 记录 read / match / parse 阶段耗时，以及 lines / bytes / matched_lines / json_errors
     """
-    # 初始化 Aho-Corasick 自动机
-    automaton = ahocorasick.Automaton()
-    for idx, keyword in keywords.items():
-        # 添加关键词，假设关键词格式为 #keyword#
-        automaton.add_word(f"{keyword}", (idx, keyword))
-    automaton.make_automaton()
+    profiler = profiler if profiler is not None else StageProfiler()
+    if automaton is None:
+        with profiler.stage("automaton"):
+            automaton = get_keyword_automaton(keywords.values())
+    text_to_id = {text: kid for kid, text in keywords.items()}
 
     # 结果字典
     result_set = set()
 
+    profiler.count("bytes", os.path.getsize(file_path))
+
     # 读取文件并分块处理
     chunk_size = 500000
     with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
         chunk = []
+        read_start = time.perf_counter()
         for line in file:
             chunk.append(line.strip())
             if len(chunk) == chunk_size:
-                process_chunk(chunk, automaton, result_set)
+                profiler.add_time("read", time.perf_counter() - read_start)
+                profiler.count("lines", len(chunk))
+                process_chunk(chunk, automaton, text_to_id, result_set, profiler)
                 chunk = []
+                read_start = time.perf_counter()
+        profiler.add_time("read", time.perf_counter() - read_start)
         # 处理最后一个不满 chunk_size 的块
         if chunk:
-            process_chunk(chunk, automaton, result_set)
+            profiler.count("lines", len(chunk))
+            process_chunk(chunk, automaton, text_to_id, result_set, profiler)
     
     return result_set
 
@@ -190,13 +234,110 @@ def append_to_parquet(date, results):
     #     log(f"追加数据到文件：{output_parquet_path}")
 
 
-def process_year(year, mode):
-    rear_bangdan = pd.read_csv(f"rear_{year}.csv")
-    # 给rear_bangdan生成一个id列，生成规则为2019-独立id
-    rear_bangdan['id'] = f"{year}-{rear_bangdan.index + 1}"
+def load_topic_appearances(data_mode="_strict2"):
+    """
+    育儿话题每天的上榜记录，返回 DataFrame(text, first_date, last_date)，每个 (话题, 日期) 一行，first_date == last_date
+    只使用 bangdan{data_mode} 榜单表中 rear==1 的行，与 rear_{year}.csv 的育儿话题判定口径一致
+    （bangdan_analysis.py 的 topics_{year}.parquet 每年只有首末日期、且 rear 为未清洗的判定，不用于划分窗口）
+    """
+    bangdan_df = load_bangdan_table(data_mode)
+    rear_dates = bangdan_df[bangdan_df["rear"] == 1][["text", "date"]].drop_duplicates()
+    appearances = pd.DataFrame({
+        "text": rear_dates["text"],
+        "first_date": pd.to_datetime(rear_dates["date"]),
+        "last_date": pd.to_datetime(rear_dates["date"]),
+    })
+    return appearances.reset_index(drop=True)
 
-    # rear_bangdan有date列：yyyy-mm-dd 我希望后面能够按照月份筛选出某个月份的全部行
+
+def get_topic_runs(appearances, gap_days):
+    """
+    把同一话题的上榜区间按间隔切分为若干段：与此前区间的间隔超过 gap_days 天时开始新的一段
+    每年重复上榜的话题（节日、高考等）因此每次上榜各自一段，而不是从第一年连到最后一年
+    返回 DataFrame(text, first_date, last_date)，每段一行
+    """
+    df = appearances.sort_values(["text", "first_date"]).reset_index(drop=True)
+    prev_end = df.groupby("text")["last_date"].cummax().groupby(df["text"]).shift()
+    new_run = prev_end.isna() | ((df["first_date"] - prev_end).dt.days > gap_days)
+    df["run"] = new_run.cumsum()
+    return df.groupby("run").agg(
+        text=("text", "first"), first_date=("first_date", "min"), last_date=("last_date", "max")
+    ).reset_index(drop=True)
+
+
+def get_topic_windows(rear_bangdan, window, before_days=1, after_days=3, data_mode="_strict2"):
+    """
+    给 rear_bangdan 的每个话题加上检索窗口 window_start / window_end（含两端）
+    window:
+    month - 话题所在月份的每一天（原有做法）
+    lifetime - 话题本次上榜（包含该行 date 的那一段，见 get_topic_runs）首日前 before_days 天到末日后 after_days 天
+    """
+    month_start = rear_bangdan['date'].dt.to_period("M").dt.start_time
+    month_end = rear_bangdan['date'].dt.to_period("M").dt.end_time.dt.normalize()
+    if window == "month":
+        rear_bangdan['window_start'] = month_start
+        rear_bangdan['window_end'] = month_end
+        return rear_bangdan
+
+    runs = get_topic_runs(load_topic_appearances(data_mode), before_days + after_days)
+    matched = rear_bangdan[['text', 'date']].reset_index().merge(runs, on='text')
+    matched = matched[(matched['first_date'] <= matched['date']) & (matched['last_date'] >= matched['date'])]
+    matched = matched.drop_duplicates('index').set_index('index')
+    # 榜单表中找不到所在一段的话题（数据不一致时）退回到所在月份
+    rear_bangdan['window_start'] = (matched['first_date'] - pd.Timedelta(days=before_days)).reindex(rear_bangdan.index).fillna(month_start)
+    rear_bangdan['window_end'] = (matched['last_date'] + pd.Timedelta(days=after_days)).reindex(rear_bangdan.index).fillna(month_end)
+    return rear_bangdan
+
+
+def get_day_keywords(rear_bangdan, current_date):
+    """
+    current_date 落在检索窗口内的话题，返回 {id: text}
+    同一话题在多个月上榜时有多个id，优先保留当月的id
+    """
+    day_df = rear_bangdan[(rear_bangdan['window_start'] <= current_date) & (rear_bangdan['window_end'] >= current_date)]
+    in_month = day_df['date'].dt.to_period("M") == pd.Period(current_date, "M")
+    day_df = pd.concat([day_df[in_month], day_df[~in_month]]).drop_duplicates('text')
+    return day_df.set_index('id')['text'].to_dict()
+
+
+def get_month_texts(rear_bangdan, current_date):
+    """
+    检索窗口与 current_date 所在月份有交集的所有话题
+    lifetime 窗口下每天的话题集合都不同，按月构建一个自动机（集合稳定，可以落盘复用），匹配时再按当天的窗口过滤
+    """
+    month = pd.Period(current_date, "M")
+    month_df = rear_bangdan[(rear_bangdan['window_start'] <= month.end_time) & (rear_bangdan['window_end'] >= month.start_time)]
+    return month_df['text'].unique().tolist()
+
+
+def load_rear_bangdan(year):
+    """rear_{year}.csv，加上 id 列（{year}-序号）并解析 date，文件不存在时返回None"""
+    file_path = f"rear_{year}.csv"
+    if not os.path.exists(file_path):
+        return None
+    rear_bangdan = pd.read_csv(file_path)
+    rear_bangdan['id'] = [f"{year}-{i + 1}" for i in rear_bangdan.index]
     rear_bangdan['date'] = pd.to_datetime(rear_bangdan['date'])
+    return rear_bangdan
+
+
+def process_year(year, mode, window="lifetime", before_days=1, after_days=3):
+    """
+    window / before_days / after_days 见 get_topic_windows
+    """
+    # id 生成规则为 {year}-序号；lifetime 窗口可能跨年（12月底上榜的话题延续到次年1月初，1月初的话题前推到上年12月底），
+    # 这些日期只由所在年份处理，所以同时读入前后两年的话题，只保留窗口与本年有交集的
+    rear_bangdan = load_rear_bangdan(year)
+    if rear_bangdan is None:
+        print(f"rear_{year}.csv not exists")
+        return
+    if window == "lifetime":
+        neighbours = [df for df in [load_rear_bangdan(year - 1), load_rear_bangdan(year + 1)] if df is not None]
+        rear_bangdan = pd.concat([rear_bangdan] + neighbours, ignore_index=True)
+    rear_bangdan = get_topic_windows(rear_bangdan, window, before_days, after_days)
+    rear_bangdan = rear_bangdan[
+        (rear_bangdan['window_end'] >= datetime(year, 1, 1)) & (rear_bangdan['window_start'] <= datetime(year, 12, 31))
+    ]
 
     start_date_options = [datetime(year, 1, 1), datetime(year, 7, 1)]
     end_date_options = [datetime(year, 6, 30), datetime(year, 12, 31)]
@@ -206,23 +347,36 @@ def process_year(year, mode):
     current_date = start_date
 
     date_range = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
-    
+
+    profiler = StageProfiler(f"logs/profile_bangdan_{year}_{mode}.jsonl")
+
+    automaton_month = None
+    automaton = None
     for current_date in date_range:
         date_str = current_date.strftime("%Y-%m-%d")
 
-        # 按照date所属月份，筛选出rear_bangdan中的行, key是id，value是keyword
-        keywords = rear_bangdan[rear_bangdan['date'].dt.month == current_date.month].set_index('id')['text'].to_dict()
+        # 检索窗口覆盖当天的话题, key是id，value是keyword
+        keywords = get_day_keywords(rear_bangdan, current_date)
         # 如果没有元素，跳过
         if not keywords:
             continue
 
-        file_path = unzip_one_fresh_data_file(year, date_str)
+        with profiler.stage("decompress"):
+            file_path = unzip_one_fresh_data_file(year, date_str)
         # file_path = f"text_working_data/{year}/weibo_freshdata.test"
         if file_path is None:
+            profiler.reset()
             continue
+        if automaton_month != current_date.month:
+            with profiler.stage("automaton"):
+                automaton = get_keyword_automaton(get_month_texts(rear_bangdan, current_date))
+            automaton_month = current_date.month
         start_timestamp = int(time.time())
-        results = process_file(file_path, keywords)
-        append_to_parquet(date_str, results)
+        results = process_file(file_path, keywords, profiler, automaton)
+        with profiler.stage("write"):
+            append_to_parquet(date_str, results)
+        profiler.count("records", len(results))
+        profiler.count("keywords", len(keywords))
 
         log(
             f"处理 {date_str} 完成，耗时 {int(time.time()) - start_timestamp} 秒。",
@@ -230,6 +384,7 @@ def process_year(year, mode):
         )
 
         delete_unzipped_fresh_data_file(year, date_str)
+        profiler.record(date=date_str, window=window)
         print(f"finished {date_str} with {len(results)} records")
 
 
@@ -239,5 +394,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--year", type=int, default=2023)
     parser.add_argument("--mode", type=int, default=1)
+    parser.add_argument("--window", type=str, default="lifetime", choices=["lifetime", "month"])
+    parser.add_argument("--before_days", type=int, default=1)
+    parser.add_argument("--after_days", type=int, default=3)
     args = parser.parse_args()
-    process_year(args.year, args.mode)
+    process_year(args.year, args.mode, args.window, args.before_days, args.after_days)
@@ -11,6 +11,10 @@ from concurrent.futures import ProcessPoolExecutor
 
 from configs.configs import *
 from utils.utils import *
+from utils.profiling import StageProfiler
+from utils.automaton import get_automaton
+from utils.sketches import build_sketches, write_sketch_table
+from utils.corpus import iter_corpus_batches, corpus_partition_exists
 
 import argparse
 
@@ -19,6 +23,13 @@ TEXT_DIR = "keyword_text_data"
 if not os.path.exists(TEXT_DIR):
     os.makedirs(TEXT_DIR)
 
+CHILD_KEYWORDS = ["子女", "女儿", "儿子", "孙女", "孙子", "带娃", "带孩子", "养育", "养娃"] # "女孩", "男孩", TODO 去除女孩、男孩
+QUALITY_KEYWORDS = ["独立", "自主", "自理能力", "自立", "挫折教育", "娇气", "脆弱", "温室", "勇敢", "坚强", "自强", "害怕", "溺爱", "男子汉", "自我生存", "依赖性", "努力", "刻苦", "勤劳", "坚持", "有恒心", "半途而废", "懒散", "不上进", "携带", "责任心", "有担当", "可靠", "暖心", "逃避责任", "不负责任", "懂事", "教养", "包容", "宽容", "理解他人", "体谅"]
+
+# 每天输出的 {TEXT_DIR}/{date}.parquet 的列，加入 user_type 之前生成的文件没有这一列
+OUTPUT_COLUMNS = ["keyword_id", "weibo_id", "user_id", "time_stamp", "is_retweet", "zhuan", "ping", "zhan", "weibo_content", "user_type"]
+
+
 def log(text, lid=None):
     output = f"logs/keyword_log_{lid}.txt" if lid is not None else "logs/log.txt"
     with open(output, "a") as f:
@@ -76,6 +87,10 @@ def unzip_one_fresh_data_file(year, date):
     result = extract_single_7z_file(
         file_path=zipped_file_path, target_folder=unzipped_dir
     )
+    if result["status"] == "error":
+        print(f"文件 {zipped_file_path} 解压出错：{result['error']}")
+        return None
+    print(format_extract_result(result))
 
     if os.path.exists(unzipped_file_path):
         print(f"文件 {unzipped_file_path} 解压成功。")
@@ -95,95 +110,188 @@ def process_chunk_special(chunk, automation, result_set):
             line_data = line.strip().strip('"').split('","')
             try:
                 weibo_content = line_data[9].replace('\n', ' ') if line_data[3] == "0" else line_data[9].replace('\n', ' ') + '//' + line_data[22].replace('\n', ' ')
-                result_set.add((kid,line_data[0],line_data[4],line_data[2],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content))
+                result_set.add((kid,line_data[0],line_data[4],line_data[2],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content,line_data[7]))
             except:
                 continue
 
-def process_chunk(date, chunk, automation1, automation2, result_set):
+def parse_line(date, line, profiler):
+    """
+    按日期对应的格式解析一行，返回 (weibo_id, user_id, time_stamp, is_retweet, zhuan, ping, zhan, weibo_content, user_type)
+    解析失败返回None
+    """
+    if date == datetime(2020, 6, 30):
+        """
+        "46890032291","2020-06-30 00:12:36","1593447156000","1","2789934082","妞子蓝楸瑛","https://tva1.sinaimg.cn/crop.0.0.180.180.50/a64b0402jw1e8qgp5bmzyj2050050aa8.jpg?KID=imgbed,tva&Expires=1593457954&ssig=WuAFhSJ49R","普通用户","4520977143508623","转发微博","0","0","0","J8NI6eIKH","微博 weibo.com","","2020-06-29 02:20:09","1593368409","2920534890","地盘鲁路修兰佩洛基1986","普通用户","4247252011050572","双子座 今日(6月4日)综合运势：5，幸运颜色：粉色，幸运数字：7，速配星座：天蝎座（分享自@微心情） 查看更多：http://t.cn/h5gw6 ​​​","95","0","0","GjPeV4piI","微博 weibo.com","","2018-06-04 18:14:11","1528107251","","0","","0","0","0","0","2020-06-30"
+        """
+        line_data = line.split('","')
+        if len(line_data) < 24:
+            return None
+        weibo_content = line_data[9].replace('\n', ' ') if line_data[3] == "0" else line_data[9].replace('\n', ' ') + '//' + line_data[22].replace('\n', ' ')
+        return (line_data[8],line_data[4],line_data[17],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content,line_data[7])
+    # 判断date(datetime)是否比2019-08-09晚
+    elif date >= datetime(2019, 8, 9):
+        """
+        40984940671        {"id":"40984940671","crawler_time":"2020-01-01 04:27:59","crawler_time_stamp":"1577824079000","is_retweet":"0","user_id":"5706021763","nick_name":"诗词歌赋","tou_xiang":"https:\/\/tvax2.sinaimg.cn\/crop.0.0.1002.1002.50\/006e9SV5ly8g4yg7ozexlj30ru0ruabp.jpg?KID=imgbed,tva&Expires=1577834878&ssig=lHvYHGBxwq","user_type":"黄V","weibo_id":"4455589780114474","weibo_content":"给自己设立一个目标，给自己未来一个明确的希望，给自己的生活一个方向灯。冲着这个方向而努力，不断去超越自己，提高自己的水平，不能让自己有懈怠的时候。早安! ","zhuan":"0","ping":"0","zhan":"0","url":"Ink8W0tMm","device":"Redmi Note 7 Pro","locate":"","time":"2019-12-31 15:54:07","time_stamp":"1577778847","r_user_id":"","r_nick_name":"","r_user_type":"","r_weibo_id":"","r_weibo_content":"","r_zhuan":"","r_ping":"","r_zhan":"","r_url":"","r_device":"","r_location":"","r_time":"","r_time_stamp":"","pic_content":"","src":"4","tag":"106750860151","vedio":"0","vedio_image":"","edited":"0","r_edited":"","isLongText":"0","r_isLongText":"","lat":"","lon":"","d":"2020-01-01"}
+        """
+        line_data = line.strip().split("\t")
+        try:
+            data = json.loads(line_data[1])
+        except IndexError as e:
+            print(f"IndexError occurred: {e}")
+            profiler.count("json_errors")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"JSONDecodeError: {e}")
+            # 打印出错误位置
+            print(f"Error at line {e.lineno}, column {e.colno}")
+            # 打印出错误字符位置
+            print(f"Error at character {e.pos}, {line_data[1][int(e.pos)-20: int(e.pos)+20]}")
+            profiler.count("json_errors")
+            return None
+
+        try:
+            weibo_content = data['weibo_content'].replace('\n', ' ') if data['is_retweet'] == "0" else data['weibo_content'].replace('\n', ' ') + '//' + data['r_weibo_content'].replace('\n', ' ')
+            return (data['weibo_id'],data['user_id'],data['time_stamp'],data['is_retweet'],data['zhuan'],data['ping'],data['zhan'],weibo_content,data.get('user_type', ''))
+        except KeyError:
+            return None
+    else:
+        line_data = line.split("\t")
+        if len(line_data) < 24:
+            return None
+        weibo_content = line_data[9].replace('\n', ' ') if line_data[3] == "0" else line_data[9].replace('\n', ' ') + '//' + line_data[22].replace('\n', ' ')
+        return (line_data[8],line_data[4],line_data[17],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content,line_data[7])
+
+
+def match_text(text, automation1, automation2):
+    """同时含有子女关键词和品质关键词时返回命中的品质关键词id集合，否则返回空集合"""
+    if next(automation1.iter(text), None) is None:
+        return set()
+    return {kid2 for _, (kid2, keyword2) in automation2.iter(text)}
+
+
+def match_chunk(chunk, automation1, automation2):
+    """
+    同时含有子女关键词和品质关键词的行，返回 [(line, 命中的品质关键词id集合)]
+    """
+    hits = []
     for line in chunk:
-        for end_index, (kid1, keyword1) in automation1.iter(line):
-            for end_index2, (kid2, keyword2) in automation2.iter(line):
-                """
-                40984940671        {"id":"40984940671","crawler_time":"2020-01-01 04:27:59","crawler_time_stamp":"1577824079000","is_retweet":"0","user_id":"5706021763","nick_name":"诗词歌赋","tou_xiang":"https:\/\/tvax2.sinaimg.cn\/crop.0.0.1002.1002.50\/006e9SV5ly8g4yg7ozexlj30ru0ruabp.jpg?KID=imgbed,tva&Expires=1577834878&ssig=lHvYHGBxwq","user_type":"黄V","weibo_id":"4455589780114474","weibo_content":"给自己设立一个目标，给自己未来一个明确的希望，给自己的生活一个方向灯。冲着这个方向而努力，不断去超越自己，提高自己的水平，不能让自己有懈怠的时候。早安! ","zhuan":"0","ping":"0","zhan":"0","url":"Ink8W0tMm","device":"Redmi Note 7 Pro","locate":"","time":"2019-12-31 15:54:07","time_stamp":"1577778847","r_user_id":"","r_nick_name":"","r_user_type":"","r_weibo_id":"","r_weibo_content":"","r_zhuan":"","r_ping":"","r_zhan":"","r_url":"","r_device":"","r_location":"","r_time":"","r_time_stamp":"","pic_content":"","src":"4","tag":"106750860151","vedio":"0","vedio_image":"","edited":"0","r_edited":"","isLongText":"0","r_isLongText":"","lat":"","lon":"","d":"2020-01-01"}
-                """
-                line_data = line.strip()
-                if date == datetime(2020, 6, 30):
-                    """
-                    "46890032291","2020-06-30 00:12:36","1593447156000","1","2789934082","妞子蓝楸瑛","https://tva1.sinaimg.cn/crop.0.0.180.180.50/a64b0402jw1e8qgp5bmzyj2050050aa8.jpg?KID=imgbed,tva&Expires=1593457954&ssig=WuAFhSJ49R","普通用户","4520977143508623","转发微博","0","0","0","J8NI6eIKH","微博 weibo.com","","2020-06-29 02:20:09","1593368409","2920534890","地盘鲁路修兰佩洛基1986","普通用户","4247252011050572","双子座 今日(6月4日)综合运势：5，幸运颜色：粉色，幸运数字：7，速配星座：天蝎座（分享自@微心情） 查看更多：http://t.cn/h5gw6 ​​​","95","0","0","GjPeV4piI","微博 weibo.com","","2018-06-04 18:14:11","1528107251","","0","","0","0","0","0","2020-06-30"
-                    """
-                    line_data = line.split('","')
-                    if len(line_data) < 24:
-                        continue
-                    weibo_content = line_data[9].replace('\n', ' ') if line_data[3] == "0" else line_data[9].replace('\n', ' ') + '//' + line_data[22].replace('\n', ' ')
-                    result_set.add((kid2,line_data[8],line_data[4],line_data[17],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content))
-                # 判断date(datetime)是否比2019-08-09晚
-                elif date >= datetime(2019, 8, 9):
-                # if year >= 2020:
-                    line_data = line.strip().split("\t")
-                    try:
-                        data = json.loads(line_data[1])
-                    except IndexError as e:
-                        print(f"IndexError occurred: {e}")
-                        continue
-                    except json.JSONDecodeError as e:
-                        print(f"JSONDecodeError: {e}")
-                        # 打印出错误位置
-                        print(f"Error at line {e.lineno}, column {e.colno}")
-                        # 打印出错误字符位置
-                        print(f"Error at character {e.pos}, {line_data[1][int(e.pos)-20: int(e.pos)+20]}")
-                        continue
-                    
-                    try:
-                        weibo_content = data['weibo_content'].replace('\n', ' ') if data['is_retweet'] == "0" else data['weibo_content'].replace('\n', ' ') + '//' + data['r_weibo_content'].replace('\n', ' ')
-                        result_set.add((kid2,data['weibo_id'],data['user_id'],data['time_stamp'],data['is_retweet'],data['zhuan'],data['ping'],data['zhan'],weibo_content))
-                    except KeyError:
-                        continue
-                else:
-                    line_data = line.split("\t")
-                    if len(line_data) < 24:
-                        continue
-                    weibo_content = line_data[9].replace('\n', ' ') if line_data[3] == "0" else line_data[9].replace('\n', ' ') + '//' + line_data[22].replace('\n', ' ')
-                    result_set.add((kid2,line_data[8],line_data[4],line_data[17],line_data[3],line_data[10],line_data[11],line_data[12],weibo_content))
-
-
-
-def process_file(date, file_path):
+        kids = match_text(line, automation1, automation2)
+        if kids:
+            hits.append((line, kids))
+    return hits
+
+
+def process_chunk(date, chunk, automation1, automation2, result_set, profiler=None):
+    """
+    先用自动机在整行上粗筛（match阶段），再逐行解析（parse阶段），每行只解析一次
+    整行还包含用户名、转发原文作者等字段，解析后在 weibo_content 上复核一次，与 process_corpus_day 的匹配口径一致
+    """
+    profiler = profiler if profiler is not None else StageProfiler()
+    with profiler.stage("match"):
+        hits = match_chunk(chunk, automation1, automation2)
+    profiler.count("matched_lines", len(hits))
+
+    with profiler.stage("parse"):
+        for line, _ in hits:
+            record = parse_line(date, line.strip(), profiler)
+            if record is None:
+                continue
+            kids = match_text(record[7], automation1, automation2)
+            for kid2 in kids:
+                result_set.add((kid2,) + record)
+
+
+def build_keyword_automatons(child_keywords=CHILD_KEYWORDS, quality_keywords=QUALITY_KEYWORDS):
+    """
+    子女关键词和品质关键词各一个 Aho-Corasick 自动机，value 为 (idx, keyword)
+    由 utils.automaton 注册表缓存，每个进程只加载一次
+    """
+    automation1 = get_automaton(enumerate(child_keywords))
+    automation2 = get_automaton(enumerate(quality_keywords))
+    return automation1, automation2
+
+
+def process_file(date, file_path, profiler=None):
     """
     处理单个文件并完成存储
+    profiler 记录 read / match / parse 阶段耗时，以及 lines / bytes / matched_lines / json_errors
     """
-    child_keywords = ["子女", "女儿", "儿子", "孙女", "孙子", "带娃", "带孩子", "养育", "养娃"] # "女孩", "男孩", TODO 去除女孩、男孩
-    quality_keywords = ["独立", "自主", "自理能力", "自立", "挫折教育", "娇气", "脆弱", "温室", "勇敢", "坚强", "自强", "害怕", "溺爱", "男子汉", "自我生存", "依赖性", "努力", "刻苦", "勤劳", "坚持", "有恒心", "半途而废", "懒散", "不上进", "携带", "责任心", "有担当", "可靠", "暖心", "逃避责任", "不负责任", "懂事", "教养", "包容", "宽容", "理解他人", "体谅"]
-    # 初始化 Aho-Corasick 自动机
-    automation1 = ahocorasick.Automaton()
-    automation2 = ahocorasick.Automaton()
-
-    for idx, keyword in enumerate(child_keywords):
-        # 添加关键词，假设关键词格式为 #keyword#
-        automation1.add_word(f"{keyword}", (idx, keyword))
-    for idx, keyword in enumerate(quality_keywords):
-        automation2.add_word(f"{keyword}", (idx, keyword))
-    automation1.make_automaton()
-    automation2.make_automaton()
+    profiler = profiler if profiler is not None else StageProfiler()
+    automation1, automation2 = build_keyword_automatons()
 
     # 结果字典
     result_set = set()
 
+    profiler.count("bytes", os.path.getsize(file_path))
+
     # 读取文件并分块处理
     chunk_size = 500000
     with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
         chunk = []
+        read_start = time.perf_counter()
         for line in file:
             chunk.append(line.strip())
             if len(chunk) == chunk_size:
-                process_chunk(date, chunk, automation1, automation2, result_set)
+                profiler.add_time("read", time.perf_counter() - read_start)
+                profiler.count("lines", len(chunk))
+                process_chunk(date, chunk, automation1, automation2, result_set, profiler)
                 chunk = []
+                read_start = time.perf_counter()
+        profiler.add_time("read", time.perf_counter() - read_start)
         # 处理最后一个不满 chunk_size 的块
         if chunk:
-            process_chunk(date, chunk, automation1, automation2, result_set)
+            profiler.count("lines", len(chunk))
+            process_chunk(date, chunk, automation1, automation2, result_set, profiler)
     
     return result_set
 
 
+CORPUS_READ_COLUMNS = ["weibo_id", "user_id", "time_stamp", "is_retweet", "zhuan", "ping", "zhan", "weibo_content", "r_weibo_content", "user_type"]
+
+
+def process_corpus_day(date_str, profiler=None, baseline=None):
+    """
+    从列式语料（见 freshdata_corpus.py）中抽取一天的数据，结果与 process_file 相同格式
+    只在正文（转发时为 正文//原文）上匹配，不再扫描昵称、设备等其他字段
+    baseline: word_baseline.WordBaseline，传入时在同一次扫描中统计全部微博的词频（baseline阶段）
+    """
+    profiler = profiler if profiler is not None else StageProfiler()
+    automation1, automation2 = build_keyword_automatons()
+    result_set = set()
+
+    batches = iter_corpus_batches(date_str, columns=CORPUS_READ_COLUMNS)
+    while True:
+        with profiler.stage("read"):
+            batch = next(batches, None)
+            if batch is None:
+                break
+            columns = {name: batch.column(name).to_pylist() for name in CORPUS_READ_COLUMNS}
+        profiler.count("lines", batch.num_rows)
+
+        with profiler.stage("parse"):
+            rows = []
+            for values in zip(*(columns[name] for name in CORPUS_READ_COLUMNS)):
+                fields = ["" if v is None else str(v) for v in values[:7]]
+                weibo_content = (values[7] or "").replace('\n', ' ')
+                if fields[3] != "0":
+                    weibo_content = weibo_content + '//' + (values[8] or "").replace('\n', ' ')
+                rows.append(tuple(fields) + (weibo_content, values[9] or ""))
+
+        if baseline is not None:
+            with profiler.stage("baseline"):
+                baseline.update(columns["weibo_content"])
+
+        with profiler.stage("match"):
+            for row in rows:
+                kids = match_text(row[7], automation1, automation2)
+                if kids:
+                    profiler.count("matched_lines")
+                    for kid2 in kids:
+                        result_set.add((kid2,) + row)
+
+    return result_set
+
+
 def append_to_parquet(date, results):
     """
     将数据追加到指定年份的 Parquet 文件中。
@@ -192,8 +300,7 @@ def append_to_parquet(date, results):
     :param results: 结果数据列表
     """
     output_parquet_path = f"{TEXT_DIR}/{date}.parquet"
-    columns = ["keyword_id", "weibo_id", "user_id", "time_stamp", "is_retweet", "zhuan", "ping", "zhan", "weibo_content"]
-    df = pd.DataFrame(list(results), columns=columns)
+    df = pd.DataFrame(list(results), columns=OUTPUT_COLUMNS)
 
     # # 检查文件是否存在
     # if not os.path.exists(output_parquet_path):
@@ -205,6 +312,23 @@ def append_to_parquet(date, results):
     #     log(f"追加数据到文件：{output_parquet_path}")
 
 
+def get_user_sketch_path(date):
+    return f"{TEXT_DIR}/{date}_hll.parquet"
+
+
+def write_user_sketches(date, results):
+    """
+    每个品质关键词当天发帖用户的 HyperLogLog，写入 {TEXT_DIR}/{date}_hll.parquet（keyword_id, keyword, registers）
+    跨日期、跨关键词合并后即得到任意范围的去重用户数，见 keyword_text_analysis.distinct_users
+    """
+    results = list(results)
+    sketches = build_sketches([r[0] for r in results], [r[2] for r in results])
+    write_sketch_table(
+        get_user_sketch_path(date), sketches, key_name="keyword_id",
+        extra_columns={"keyword": {kid: QUALITY_KEYWORDS[kid] for kid in sketches}},
+    )
+
+
 """
 统计四个结果：
 1. 不同关键词的词频
@@ -221,11 +345,16 @@ def write_count_lines(year, mode, content):
     with open(f"logs/line_count_{year}_{mode}.txt", "a") as f:
         f.write(content)
 
-def process_year(year, mode, action="extract"):
+def process_year(year, mode, action="extract", source="archive", baseline=False):
     """
     action:
     extract - 从文本中提取含有关键词的内容
     count - 统计文本行数
+    sketch - 由已有的 {TEXT_DIR}/{date}.parquet 补建去重用户 sketch（不读取原始数据）
+    source:
+    archive - 逐日解压 weibo_freshdata.*.7z
+    corpus - 读取 freshdata_corpus.py 转换好的列式语料（不支持 count；sketch 只读已有结果，与 source 无关）
+    baseline: 同时统计全平台词频基线（见 word_baseline.py），仅支持 corpus
     """
     start_date_options = [datetime(year, 1, 1), datetime(year, 7, 1)]
     end_date_options = [datetime(year, 6, 30), datetime(year, 12, 31)]
@@ -237,20 +366,70 @@ def process_year(year, mode, action="extract"):
         end_date = end_date_options[mode]
 
     current_date = start_date
+    if action not in ("extract", "count", "sketch"):
+        raise ValueError(f"unsupported action: {action}")
+    if source not in ("archive", "corpus"):
+        raise ValueError(f"unsupported source: {source}")
+    if source == "corpus" and action == "count":
+        raise ValueError("action=count requires source=archive")
+    if baseline:
+        if source != "corpus":
+            raise ValueError("baseline requires source=corpus")
+        from word_baseline import WordBaseline, baseline_exists
 
     date_range = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
     
+    profiler = StageProfiler(f"logs/profile_keyword_{year}_{mode}.jsonl")
+
     for current_date in date_range:
         date_str = current_date.strftime("%Y-%m-%d")
 
-        file_path = unzip_one_fresh_data_file(year, date_str)
+        if action == "sketch":
+            output_parquet_path = f"{TEXT_DIR}/{date_str}.parquet"
+            if not os.path.exists(output_parquet_path):
+                continue
+            df = pd.read_parquet(output_parquet_path, columns=["keyword_id", "weibo_id", "user_id"])
+            write_user_sketches(date_str, df.itertuples(index=False))
+            print(f"sketched {date_str}")
+            continue
+
+        if source == "corpus" and action == "extract":
+            if not corpus_partition_exists(date_str):
+                print(f"corpus partition of {date_str} not exists")
+                continue
+            start_timestamp = int(time.time())
+            day_baseline = WordBaseline() if baseline and not baseline_exists(date_str) else None
+            results = process_corpus_day(date_str, profiler, day_baseline)
+            if day_baseline is not None:
+                with profiler.stage("write"):
+                    day_baseline.save(date_str)
+            with profiler.stage("write"):
+                append_to_parquet(date_str, results)
+            with profiler.stage("sketch"):
+                write_user_sketches(date_str, results)
+            profiler.count("records", len(results))
+            log(
+                f"处理 {date_str} 完成，耗时 {int(time.time()) - start_timestamp} 秒。",
+                f"{year}_{mode}",
+            )
+            print(f"finished {date_str} with {len(results)} records")
+            profiler.record(date=date_str, action=action, source=source)
+            continue
+
+        with profiler.stage("decompress"):
+            file_path = unzip_one_fresh_data_file(year, date_str)
         # file_path = f"text_working_data/{year}/weibo_freshdata.test"
         if file_path is None:
+            profiler.reset()
             continue
         start_timestamp = int(time.time())
         if action == "extract":
-            results = process_file(current_date, file_path)
-            append_to_parquet(date_str, results)
+            results = process_file(current_date, file_path, profiler)
+            with profiler.stage("write"):
+                append_to_parquet(date_str, results)
+            with profiler.stage("sketch"):
+                write_user_sketches(date_str, results)
+            profiler.count("records", len(results))
 
             log(
                 f"处理 {date_str} 完成，耗时 {int(time.time()) - start_timestamp} 秒。",
@@ -258,7 +437,9 @@ def process_year(year, mode, action="extract"):
             )
             print(f"finished {date_str} with {len(results)} records")
         elif action == "count":
-            line_count = count_lines(file_path)
+            with profiler.stage("read"):
+                line_count = count_lines(file_path)
+            profiler.count("lines", line_count)
             output = f"{date_str},{line_count}\n"
             write_count_lines(year, mode, output)
             log(
@@ -268,6 +449,7 @@ def process_year(year, mode, action="extract"):
             print(f"finished {date_str}  records")
 
         delete_unzipped_fresh_data_file(year, date_str)
+        profiler.record(date=date_str, action=action)
         
 
 
@@ -278,5 +460,7 @@ if __name__ == "__main__":
     parser.add_argument("--year", type=int, default=2023)
     parser.add_argument("--mode", type=int, default=1)
     parser.add_argument("--action", type=str, default="extract")
+    parser.add_argument("--source", type=str, default="archive", choices=["archive", "corpus"])
+    parser.add_argument("--baseline", action="store_true", help="同时统计全平台词频基线（仅 corpus）")
     args = parser.parse_args()
-    process_year(args.year, args.mode, args.action)
+    process_year(args.year, args.mode, args.action, args.source, args.baseline)
@@ -12,7 +12,8 @@ import os
 import jieba
 import json
 from utils.utils import weibo_text_cleaner
-from collections import defaultdict
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 SOURCE_DIR = "keyword_data"
 
@@ -31,6 +32,18 @@ def get_stopwords():
         stopwords = set(f.read().splitlines())
     return stopwords
 
+# 子进程中的停用词表，由initializer加载一次
+_worker_stopwords = None
+
+# 每批送入子进程的行数
+BATCH_SIZE = 20000
+
+
+def _init_worker():
+    global _worker_stopwords
+    _worker_stopwords = get_stopwords()
+
+
 def get_word_freq(content, stopwords):
     words = jieba.cut(content,)
     word_freq = {}
@@ -41,32 +54,80 @@ def get_word_freq(content, stopwords):
             word_freq[word] = word_freq.get(word, 0) + 1
     return word_freq
 
-def get_word_freq_dict():
+
+def count_batch(lines):
+    """
+    子进程：对一批已清洗的行逐行分词
+    返回 (词频Counter, 文档频率Counter)，文档频率按"出现该词的行数"计
+    """
+    term_freq = Counter()
+    doc_freq = Counter()
+    for line in lines:
+        word_freq = get_word_freq(line, _worker_stopwords)
+        term_freq.update(word_freq)
+        doc_freq.update(word_freq.keys())
+    return term_freq, doc_freq
+
+
+def iter_cleaned_batches(file_path, batch_size=BATCH_SIZE):
+    """逐行读取并清洗，按batch_size分批产出，避免整个文件驻留内存"""
+    batch = []
+    with open(file_path, 'r', errors='replace') as f:
+        for line in f:
+            cleaned_line = weibo_text_cleaner(line.rstrip("\n"))
+            if cleaned_line:
+                batch.append(cleaned_line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def count_file(file_path, workers=4):
     """
-    每个kid写入一个csv，命名为kid.csv，第一列为word，第二列为词频。保留词频大于总行数10%的词，按词频降序排列
+    多进程流式统计一个文件的词频与文档频率
+    同时在途的批次数限制为 2 * workers，内存占用与文件大小无关
+    """
+    term_freq = Counter()
+    doc_freq = Counter()
+    total_lines = 0
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for batch in iter_cleaned_batches(file_path):
+            total_lines += len(batch)
+            pending.add(executor.submit(count_batch, batch))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tf, df = future.result()
+                    term_freq.update(tf)
+                    doc_freq.update(df)
+        for future in pending:
+            tf, df = future.result()
+            term_freq.update(tf)
+            doc_freq.update(df)
+    return term_freq, doc_freq, total_lines
+
+
+def get_word_freq_dict(workers=4, threshold=0.05):
+    """
+    每个kid写入一个csv，命名为kname-freq.csv，列为word, freq（词频）, doc_freq（出现该词的行数）, doc_ratio（doc_freq占总行数的比例）
+    保留doc_freq大于总行数threshold（默认5%）的词，按词频降序排列
     """
     keywords_dict = get_keywords_dict()
 
-    stopwords = get_stopwords()
     for kid in range(1, 11):
         kname = keywords_dict[str(int(kid))]['keyword']
 
-        with open(f"{SOURCE_DIR}/{kid}.txt", 'r') as f:
-            content = f.read()
-        cleaned_content = []
-        for line in content.splitlines():
-            cleaned_line = weibo_text_cleaner(line)
-            if cleaned_line:
-                cleaned_content.append(cleaned_line)
-        word_freq = get_word_freq("\n".join(cleaned_content), stopwords)
-        total_lines = len(cleaned_content)
+        term_freq, doc_freq, total_lines = count_file(f"{SOURCE_DIR}/{kid}.txt", workers)
         print(f"Total lines for kid {kid}: {total_lines}")
-        word_freq = {k: v for k, v in word_freq.items() if v > total_lines * 0.05}
-        word_freq = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
+        word_freq = [(k, v) for k, v in term_freq.items() if doc_freq[k] > total_lines * threshold]
+        word_freq = sorted(word_freq, key=lambda x: x[1], reverse=True)
         with open(f"{SOURCE_DIR}/{kname}-freq.csv", 'w') as f:
-            f.write("word,freq\n")
+            f.write("word,freq,doc_freq,doc_ratio\n")
             for word, freq in word_freq:
-                f.write(f"{word},{freq}\n")
+                f.write(f"{word},{freq},{doc_freq[word]},{doc_freq[word] / total_lines:.4f}\n")
 
 def output_keyword_count_to_csv():
     keywords_dict = get_keywords_dict()
@@ -0,0 +1,188 @@
+"""
+品质关键词的日计数立方体：date × keyword × is_retweet × user_type
+
+keyword_cube/
+|-counts.npy       # int32，形状 (日期数, 关键词数, 3, 用户类型数)
+|-day_totals.npy   # int64，每天的微博总数（logs/line_count_{year}_2.txt），没有统计的日期为0
+|-labels.json      # 各维度的标签：dates, keywords, qualities（与keywords一一对应）, is_retweet, user_types
+
+计数口径：每天的 keyword_text_data/{date}.parquet 按 weibo_id 去重后，统计原创部分（// 之前）含有该关键词的微博数
+没有 user_type 列的旧文件记为 "unknown"；is_retweet 不是 "0" / "1" 的行（解析异常等）记为 "other"，不丢弃
+
+用法：
+python keyword_cube.py --years 2016 2017 ... 2023   # 构建
+cube = KeywordCube.load()
+cube.rollup("month", by="quality", is_retweet=0)    # 毫秒级得到任意切片的汇总表
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from bangdan_table import SEASON_MAP
+from keyword_text_analysis import TEXT_DIR, keywords, keyword_to_quality, load_year_line_count
+from utils.utils import KeywordMatcher, split_retweet
+
+CUBE_DIR = "keyword_cube"
+IS_RETWEET_LABELS = ["0", "1", "other"]
+UNKNOWN_USER_TYPE = "unknown"
+
+
+def count_day(date_str):
+    """
+    一天的计数，返回 DataFrame(keyword, is_retweet, user_type, count)，文件不存在时返回None
+    """
+    file_path = f"{TEXT_DIR}/{date_str}.parquet"
+    if not os.path.exists(file_path):
+        return None
+    available = set(pq.ParquetFile(file_path).schema.names)
+    columns = [c for c in ["weibo_id", "is_retweet", "user_type", "weibo_content"] if c in available]
+    df = pd.read_parquet(file_path, columns=columns).drop_duplicates("weibo_id")
+    if "user_type" not in df.columns:
+        df["user_type"] = UNKNOWN_USER_TYPE
+    df["user_type"] = df["user_type"].fillna(UNKNOWN_USER_TYPE).replace("", UNKNOWN_USER_TYPE)
+    df["is_retweet"] = df["is_retweet"].astype(str)
+    df.loc[~df["is_retweet"].isin(IS_RETWEET_LABELS[:2]), "is_retweet"] = IS_RETWEET_LABELS[2]
+
+    matcher = KeywordMatcher({"quality": keywords})
+    df["keyword"] = [matcher.match(text)["quality"] for text in split_retweet(df["weibo_content"].fillna(""))]
+    df = df.explode("keyword").dropna(subset=["keyword"])
+    return df.groupby(["keyword", "is_retweet", "user_type"]).size().rename("count").reset_index()
+
+
+def build_cube(years=range(2016, 2024), workers=4, cube_dir=CUBE_DIR):
+    """
+    并行统计每一天，汇总为立方体；与 year_analysis 相同，只统计 line_count 中有记录的日期
+    """
+    total_count_map = {}
+    for year in years:
+        total_count_map.update(load_year_line_count(year))
+    start_date = datetime(min(years), 1, 1)
+    end_date = datetime(max(years), 12, 31)
+    dates = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end_date - start_date).days + 1)]
+
+    day_counts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(count_day, date_str): date_str for date_str in dates if date_str in total_count_map}
+        for future in as_completed(futures):
+            date_str = futures[future]
+            result = future.result()
+            if result is not None:
+                day_counts[date_str] = result
+                print(f"counted {date_str}")
+
+    user_types = sorted({t for df in day_counts.values() for t in df["user_type"]})
+    date_index = {d: i for i, d in enumerate(dates)}
+    keyword_index = {k: i for i, k in enumerate(keywords)}
+    user_type_index = {t: i for i, t in enumerate(user_types)}
+
+    counts = np.zeros((len(dates), len(keywords), len(IS_RETWEET_LABELS), len(user_types)), dtype=np.int32)
+    for date_str, df in day_counts.items():
+        other = int(df.loc[df["is_retweet"] == IS_RETWEET_LABELS[2], "count"].sum())
+        if other:
+            print(f"{date_str}: {other} keyword hits with is_retweet other than 0/1")
+        counts[
+            date_index[date_str],
+            df["keyword"].map(keyword_index).values,
+            df["is_retweet"].map(IS_RETWEET_LABELS.index).values,
+            df["user_type"].map(user_type_index).values,
+        ] = df["count"].values
+    day_totals = np.array([total_count_map.get(d, 0) for d in dates], dtype=np.int64)
+
+    labels = {
+        "dates": dates,
+        "keywords": keywords,
+        "qualities": [keyword_to_quality[k] for k in keywords],
+        "is_retweet": IS_RETWEET_LABELS,
+        "user_types": user_types,
+    }
+    os.makedirs(cube_dir, exist_ok=True)
+    for name, array in [("counts", counts), ("day_totals", day_totals)]:
+        with open(f"{cube_dir}/{name}.npy.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{cube_dir}/{name}.npy.tmp", f"{cube_dir}/{name}.npy")
+    with open(f"{cube_dir}/labels.json.tmp", "w") as f:
+        json.dump(labels, f, ensure_ascii=False)
+    os.replace(f"{cube_dir}/labels.json.tmp", f"{cube_dir}/labels.json")
+    print(f"cube {counts.shape} saved to {cube_dir}")
+    return KeywordCube(counts, day_totals, labels)
+
+
+def cube_exists(cube_dir=CUBE_DIR):
+    return all(os.path.exists(f"{cube_dir}/{name}") for name in ["counts.npy", "day_totals.npy", "labels.json"])
+
+
+class KeywordCube(object):
+
+    def __init__(self, counts, day_totals, labels):
+        self.counts = counts
+        self.day_totals = day_totals
+        self.labels = labels
+        self.dates = pd.to_datetime(pd.Series(labels["dates"]))
+
+    @classmethod
+    def load(cls, cube_dir=CUBE_DIR):
+        with open(f"{cube_dir}/labels.json", "r") as f:
+            labels = json.load(f)
+        return cls(np.load(f"{cube_dir}/counts.npy"), np.load(f"{cube_dir}/day_totals.npy"), labels)
+
+    def slice(self, is_retweet=None, user_types=None):
+        """
+        按转发与否、用户类型筛选后求和，返回 (日期数, 关键词数) 的数组
+        is_retweet: None 为全部，0 / 1 只保留原创 / 转发，"other" 为无法判断的行
+        user_types: None 为全部，否则为用户类型列表
+        """
+        counts = self.counts
+        if is_retweet is not None:
+            counts = counts[:, :, [self.labels["is_retweet"].index(str(is_retweet))], :]
+        if user_types is not None:
+            idx = [self.labels["user_types"].index(t) for t in user_types if t in self.labels["user_types"]]
+            counts = counts[:, :, :, idx]
+        return counts.sum(axis=(2, 3), dtype=np.int64)
+
+    def get_periods(self, timewindow):
+        if timewindow == "day":
+            return self.dates.dt.strftime("%Y-%m-%d")
+        elif timewindow == "month":
+            return self.dates.dt.strftime("%Y-%m")
+        elif timewindow == "season":
+            return self.dates.dt.strftime("%Y") + "-" + ((self.dates.dt.month - 1) // 3).map(SEASON_MAP)
+        elif timewindow == "year":
+            return self.dates.dt.year
+        raise ValueError(f"unknown timewindow: {timewindow}")
+
+    def rollup(self, timewindow="month", by="keyword", is_retweet=None, user_types=None):
+        """
+        汇总到 timewindow（day / month / season / year），by 为 keyword 或 quality
+        返回 DataFrame(timewindow, by, frequency, total_count, proportion)，total_count 为该时段的微博总数
+        """
+        counts = self.slice(is_retweet, user_types)
+        periods = self.get_periods(timewindow).values
+        frame = pd.DataFrame(counts, columns=self.labels["keywords"])
+        if by == "quality":
+            frame = frame.T.groupby(self.labels["qualities"], sort=False).sum().T
+        elif by != "keyword":
+            raise ValueError(f"unknown by: {by}")
+        frame = frame.groupby(periods, sort=False).sum()
+        totals = pd.Series(self.day_totals).groupby(periods, sort=False).sum()
+
+        frame.index.name = timewindow
+        frame.columns.name = by
+        tidy = frame.stack().rename("frequency").reset_index()
+        tidy["total_count"] = tidy[timewindow].map(totals)
+        tidy["proportion"] = (tidy["frequency"] / tidy["total_count"]).where(tidy["total_count"] > 0)
+        return tidy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2024)))
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    build_cube(args.years, args.workers)
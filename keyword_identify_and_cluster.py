@@ -6,7 +6,6 @@
 
 import os
 import glob
-import re
 import fire
 
 import jieba
@@ -26,6 +25,8 @@ from sklearn.metrics import silhouette_score, calinski_harabasz_score
 from typing import List, Optional, Dict
 from collections import defaultdict
 
+from word_baseline import init_jieba, load_stopwords, clean_text, load_month_baseline
+
 # 配置常量
 TEXT_DIR = "text_data"
 OUTPUT_DIR = "clustering_results"
@@ -59,12 +60,8 @@ class WeiboProcessor(object):
         
 
     def _init_jieba(self):
-        """初始化jieba配置"""
-        jieba.initialize()
-        # 添加微博特殊词汇
-        jieba.add_word('鸡娃', freq=2000)
-        jieba.add_word('双减', freq=2000)
-        jieba.suggest_freq(('亲子', '教育'), True)
+        """初始化jieba配置（与 word_baseline 的全平台基线共用，保证分词一致）"""
+        init_jieba()
     
 
     def _init_bert(self):
@@ -76,20 +73,11 @@ class WeiboProcessor(object):
 
     def _load_stopwords(self, filepath: str) -> set:
         """加载停用词表"""
-        if not os.path.exists(filepath):
-            return set()
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return {line.strip() for line in f}
+        return load_stopwords(filepath)
 
     def clean_weibo_text(self, text: str) -> str:
         """清洗微博文本"""
-        if not isinstance(text, str):
-            return ""
-        # 移除URL、@用户、话题标签等
-        text = re.sub(r'(https?://\S+|@\w+|#\w+#)', '', text)
-        # 移除特殊符号但保留中文标点
-        text = re.sub(r'[^\w\u4e00-\u9fff\，\。\！\？]', '', text)
-        return text.strip()
+        return clean_text(text)
 
     def tokenize_with_filter(self, text: str) -> List[str]:
         """
@@ -219,6 +207,38 @@ def keyword_frequency_extractor(parquet_files, year: Optional[int] = None):
     output_file = os.path.join(OUTPUT_DIR, f"top_words_{year or 'all'}.csv")
     processor.save_top_words(word_counts, output_file)
 
+def word_lift(parquet_files, year: Optional[int] = None, min_count: int = 20):
+    """
+    每月育儿子集的词频相对全平台基线（word_baseline.py）的提升度：
+    lift = (子集词频 / 子集总词数) / (基线词频 / 基线总词数)
+    基线频次是上界估计，lift 偏保守；没有基线的月份跳过
+    """
+    processor = WeiboProcessor()
+    files_by_month = defaultdict(list)
+    for file in parquet_files:
+        files_by_month[os.path.basename(file)[:7]].append(file)
+
+    tables = []
+    for month, files in sorted(files_by_month.items()):
+        baseline = load_month_baseline(month)
+        if baseline is None or baseline.n_tokens == 0:
+            print(f"No word baseline for {month}")
+            continue
+        word_counts = processor.process_parquet_files(files)
+        subset_total = sum(word_counts.values())
+        df = pd.DataFrame(list(word_counts.items()), columns=['word', 'count'])
+        df = df[df['count'] >= min_count].copy()
+        df['baseline_count'] = baseline.estimate(df['word'])
+        df['lift'] = (df['count'] / subset_total) / (df['baseline_count'].clip(lower=1) / baseline.n_tokens)
+        df.insert(0, 'month', month)
+        tables.append(df.sort_values('lift', ascending=False))
+
+    if not tables:
+        return
+    output_file = os.path.join(OUTPUT_DIR, f"word_lift_{year or 'all'}.csv")
+    pd.concat(tables).to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"Saved word lift to {output_file}")
+
 def clustering(parquet_files, year: Optional[int] = None):
     processor = WeiboProcessor()
     processor.cluster_all_parquet_files(parquet_files)
@@ -229,7 +249,7 @@ def clustering(parquet_files, year: Optional[int] = None):
 def main(action: str, year: Optional[int] = None):
     """
     主处理函数
-    :param action: 行动，frequency/clustering
+    :param action: 行动，frequency/lift/clustering
     :param year: 指定处理的年份，None表示处理所有年份
     """
 
@@ -247,6 +267,8 @@ def main(action: str, year: Optional[int] = None):
     
     if action == "frequency":
         keyword_frequency_extractor(parquet_files, year)
+    elif action == "lift":
+        word_lift(parquet_files, year)
     elif action == "clustering":
         clustering(parquet_files, year)
 
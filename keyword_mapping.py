@@ -27,18 +27,26 @@ value是
 对每个parquet文件中的weibo_content进行处理
 如果keyword存在于这个weibo_content中
 那么就将这个content写入一个以keyword id命名的txt文件中
+（现在写入 {year}-{kid}.parquet，带 weibo_id、date、content_hash，由 keyword_merge.py 合并为 {kid}.txt）
 """
 
 import os
 import json
 import pandas as pd
 import argparse
+import ahocorasick
 from datetime import datetime, timedelta
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.utils import text_hash
 
 TEXT_DIR = "text_data"
 OUTPUT_DIR = "keyword_data"
 
+# 每个kid的输出parquet的列
+OUTPUT_COLUMNS = ["weibo_id", "date", "content_hash", "weibo_content"]
+
 def get_keywords_dict():
     """加载关键词字典并预处理"""
     with open('data/keywords_dict.json', 'r') as f:
@@ -48,58 +56,128 @@ def get_keywords_dict():
         keywords_dict[k]['all_keywords'] = set(v['synonyms'] + v['antonyms'])
     return keywords_dict
 
-def process_parquet(year, output_suffix=""):
-    """处理指定年份的 Parquet 文件"""
-    keywords_dict = get_keywords_dict()
-    full_keywords = set()
+def build_keyword_automaton(keywords_dict):
+    """
+    所有关键词建一个自动机，value为 (keyword, 包含该关键词的kid集合)
+    同一个关键词可能同时属于多个kid
+    """
+    keyword_to_kids = defaultdict(set)
     for kid, info in keywords_dict.items():
-        full_keywords.update(info['all_keywords'])
+        for keyword in info['all_keywords']:
+            keyword_to_kids[keyword].add(kid)
+
+    automaton = ahocorasick.Automaton()
+    for keyword, kids in keyword_to_kids.items():
+        automaton.add_word(keyword, (keyword, frozenset(kids)))
+    automaton.make_automaton()
+    return automaton
+
+
+# 子进程中的自动机，由initializer构建一次
+_worker_automaton = None
+
+
+def _init_worker():
+    global _worker_automaton
+    _worker_automaton = build_keyword_automaton(get_keywords_dict())
+
+
+def match_content(content, automaton):
+    """
+    单次扫描一条微博，返回 (命中的kid集合, 命中的关键词集合)
+    """
+    matched_kids = set()
+    matched_keywords = set()
+    for _, (keyword, kids) in automaton.iter(content):
+        matched_keywords.add(keyword)
+        matched_kids.update(kids)
+    return matched_kids, matched_keywords
+
+
+def process_single_parquet(parquet_path):
+    """
+    子进程：处理一天的 Parquet 文件
+    每条微博只扫描一次，关键词计数按微博计（一条微博中出现多次只计一次）
+    返回 (当天命中的DataFrame, 关键词计数)，DataFrame 在当天内已按 (kid, content_hash) 去重
+    """
+    date_str = os.path.basename(parquet_path)[:-len(".parquet")]
+    keywords_count = defaultdict(int)
+    rows = []
+
+    df = pd.read_parquet(parquet_path, columns=['weibo_id', 'weibo_content'])
+    for weibo_id, content in zip(df['weibo_id'], df['weibo_content']):
+        content = content.split('//')[0]  # 去除微博内容中的转发
+        matched_kids, matched_keywords = match_content(content, _worker_automaton)
+        if not matched_kids:
+            continue
+        content_hash = text_hash(content)
+        for kid in matched_kids:
+            rows.append((kid, weibo_id, date_str, content_hash, content))
+        for keyword in matched_keywords:
+            keywords_count[keyword] += 1
+
+    day_df = pd.DataFrame(rows, columns=['kid'] + OUTPUT_COLUMNS)
+    day_df.drop_duplicates(subset=['kid', 'content_hash'], inplace=True)
+    return day_df, keywords_count
+
+
+def get_keyword_output_path(kid, output_suffix=""):
+    return f"{OUTPUT_DIR}/{output_suffix}{kid}.parquet"
 
+
+def process_parquet(year, output_suffix="", workers=4):
+    """
+    处理指定年份的 Parquet 文件，每天一个文件，多进程并行
+    每处理完一天，就把新出现的文本追加到 {output_suffix}{kid}.parquet（每天一个row group）
+    跨天去重只保留内容哈希，全年的匹配文本不会驻留内存
+    """
     # 生成日期范围
     start_date = datetime(year, 1, 1)
     end_date = datetime(year, 12, 31)
     date_range = pd.date_range(start=start_date, end=end_date)
 
-    keywords_count = defaultdict(int)
-
-    # 使用 defaultdict 存储匹配结果
-    keyword_texts = defaultdict(set)
-
-    # 遍历日期范围
+    parquet_paths = []
     for date in date_range:
         date_str = date.strftime('%Y-%m-%d')
         parquet_path = f"{TEXT_DIR}/{date_str}.parquet"
-
         # 如果文件不存在，跳过
-        if not os.path.exists(parquet_path):
-            continue
+        if os.path.exists(parquet_path):
+            parquet_paths.append(parquet_path)
+
+    # 重新运行时先清除上一次的输出，避免重复追加
+    keywords_dict = get_keywords_dict()
+    for kid in keywords_dict:
+        keyword_path = get_keyword_output_path(kid, output_suffix)
+        if os.path.exists(keyword_path):
+            os.remove(keyword_path)
+
+    keywords_count = defaultdict(int)
+    seen_hashes = defaultdict(set)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for day_df, day_count in executor.map(process_single_parquet, parquet_paths):
+            for keyword, count in day_count.items():
+                keywords_count[keyword] += count
+
+            for kid, kid_df in day_df.groupby('kid'):
+                kid_df = kid_df[~kid_df['content_hash'].isin(seen_hashes[kid])]
+                if kid_df.empty:
+                    continue
+                seen_hashes[kid].update(kid_df['content_hash'])
+                keyword_path = get_keyword_output_path(kid, output_suffix)
+                kid_df[OUTPUT_COLUMNS].to_parquet(
+                    keyword_path,
+                    engine="fastparquet",
+                    index=False,
+                    append=os.path.exists(keyword_path),
+                )
 
-        # 读取 Parquet 文件
-        df = pd.read_parquet(parquet_path)
-
-        # 遍历关键词字典
-        for kid, info in keywords_dict.items():
-            keywords = info['all_keywords']  # 获取关键词集合
-            for content in df['weibo_content']:
-                # 使用集合匹配提高效率
-                content = content.split('//')[0]  # 去除微博内容中的转发
-                if any(keyword in content for keyword in keywords):
-                    keyword_texts[kid].add(content)
-                    for single_keyword in full_keywords:
-                        if single_keyword in content:
-                            keywords_count[single_keyword] += 1   
-
-    # 将匹配结果写入文件
-    for kid, texts in keyword_texts.items():
-        keyword_path = f"{OUTPUT_DIR}/{output_suffix}{kid}.txt"
-        with open(keyword_path, 'w') as f:
-            f.write('\n'.join(texts))
-    
     with open(f"{OUTPUT_DIR}/{output_suffix}keywords_count.json", 'w') as f:
         json.dump(keywords_count, f, ensure_ascii=False)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--year', type=int, required=True, default=2020)
+    parser.add_argument('--workers', type=int, default=4)
     args = parser.parse_args()
-    process_parquet(args.year, f"{args.year}-")
\ No newline at end of file
+    process_parquet(args.year, f"{args.year}-", args.workers)
\ No newline at end of file
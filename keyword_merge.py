@@ -1,31 +1,48 @@
+"""
+将 keyword_mapping.py 输出的 {year}-{kid}.parquet 合并为 {kid}.txt（每行一条微博，供 keyword_analysis.py 使用）
+逐个 row group 读取、逐行写出，内存占用与数据量无关
+"""
+
 import os
 from collections import defaultdict
 import json
 
+from fastparquet import ParquetFile
+
 SOURCE_DIR = "keyword_data"
+YEARS = range(2020, 2024)
+
+
+def merge_keyword_texts(kid):
+    # 将year-kid.parquet中的文本合并到kid.txt中
+    output_path = f"{SOURCE_DIR}/{kid}.txt"
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w') as wfile:
+        for year in YEARS:
+            year_path = f"{SOURCE_DIR}/{year}-{kid}.parquet"
+            if not os.path.exists(year_path):
+                continue
+            for row_group in ParquetFile(year_path).iter_row_groups(columns=['weibo_content']):
+                for content in row_group['weibo_content']:
+                    wfile.write(f"{content}\n")
+    os.replace(tmp_path, output_path)
+
+
+def merge_keywords_count():
+    all_keyword_count = defaultdict(int)
+
+    for year in YEARS:
+        with open(f"{SOURCE_DIR}/{year}-keywords_count.json", 'r') as f:
+            keyword_count = json.load(f)
+
+        for k, v in keyword_count.items():
+            all_keyword_count[k] += v
+
+    with open(f"{SOURCE_DIR}/all_keywords_count.json", 'w') as f:
+        json.dump(all_keyword_count, f, ensure_ascii=False)
+
 
-for kid in range(1, 11):
-    # 将year-kid.txt中合并到kid.txt中
-    if os.path.exists(f"{SOURCE_DIR}/{kid}.txt"):
-        os.remove(f"{SOURCE_DIR}/{kid}.txt")
-
-    for year in range(2020, 2024):
-        if os.path.exists(f"{SOURCE_DIR}/{year}-{kid}.txt"):
-            with open(f"{SOURCE_DIR}/{year}-{kid}.txt", 'r') as f:
-                lines = f.readlines()
-            with open(f"{SOURCE_DIR}/{kid}.txt", 'a') as f:
-                f.writelines(lines)
-        
-        
-
-all_keyword_count = defaultdict(int)
-
-for year in range(2020, 2024):
-    with open(f"{SOURCE_DIR}/{year}-keywords_count.json", 'r') as f:
-        keyword_count = json.load(f)
-    
-    for k, v in keyword_count.items():
-        all_keyword_count[k] += v
-
-with open(f"{SOURCE_DIR}/all_keywords_count.json", 'w') as f:
-    json.dump(all_keyword_count, f, ensure_ascii=False)
\ No newline at end of file
+if __name__ == '__main__':
+    for kid in range(1, 11):
+        merge_keyword_texts(kid)
+    merge_keywords_count()
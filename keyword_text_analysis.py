@@ -1,7 +1,9 @@
 import pandas as pd
 
 import os
+import random
 import argparse
+import pyarrow.parquet as pq
 
 from datetime import datetime, timedelta
 
@@ -10,6 +12,10 @@ import time
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from utils.figures import FigureJob, render_figures
+from utils.utils import KeywordMatcher
+from utils.sketches import read_sketch_table, merge_sketches
+
 
 def log(text, lid=None):
     output = f"logs/keyword_count_{lid}.txt" if lid is not None else "logs/log.txt"
@@ -24,6 +30,9 @@ quality_map = {"独立性": ["独立", "自主", "自理能力", "自立", "挫
 
 TEXT_DIR = "keyword_text_data"
 
+# 中文字体（黑体）与负号显示
+FIGURE_RC = {"font.sans-serif": ["SimHei"], "axes.unicode_minus": False}
+
 keyword_to_quality = {}
 
 for quality, keywords in quality_map.items():
@@ -103,11 +112,13 @@ def single_file_analysis(date, total_count, delete_retweet = False):
     keyword_count = {keyword: 0 for keyword in keywords}
     daily_keyword_count = {}
     data = pd.read_parquet(file_path, engine="fastparquet")
+    # 每条微博按命中的品质关键词各存一行，先按 weibo_id 去重，与 keyword_cube 的计数口径一致
+    data = data.drop_duplicates("weibo_id")
     if delete_retweet:
         data = data[data["is_retweet"] == "0"]
 
     for keyword in keywords:
-        keyword_count[keyword] = data["original_weibo_content"].str.contains(keyword).sum()
+        keyword_count[keyword] = data["original_weibo_content"].str.contains(keyword, regex=False).sum()
     
     # 将结果转为dataframe
     keyword_count_df = pd.DataFrame(keyword_count.items(), columns=["keyword", "count"])
@@ -145,29 +156,8 @@ def year_analysis(year):
     year_count_df.to_parquet(f"keyword_text_data/{year}_keyword_count.parquet", engine="fastparquet")
 
 
-def aggregate():
-    """
-    每年的统计表：keyword_text_data/{year}_keyword_count.parquet
-          keyword  count   quality       date  total_count
-    index                                                 
-    0          独立   2603       独立性 2022-01-01     51217197
-    1          自主    453       独立性 2022-01-01     51217197
-    2        自理能力     17       独立性 2022-01-01     51217197
-    3          自立    409       独立性 2022-01-01     51217197
-
-    输出：（表格和图片）
-    1. 按月 - 每个关键词的频率 & 百分比
-    2. 按月 - 每个品质的频率 & 百分比
-    3. 按年 - 每个关键词的频率 & 百分比
-    4. 按年 - 每个品质的频率 & 百分比
-    """
-    plt.cla()
-    plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
-    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-    rc = {"font.sans-serif": "SimHei",
-      "axes.unicode_minus": False}
-    sns.set(rc=rc, style="whitegrid")
-    
+def aggregate_from_count_files():
+    """从 {year}_keyword_count.parquet 计算 aggregate 的四张表"""
     # 合并所有年份的数据
     df_list = []
     total_count_map = {}
@@ -224,7 +214,50 @@ def aggregate():
     ).reset_index()
     yearly_quality = yearly_quality.merge(yearly_total, on='year', how='left')
     yearly_quality['proportion'] = yearly_quality['frequency'] / yearly_quality['yearly_total_count']
-    
+
+    return monthly_keyword, monthly_quality, yearly_keyword, yearly_quality
+
+
+def aggregate_from_cube(cube):
+    """从 keyword_cube 计算 aggregate 的四张表，列与 aggregate_from_count_files 相同；去掉没有总数的时段"""
+    tables = []
+    for timewindow in ["month", "year"]:
+        for by in ["keyword", "quality"]:
+            table = cube.rollup(timewindow, by)
+            table = table[table["total_count"] > 0].rename(columns={"total_count": f"{timewindow}ly_total_count"})
+            tables.append(table.reset_index(drop=True))
+    return tuple(tables)
+
+
+def aggregate(force=False):
+    """
+    每年的统计表：keyword_text_data/{year}_keyword_count.parquet
+          keyword  count   quality       date  total_count
+    index                                                 
+    0          独立   2603       独立性 2022-01-01     51217197
+    1          自主    453       独立性 2022-01-01     51217197
+    2        自理能力     17       独立性 2022-01-01     51217197
+    3          自立    409       独立性 2022-01-01     51217197
+
+    输出：（表格和图片）
+    1. 按月 - 每个关键词的频率 & 百分比
+    2. 按月 - 每个品质的频率 & 百分比
+    3. 按年 - 每个关键词的频率 & 百分比
+    4. 按年 - 每个品质的频率 & 百分比
+
+    keyword_cube 存在时（python keyword_cube.py 构建）直接从立方体汇总，不再读取每年的统计表
+    两者都按 weibo_id 去重计数；single_file_analysis 加入去重之前生成的统计表需要用 --mode year 重新生成
+    force=True 时忽略图表缓存全部重画
+    """
+    from keyword_cube import KeywordCube, cube_exists
+
+    if cube_exists():
+        print("aggregate from keyword_cube")
+        monthly_keyword, monthly_quality, yearly_keyword, yearly_quality = aggregate_from_cube(KeywordCube.load())
+    else:
+        print(f"aggregate from {TEXT_DIR}/{{year}}_keyword_count.parquet")
+        monthly_keyword, monthly_quality, yearly_keyword, yearly_quality = aggregate_from_count_files()
+
     # 将表格保存为csv
     monthly_keyword.to_csv(f"{TEXT_DIR}/monthly_keyword_percentage.csv", index=False)
     monthly_quality.to_csv(f"{TEXT_DIR}/monthly_quality_percentage.csv", index=False)
@@ -232,9 +265,20 @@ def aggregate():
     yearly_quality.to_csv(f"{TEXT_DIR}/yearly_quality_percentage.csv", index=False)
     
     # 将 pd.Period 转换为字符串
-    months_to_display = monthly_quality['month'].dt.strftime('%Y-%m').unique()  # 获取所有月份
     monthly_quality['month'] = monthly_quality['month'].astype(str)
-    
+
+    # 图表输入未变化时跳过，其余并行渲染
+    jobs = [
+        FigureJob(plot_monthly_quality, monthly_quality, f"{TEXT_DIR}/monthly_quality_percentage.pdf", style="whitegrid", rc=FIGURE_RC),
+        FigureJob(plot_yearly_quality, yearly_quality, f"{TEXT_DIR}/yearly_quality_percentage.pdf", style="whitegrid", rc=FIGURE_RC),
+        FigureJob(plot_yearly_quality_stack, yearly_quality, f"{TEXT_DIR}/yearly_quality_percentage_stackplot.pdf", style="whitegrid", rc=FIGURE_RC),
+    ]
+    render_figures(jobs, force=force)
+
+
+def plot_monthly_quality(monthly_quality, output_path):
+    months_to_display = monthly_quality['month'].unique()  # 获取所有月份
+
     # 按月品质频率
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=monthly_quality, x='month', y='proportion', hue='quality')
@@ -248,21 +292,20 @@ def aggregate():
     plt.xticks(ticks=display_indices, labels=display_labels, rotation=45)
     plt.legend(loc='upper right')
     plt.tight_layout()
-    plt.savefig(f"{TEXT_DIR}/monthly_quality_percentage.pdf", format='pdf')
+    plt.savefig(output_path, format='pdf')
 
-    plt.cla()
 
+def plot_yearly_quality(yearly_quality, output_path):
     # 按年品质百分比
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=yearly_quality, x='year', y='proportion', hue='quality', linewidth=3)
     plt.title("Yearly Quality Percentage")
     plt.legend(loc='upper right')
     plt.tight_layout()
-    plt.savefig(f"{TEXT_DIR}/yearly_quality_percentage.pdf", format='pdf')
-
-    plt.cla()
+    plt.savefig(output_path, format='pdf')
 
 
+def plot_yearly_quality_stack(yearly_quality, output_path):
     # year quality - 计算2016-2023每一年每一个quality占四种quality的比例
     # 堆叠图 stackplot 横轴为年份，用不同的quality颜色表示
 
@@ -275,56 +318,153 @@ def aggregate():
     plt.title("Yearly Quality Percentage")
     plt.legend(loc='upper right')
     plt.tight_layout()
-    plt.savefig(f"{TEXT_DIR}/yearly_quality_percentage_stackplot.pdf", format='pdf')
+    plt.savefig(output_path, format='pdf')
 
-def text_sample():
+def sample_day(file_path, matcher, date_str, per_day, seed):
+    """
+    流式扫描一天的 weibo_content，对每个关键词维护一个容量为 per_day 的蓄水池
+    每个 (关键词, 日期) 使用独立的、由 seed 决定的随机数生成器，结果可复现
+    """
+    keywords = matcher.rules["sample"]
+    rngs = {keyword: random.Random(f"{seed}-{keyword}-{date_str}") for keyword in keywords}
+    seen = {keyword: 0 for keyword in keywords}
+    reservoirs = {keyword: [] for keyword in keywords}
+
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in parquet_file.iter_batches(columns=["weibo_content"]):
+        for text in batch.column(0).to_pylist():
+            if text is None:
+                continue
+            for keyword in matcher.match(text)["sample"]:
+                n = seen[keyword]
+                seen[keyword] += 1
+                if n < per_day:
+                    reservoirs[keyword].append(text)
+                else:
+                    j = rngs[keyword].randrange(n + 1)
+                    if j < per_day:
+                        reservoirs[keyword][j] = text
+    return reservoirs
+
+
+def text_sample(keywords=("努力", "暖心"), start_date=datetime(2018, 6, 1), end_date=datetime(2018, 6, 30), per_day=300, seed=2025):
     """
-    每个关键词每年sample 1000条文本
+    按 (关键词, 日期) 分层抽样：每个关键词每天最多 per_day 条，不足时全部保留
+    所有关键词共用一次自动机扫描；输出文件用 "w" 写入（先写临时文件再rename），重复运行结果相同
     """
     SAMPLE_TEXT_DIR = "keyword_text_sample_data"
     if not os.path.exists(SAMPLE_TEXT_DIR):
         os.makedirs(SAMPLE_TEXT_DIR)
-    start_date = datetime(2018, 6, 1)
-    end_date = datetime(2018, 6, 30)
+    matcher = KeywordMatcher({"sample": list(keywords)})
     date_range = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-    for keyword in ["努力", "暖心"]: # 
-        keyword_sample = []
-        for current_date in date_range:
-            date_str = current_date.strftime("%Y-%m-%d")
-            file_path = f"{TEXT_DIR}/{date_str}.parquet"
-            if not os.path.exists(file_path):
-                continue
-            data = pd.read_parquet(file_path, engine="fastparquet")
 
-            keyword_data = data[data["weibo_content"].str.contains(keyword)]
-            sample = keyword_data.sample(300)
-            keyword_sample.extend(list(sample["weibo_content"]))
-        with open(f"{SAMPLE_TEXT_DIR}/sample_text_{keyword}.txt", "a") as f:
+    keyword_sample = {keyword: [] for keyword in keywords}
+    for current_date in date_range:
+        date_str = current_date.strftime("%Y-%m-%d")
+        file_path = f"{TEXT_DIR}/{date_str}.parquet"
+        if not os.path.exists(file_path):
+            continue
+        reservoirs = sample_day(file_path, matcher, date_str, per_day, seed)
+        for keyword, texts in reservoirs.items():
+            keyword_sample[keyword].extend(texts)
+
+    range_str = f"{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
+    for keyword, texts in keyword_sample.items():
+        output_path = f"{SAMPLE_TEXT_DIR}/sample_text_{keyword}_{range_str}.txt"
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w") as f:
             f.write(f"{keyword}:\n")
-            for text in keyword_sample:
+            for text in texts:
                 f.write(f"{text}\n")
             f.write("\n")
+        os.replace(tmp_path, output_path)
+        print(f"{keyword}: {len(texts)} samples saved to {output_path}")
+
+
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+
+def distinct_users(start_date=datetime(2016, 1, 1), end_date=datetime(2023, 12, 31), timewindow="month", by="quality"):
+    """
+    各时段内提到某关键词 / 品质的去重用户数（HyperLogLog 估计，相对误差约1.6%）
+    读取 get_text_from_keyword 写出的 {TEXT_DIR}/{date}_hll.parquet，按 (时段, 关键词 / 品质) 合并 sketch
+    用户跨天、跨关键词的重复都只计一次；没有 sketch 的日期可用 get_text_from_keyword.py --action sketch 补建
+    timewindow: day / month / year；by: keyword / quality / all
+    返回 DataFrame(timewindow, by, distinct_users)，同时保存为 csv
+    """
+    if timewindow not in PERIOD_FORMATS:
+        raise ValueError(f"unknown timewindow: {timewindow}")
+    if by not in ["keyword", "quality", "all"]:
+        raise ValueError(f"unknown by: {by}")
+
+    groups = {}
+    missing = 0
+    date_range = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    for current_date in date_range:
+        file_path = f"{TEXT_DIR}/{current_date.strftime('%Y-%m-%d')}_hll.parquet"
+        if not os.path.exists(file_path):
+            missing += 1
+            continue
+        period = current_date.strftime(PERIOD_FORMATS[timewindow])
+        table = read_sketch_table(file_path)
+        for keyword, sketch in zip(table["keyword"], table["sketch"]):
+            # 不属于任何品质的关键词（如“携带”）只在 by="keyword" 时统计
+            if keyword not in keyword_to_quality and by != "keyword":
+                continue
+            group = {"keyword": keyword, "quality": keyword_to_quality.get(keyword), "all": "all"}[by]
+            groups.setdefault((period, group), []).append(sketch)
+    if missing:
+        print(f"{missing} days without user sketches")
+
+    rows = [(period, group, merge_sketches(sketches).count()) for (period, group), sketches in groups.items()]
+    df = pd.DataFrame(rows, columns=[timewindow, by, "distinct_users"]).sort_values([timewindow, by])
+    range_str = f"{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
+    df.to_csv(f"{TEXT_DIR}/distinct_users_{timewindow}_{by}_{range_str}.csv", index=False)
+    return df
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", type=str, help="mode to run", default="year", choices=["year", "all", "agg", "sample", "preprocess", "streamline"])
+    parser.add_argument("--mode", type=str, help="mode to run", default="year", choices=["year", "all", "agg", "sample", "users", "preprocess", "streamline"])
     parser.add_argument("--year", type=int, help="year to analyze", default=2021)
+    parser.add_argument("--keywords", type=str, nargs="+", help="keywords to sample", default=["努力", "暖心"])
+    parser.add_argument("--start", type=str, help="start date, yyyy-mm-dd; default 2018-06-01 for sample, 2016-01-01 for users", default=None)
+    parser.add_argument("--end", type=str, help="end date, yyyy-mm-dd; default 2018-06-30 for sample, 2023-12-31 for users", default=None)
+    parser.add_argument("--per_day", type=int, help="samples per keyword per day", default=300)
+    parser.add_argument("--timewindow", type=str, help="distinct users period", default="month", choices=["day", "month", "year"])
+    parser.add_argument("--by", type=str, help="distinct users grouping", default="quality", choices=["keyword", "quality", "all"])
+    parser.add_argument("--force", action="store_true", help="ignore figure cache and redraw all")
     args = parser.parse_args()
+    # 各模式的默认日期范围：sample 只抽一个月，users 统计全部年份
+    default_start, default_end = ("2016-01-01", "2023-12-31") if args.mode == "users" else ("2018-06-01", "2018-06-30")
+    args.start = args.start or default_start
+    args.end = args.end or default_end
     if args.mode == "year":
         year_analysis(args.year)
     elif args.mode == "all":
         for year in range(2016, 2024):
             year_analysis(year)
     elif args.mode == "agg":
-        aggregate()
+        aggregate(args.force)
     elif args.mode == "sample":
-        text_sample()
+        text_sample(
+            args.keywords,
+            datetime.strptime(args.start, "%Y-%m-%d"),
+            datetime.strptime(args.end, "%Y-%m-%d"),
+            args.per_day,
+        )
+    elif args.mode == "users":
+        distinct_users(
+            datetime.strptime(args.start, "%Y-%m-%d"),
+            datetime.strptime(args.end, "%Y-%m-%d"),
+            args.timewindow,
+            args.by,
+        )
     elif args.mode == "preprocess":
         data_preprocess()
     elif args.mode == "streamline":
         data_preprocess()
         for year in range(2016, 2024):
             year_analysis(year)
-        aggregate()
+        aggregate(args.force)
 
@@ -1,28 +1,34 @@
 import os
 import re
+import argparse
 import jieba
 import pandas as pd
 
 
 
-from utils.utils import STRICT_REAR_KEYWORDS
+from utils.utils import KeywordMatcher, STRICT_REAR_KEYWORDS
+from bangdan_table import load_bangdan_table, build_bangdan_table, COLUMNS
 
 
-rear_pattern = "|".join([f"{''.join([f'(?=.*{word})' for word in keyword.split('&')])}" for keyword in STRICT_REAR_KEYWORDS])
-
 NEW_KEYWORD = ["鸡娃", "海淀妈妈", "网课", "遛娃", "神兽", "熊孩子", "虎妈", "父母&硬核", "式父母"]
-new_rear_pattern = "|".join([f"{''.join([f'(?=.*{word})' for word in keyword.split('&')])}" for keyword in NEW_KEYWORD])
 
 
 DELETE_KEYWORD = ["送子女神", "男子女", "女子女", "个子女", "见家长", "穿搭", "医务子女", "医护子女", "职工子女", "女友", "养我", "育儿假", "独生子女"]
-delete_rear_pattern = "|".join(DELETE_KEYWORD)
-delete_rear_pattern += "|见.{0,3}家长|医务.{0,3}子女|医护{0,3}子女"
+# 带间隔的删除规则无法用关键词表达，单独保留为正则
+delete_rear_regex = re.compile("见.{0,3}家长|医务.{0,3}子女|医护.{0,3}子女")
 
 # DELETE_KEYWORD = ["相亲"]
 # 网课 not 爸妈 or 家长 or 妈妈 or 宅家上网课到底谁更难
 # "熊孩子" not 爸妈 or 家长 or 父母 or 妈妈 or 爸爸 or 妈 or 奶奶
 SAVE_KEYWORD = ["爸妈", "家长", "妈妈", "宅家上网课到底谁更难", "妈", "奶奶", "父母", "爸爸"]
-save_rear_pattern = "|".join(SAVE_KEYWORD)
+
+# 所有规则组编译为一个自动机，match() 一次扫描返回各组命中的关键词
+rule_matcher = KeywordMatcher({
+    "rear": STRICT_REAR_KEYWORDS,
+    "new": NEW_KEYWORD,
+    "delete": DELETE_KEYWORD,
+    "save": SAVE_KEYWORD,
+})
 
 DELETE = [
     "韩国结婚五年内夫妻四成无子女",
@@ -157,30 +163,108 @@ DELETE = [
     "哈佛大学被曝为权贵子女开后门"
 ]
 
-for year in ["2019", "2020", "2021", "2022", "2023"]:
-    for month in range(1, 13):
-        month_str = f"{year}-{month:02d}"
-
-        file_path = f"bangdan_working_data/{month_str}_strict2.csv"
-        if not os.path.exists(file_path):
-            continue
-        print(f"processing {file_path}")
-
-        # 用pandas读取df，手动指定列明
-        df = pd.read_csv(file_path)
-        df["rear"] = df["rear"].astype(int)
-        
-        # 遍历每一行，如果text中包含严格育儿关键词，则将rear列置为1，否则要改为0（用正则）
-        for index, row in df.iterrows():
-            if row["rear"] == 0:
-                continue
-            else:
-                if row["text"] in DELETE:
-                    df.loc[index, "rear"] = 0
-                # elif ("熊孩子" in row["text"] or "网课" in row["text"]) and not re.search(save_rear_pattern, row["text"]):
-                #     df.loc[index, "rear"] = 0
-                continue
-
-        new_file_path = f"bangdan_working_data/{month_str}_strict2.csv"
-        df.to_csv(new_file_path, index=False)
+DELETE_SET = frozenset(DELETE)
+
+DIFF_PATH = "bangdan_working_data/strict_clean_diff.csv"
+
+# 可用的规则及其方向：(rear原值, 命中后的rear)
+RULES = {
+    "delete_list": (1, 0),      # text 完全等于 DELETE 中的话题
+    "delete_keyword": (1, 0),   # 命中 DELETE_KEYWORD 或 delete_rear_regex
+    "unsaved_new": (1, 0),      # 含"熊孩子"或"网课"，但不含 SAVE_KEYWORD
+    "new_keyword": (0, 1),      # 命中 NEW_KEYWORD 且未命中删除规则
+}
+# 默认只启用 DELETE 列表，与此前的清洗结果一致
+DEFAULT_RULES = ["delete_list"]
+
+
+def get_file_path(month_str):
+    return f"bangdan_working_data/{month_str}_strict2.csv"
+
+
+def load_strict_table():
+    """读取合并后的 _strict2 榜单表，只保留原始列和 month 列"""
+    df = load_bangdan_table(data_mode="_strict2")
+    return df[COLUMNS + ["month"]].copy()
+
+
+def get_rule_columns(texts):
+    """
+    对所有话题计算每条规则是否命中，返回与texts同索引的布尔DataFrame
+    自动机只对去重后的话题扫描一次
+    """
+    unique_texts = pd.Series(texts.unique())
+    matches = unique_texts.map(rule_matcher.match)
+    unique_hits = pd.DataFrame({
+        "text": unique_texts,
+        "delete_hit": matches.map(lambda m: len(m["delete"]) > 0) | unique_texts.str.contains(delete_rear_regex),
+        "save_hit": matches.map(lambda m: len(m["save"]) > 0),
+        "new_hit": matches.map(lambda m: len(m["new"]) > 0),
+    })
+    hits = unique_hits.set_index("text").reindex(texts.values)
+    hits.index = texts.index
+
+    return pd.DataFrame({
+        "delete_list": texts.isin(DELETE_SET),
+        "delete_keyword": hits["delete_hit"],
+        "unsaved_new": (texts.str.contains("熊孩子", regex=False) | texts.str.contains("网课", regex=False)) & ~hits["save_hit"],
+        "new_keyword": hits["new_hit"] & ~hits["delete_hit"],
+    }, index=texts.index)
+
+
+def apply_rules(df, rules=DEFAULT_RULES):
+    """
+    向量化地应用规则，返回 (新的rear列, 每行翻转原因)
+    一行命中多条规则时，原因取 rules 中最靠前的一条
+    """
+    rule_columns = get_rule_columns(df["text"].astype(str))
+    new_rear = df["rear"].copy()
+    reason = pd.Series("", index=df.index)
+    for rule in reversed(rules):
+        before, after = RULES[rule]
+        flip = (df["rear"] == before) & rule_columns[rule]
+        new_rear[flip] = after
+        reason[flip] = rule
+    return new_rear, reason.where(new_rear != df["rear"], "")
+
+
+def clean(rules=DEFAULT_RULES, dry_run=False):
+    df = load_strict_table()
+    new_rear, reason = apply_rules(df, rules)
+
+    flipped = new_rear != df["rear"]
+    diff = df.loc[flipped, ["month", "date", "text", "hot"]].copy()
+    diff["rear_before"] = df.loc[flipped, "rear"]
+    diff["rear_after"] = new_rear[flipped]
+    diff["reason"] = reason[flipped]
+    diff.to_csv(DIFF_PATH, index=False)
+    print(f"{flipped.sum()} rows flipped, {diff['text'].nunique()} topics, diff saved to {DIFF_PATH}")
+    print(diff.groupby(["reason", "rear_before", "rear_after"]).size())
+
+    if dry_run:
+        return
+
+    for month_str in diff["month"].unique():
+        # 只重写有变化的月份：从该月的csv原样读入（全部按字符串，缺失值保持为空），只替换rear列，先写临时文件再rename
+        # 榜单表按月份文件顺序拼接，同一月份内的行顺序与csv一致
+        file_path = get_file_path(month_str)
+        month_df = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+        month_rear = new_rear[df["month"] == month_str]
+        if len(month_df) != len(month_rear):
+            raise ValueError(f"{file_path} has {len(month_df)} rows but the table has {len(month_rear)}, rebuild the table first")
+        month_df["rear"] = month_rear.astype(int).astype(str).values
+        tmp_path = f"{file_path}.tmp"
+        month_df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, file_path)
+        print(f"rewrote {file_path}")
+
+    if len(diff) > 0:
+        build_bangdan_table(data_mode="_strict2")
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=str, nargs="+", default=DEFAULT_RULES, choices=list(RULES.keys()))
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    clean(args.rules, args.dry_run)
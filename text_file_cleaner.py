@@ -5,73 +5,150 @@
 """
 
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import fire
 import json
 
 from collections import defaultdict
 
-from utils.utils import weibo_text_cleaner
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.utils import split_retweet, clean_weibo_text_series, atomic_write_parquet, read_parquet_metadata
 
 TEXT_DIR = "text_data"
 
-def handle_retweet(text):
-    return text.split("//")[0]
+# 清洗逻辑变化时递增，已是当前版本的文件会被跳过
+CLEANER_VERSION = "1"
 
 
-def deduplicate_parquet(year):
+def clean_day(parquet_path):
+    """
+    清洗一天的数据：按weibo_id去重，增加 original_weibo_content / cleaned_weibo_content 两列
+    结果先写临时文件再rename替换原文件，并在文件尾记录 cleaner_version（与已有的键值对合并）
+    """
+    if not os.path.exists(parquet_path):
+        return "missing"
+    metadata = read_parquet_metadata(parquet_path)
+    if metadata.get("cleaner_version") == CLEANER_VERSION:
+        return "skipped"
+
+    df = pd.read_parquet(parquet_path)
+    if df.empty:
+        print(f"Warning: {parquet_path} is empty, removing...")
+        os.remove(parquet_path)
+        return "removed"
+
+    df.drop_duplicates(subset='weibo_id', inplace=True)
+    df["original_weibo_content"] = split_retweet(df["weibo_content"])
+    df["cleaned_weibo_content"] = clean_weibo_text_series(df["original_weibo_content"])
+    # 保留 deduplicate_bangdan 等写入的其他标记
+    atomic_write_parquet(df, parquet_path, {**metadata, "cleaner_version": CLEANER_VERSION})
+    return "cleaned"
+
+
+def deduplicate_parquet(year, workers=4):
     start_date = datetime(year, 1, 1)
     end_date = datetime(year, 12, 31)
     date_range = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    parquet_paths = [f"{TEXT_DIR}/{date.strftime('%Y-%m-%d')}.parquet" for date in date_range]
 
-    for date in date_range:
-        date_str = date.strftime('%Y-%m-%d')
-        parquet_path = f"{TEXT_DIR}/{date_str}.parquet"
+    status_count = defaultdict(int)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for parquet_path, status in zip(parquet_paths, executor.map(clean_day, parquet_paths)):
+            status_count[status] += 1
+            if status == "cleaned":
+                print(f"cleaned {parquet_path}")
+    print(dict(status_count))
 
-        if not os.path.exists(parquet_path):
-            continue
 
-        df = pd.read_parquet(parquet_path)
-        if df.empty:
-            print(f"Warning: {parquet_path} is empty, removing...")
-            os.remove(parquet_path)
+sample_count = 10000
+
+
+def get_topic_date_count(topic_data_dir):
+    """
+    从parquet元数据中读取每天的行数，不读取数据
+    返回 {yyyy-mm-dd: 行数}
+    """
+    topic_date_count = {}
+    for file_name in sorted(os.listdir(topic_data_dir)):
+        if not file_name.endswith(".parquet"):
             continue
+        date_str = file_name[:-len(".parquet")]
+        topic_date_count[date_str] = pq.ParquetFile(f"{topic_data_dir}/{file_name}").metadata.num_rows
+    return topic_date_count
 
-        df.drop_duplicates(subset='weibo_id', inplace=True)
-        df["original_weibo_content"] = df["weibo_content"].apply(handle_retweet)
-        df["cleaned_weibo_content"] = df["original_weibo_content"].apply(weibo_text_cleaner)
-        df.to_parquet(parquet_path, engine='fastparquet', index=False)
 
+def allocate_samples(date_count, total_samples):
+    """
+    按每天的行数成比例分配样本数（最大余数法），保证总数等于 min(total_samples, 总行数)
+    date_count: [(date_str, count)]
+    """
+    total_count = sum(count for _, count in date_count)
+    if total_count <= total_samples:
+        return {date_str: count for date_str, count in date_count}
 
+    quotas = {}
+    remainders = []
+    for date_str, count in date_count:
+        exact = total_samples * count / total_count
+        quotas[date_str] = int(exact)
+        remainders.append((exact - int(exact), date_str))
+    left = total_samples - sum(quotas.values())
+    for _, date_str in sorted(remainders, reverse=True)[:left]:
+        quotas[date_str] += 1
+    return quotas
 
-sample_count = 10000
 
-def sample(topic_id, topic_date_count):
+def read_parquet_rows(file_path, row_indices):
+    """
+    只读取包含 row_indices（已排序）的 row group，再从中取出对应行
+    """
+    parquet_file = pq.ParquetFile(file_path)
+    tables = []
+    row_group_start = 0
+    for i in range(parquet_file.num_row_groups):
+        row_group_end = row_group_start + parquet_file.metadata.row_group(i).num_rows
+        left = np.searchsorted(row_indices, row_group_start, side="left")
+        right = np.searchsorted(row_indices, row_group_end, side="left")
+        if right > left:
+            row_group = parquet_file.read_row_group(i)
+            tables.append(row_group.take(row_indices[left:right] - row_group_start))
+        row_group_start = row_group_end
+    return pa.concat_tables(tables).to_pandas()
+
+
+def sample(topic_id, topic_date_count=None, sample_size=sample_count, seed=2025):
     """
-    topic_date_count:
+    topic_date_count（可选）:
     key: date yyyy-mm-dd
     value: count of data, int
+    每天的行数一律从parquet元数据读取；传入时只用它的key限定参与抽样的日期
 
-    weighted sampling based on the count of a particular day
+    按每天的数据量成比例分配 sample_size 条样本，每天内无放回均匀抽样
+    只读取被抽中的行所在的 row group；相同 seed 得到相同的样本
     """
     topic_data_dir = f"topic_keyword_data/{topic_id}"
     if not os.path.exists(topic_data_dir):
         return None
 
-    date_count = sorted(topic_date_count.items(), key=lambda x: x[1], reverse=True)
-    total_count = sum([x[1] for x in date_count])
-    sample_rate = sample_count / total_count
+    date_count = sorted(
+        (date_str, count) for date_str, count in get_topic_date_count(topic_data_dir).items()
+        if count > 0 and (topic_date_count is None or date_str in topic_date_count)
+    )
+    quotas = allocate_samples(date_count, sample_size)
 
+    rng = np.random.default_rng(seed)
     samples = []
 
     for date_str, count in date_count:
-        # date_str = date.strftime('%Y-%m-%d')
-        if not os.path.exists(f"{topic_data_dir}/{date_str}.parquet"):
+        if quotas[date_str] == 0:
             continue
-        data = pd.read_parquet(f"{topic_data_dir}/{date_str}.parquet", engine='fastparquet')
-        sample_data = data.sample(frac=sample_rate, random_state=2025)
-        samples.append(sample_data)
+        row_indices = np.sort(rng.choice(count, size=quotas[date_str], replace=False))
+        samples.append(read_parquet_rows(f"{topic_data_dir}/{date_str}.parquet", row_indices))
     
     topic_sample = pd.concat(samples)
     sample_dir = "topic_keyword_data_sample"
@@ -0,0 +1,103 @@
+"""
+Aho-Corasick 自动机的注册表：同一组关键词只构建一次
+
+- 以关键词集合内容的哈希为key，构建后pickle到 automaton_cache/{key}.pkl，之后的进程（包括同时运行的其他mode）直接加载
+- 每个进程内再按key缓存一份，逐日、逐文件调用不再重复构建
+- 在创建进程池之前取得的自动机，fork出的子进程以只读方式共享
+- 磁盘缓存最多保留 MAX_CACHE_FILES 个文件，超出时删除最久未使用的
+
+用法：
+automaton = get_automaton([(idx, keyword), ...])   # automaton.iter(text) 产出 (end_index, (idx, keyword))
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import importlib.metadata
+
+import ahocorasick
+
+AUTOMATON_DIR = "automaton_cache"
+# 缓存的key或pickle内容的格式变化时递增
+CACHE_FORMAT = "2"
+try:
+    AHOCORASICK_VERSION = importlib.metadata.version("pyahocorasick")
+except importlib.metadata.PackageNotFoundError:
+    AHOCORASICK_VERSION = getattr(ahocorasick, "__version__", "unknown")
+MAX_CACHE_FILES = 256
+
+# 进程内缓存：key -> Automaton
+_automata = {}
+
+
+def keyword_set_key(items):
+    """
+    (id, keyword) 列表的内容哈希，与顺序无关
+    id 按 repr 计入，1 和 "1" 得到不同的key；同时计入缓存格式版本和 pyahocorasick 版本，旧版本的pickle不会被复用
+    """
+    payload = json.dumps(
+        [CACHE_FORMAT, AHOCORASICK_VERSION, sorted([repr(idx), keyword] for idx, keyword in items)], ensure_ascii=False
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_automaton(items):
+    automaton = ahocorasick.Automaton()
+    for idx, keyword in items:
+        automaton.add_word(f"{keyword}", (idx, keyword))
+    if len(automaton) > 0:
+        automaton.make_automaton()
+    return automaton
+
+
+def get_automaton(items, cache_dir=AUTOMATON_DIR):
+    """
+    items: (id, keyword) 的列表或 dict.items()
+    依次查找进程内缓存、磁盘缓存，都没有时构建并写入磁盘（先写临时文件再rename）
+    """
+    items = list(items)
+    key = keyword_set_key(items)
+    if key in _automata:
+        return _automata[key]
+
+    file_path = f"{cache_dir}/{key}.pkl"
+    automaton = None
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, "rb") as f:
+                automaton = pickle.load(f)
+            # 更新修改时间，清理时按最久未使用淘汰
+            os.utime(file_path)
+        except (pickle.UnpicklingError, EOFError) as e:
+            print(f"bad automaton cache {file_path}: {e}, rebuilding")
+    if automaton is None:
+        automaton = build_automaton(items)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(automaton, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, file_path)
+        prune_automaton_cache(cache_dir)
+
+    _automata[key] = automaton
+    return automaton
+
+
+def prune_automaton_cache(cache_dir=AUTOMATON_DIR, max_files=MAX_CACHE_FILES):
+    """磁盘缓存超过 max_files 个时，按修改时间删除最旧的"""
+    file_paths = [f"{cache_dir}/{name}" for name in os.listdir(cache_dir) if name.endswith(".pkl")]
+    if len(file_paths) <= max_files:
+        return
+    file_paths.sort(key=os.path.getmtime)
+    for file_path in file_paths[:len(file_paths) - max_files]:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            # 其他进程已经删除
+            pass
+
+
+def clear_automaton_cache():
+    """清空进程内缓存（磁盘缓存保留）"""
+    _automata.clear()
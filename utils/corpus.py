@@ -0,0 +1,110 @@
+"""
+freshdata 列式语料：每条微博只存一次，按天分区的 zstd parquet
+
+corpus/
+|-date=2020-01-01/part-0.parquet
+|-date=2020-01-02/part-0.parquet
+...
+
+由 freshdata_corpus.py 从 weibo_freshdata.*.7z 一次性转换生成，之后的抽取只需扫描需要的列
+"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CORPUS_DIR = "corpus"
+
+CORPUS_SCHEMA = pa.schema([
+    ("weibo_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("user_type", pa.string()),
+    ("crawler_time_stamp", pa.int64()),  # 毫秒
+    ("time_stamp", pa.int64()),  # 秒
+    ("is_retweet", pa.int8()),
+    ("zhuan", pa.int32()),
+    ("ping", pa.int32()),
+    ("zhan", pa.int32()),
+    ("weibo_content", pa.string()),
+    ("r_weibo_content", pa.string()),
+])
+CORPUS_COLUMNS = CORPUS_SCHEMA.names
+
+# 拼接微博全文所需的列
+TEXT_COLUMNS = ["is_retweet", "weibo_content", "r_weibo_content"]
+
+
+def get_corpus_partition_dir(date_str, corpus_dir=CORPUS_DIR):
+    return f"{corpus_dir}/date={date_str}"
+
+
+def get_corpus_partition_file(date_str, corpus_dir=CORPUS_DIR):
+    return f"{get_corpus_partition_dir(date_str, corpus_dir)}/part-0.parquet"
+
+
+def corpus_partition_exists(date_str, corpus_dir=CORPUS_DIR):
+    """分区文件只在写完后rename生成，存在即完整"""
+    return os.path.exists(get_corpus_partition_file(date_str, corpus_dir))
+
+
+class CorpusPartitionWriter(object):
+    """
+    流式写入一天的分区，每次 write 一个row group
+    先写临时文件，close 时rename；中途出错调用 abort 删除临时文件，不会留下半个分区
+
+    with CorpusPartitionWriter("2020-01-01") as writer:
+        writer.write(columns)  # dict: 列名 -> list
+    """
+
+    def __init__(self, date_str, corpus_dir=CORPUS_DIR, compression="zstd"):
+        self.file_path = get_corpus_partition_file(date_str, corpus_dir)
+        self.tmp_path = f"{self.file_path}.tmp"
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self.writer = pq.ParquetWriter(self.tmp_path, CORPUS_SCHEMA, compression=compression)
+        self.num_rows = 0
+
+    def write(self, columns):
+        table = pa.Table.from_pydict(columns, schema=CORPUS_SCHEMA)
+        self.writer.write_table(table)
+        self.num_rows += table.num_rows
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.file_path)
+
+    def abort(self):
+        self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_corpus_batches(date_str, columns=None, batch_size=500000, corpus_dir=CORPUS_DIR):
+    """
+    逐批读取一天的分区，只读取 columns 中的列（None 为全部），产出 pyarrow.RecordBatch
+    """
+    parquet_file = pq.ParquetFile(get_corpus_partition_file(date_str, corpus_dir))
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+
+def get_post_texts(batch):
+    """
+    一个 RecordBatch / Table 中每条微博的全文：原创为正文，转发为 正文//原文（与 process_corpus_day 的拼接方式一致，但保留换行符）
+    batch 需要包含 TEXT_COLUMNS
+    """
+    is_retweet = batch.column("is_retweet").to_pylist()
+    contents = batch.column("weibo_content").to_pylist()
+    r_contents = batch.column("r_weibo_content").to_pylist()
+    return [
+        (content or "") if retweet == 0 else (content or "") + "//" + (r_content or "")
+        for retweet, content, r_content in zip(is_retweet, contents, r_contents)
+    ]
@@ -0,0 +1,113 @@
+"""
+图表渲染
+- 每张图的输入数据（DataFrame）、render 函数的源码和参数做哈希，与输出目录下的 .figure_cache.json 比较，未变化且pdf存在则跳过
+- 其余的图在进程池中用无界面后端（Agg）并行渲染，字体等全局设置每个进程只做一次
+
+render 函数需要定义在模块顶层（以便传给子进程），签名为 render(data, output_path, **kwargs)，
+只负责画图和保存，不需要设置风格、也不需要关闭figure
+"""
+
+import os
+import json
+import inspect
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+CACHE_FILE_NAME = ".figure_cache.json"
+
+FigureJob = namedtuple("FigureJob", ["render", "data", "output_path", "kwargs", "style", "rc"], defaults=[None, "ticks", None])
+
+
+def render_source(render):
+    """render 函数的源码，修改画图代码后缓存失效；取不到源码时用字节码和常量"""
+    try:
+        return inspect.getsource(render)
+    except (OSError, TypeError):
+        return repr((render.__code__.co_code, render.__code__.co_consts))
+
+
+def figure_hash(job):
+    """输入数据 + render函数（名称和源码） + 参数 + 风格 的哈希"""
+    h = hashlib.sha1()
+    h.update(f"{job.render.__module__}.{job.render.__qualname__}".encode("utf-8"))
+    h.update(render_source(job.render).encode("utf-8"))
+    h.update(json.dumps([job.kwargs, job.style, job.rc], sort_keys=True, default=str).encode("utf-8"))
+    h.update(json.dumps([str(c) for c in job.data.columns]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(job.data, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def load_cache(output_dir):
+    cache_path = os.path.join(output_dir, CACHE_FILE_NAME)
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, "r") as f:
+        return json.load(f)
+
+
+def save_cache(output_dir, cache):
+    cache_path = os.path.join(output_dir, CACHE_FILE_NAME)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn as sns
+    sns.set_theme()
+
+
+def _render(job):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    with sns.axes_style(job.style), plt.rc_context(job.rc or {}):
+        job.render(job.data, job.output_path, **(job.kwargs or {}))
+    plt.close("all")
+    return job.output_path
+
+
+def render_figures(jobs, workers=4, force=False):
+    """
+    渲染一组 FigureJob，返回实际重新渲染的输出路径列表
+    force=True 时忽略缓存全部重画
+    """
+    caches = {}
+    todo = {}
+    for job in jobs:
+        output_dir = os.path.dirname(job.output_path) or "."
+        os.makedirs(output_dir, exist_ok=True)
+        if output_dir not in caches:
+            caches[output_dir] = load_cache(output_dir)
+        digest = figure_hash(job)
+        file_name = os.path.basename(job.output_path)
+        if not force and caches[output_dir].get(file_name) == digest and os.path.exists(job.output_path):
+            print(f"unchanged, skip {job.output_path}")
+            continue
+        todo[job.output_path] = (job, digest)
+
+    rendered = []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(_render, job): output_path for output_path, (job, _) in todo.items()}
+            for future in as_completed(futures):
+                output_path = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"failed to render {output_path}: {e}")
+                    continue
+                output_dir = os.path.dirname(output_path) or "."
+                caches[output_dir][os.path.basename(output_path)] = todo[output_path][1]
+                rendered.append(output_path)
+                print(f"rendered {output_path}")
+
+    for output_dir, cache in caches.items():
+        save_cache(output_dir, cache)
+    return rendered
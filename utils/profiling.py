@@ -0,0 +1,198 @@
+"""
+数据抽取流程的分阶段计时与吞吐量记录
+
+用法：
+profiler = StageProfiler("logs/profile_2020_1.jsonl")
+with profiler.stage("decompress"):
+    ...
+profiler.count("lines", n)
+profiler.record(date="2020-01-01")   # 追加一行JSON并清零，开始下一天
+
+每行记录包括：各阶段耗时（秒）、计数器（lines / bytes / matched_lines / json_errors 等）、
+lines_per_sec、bytes_per_sec、match_rate，以及 io_seconds / cpu_seconds 和 bound（io 或 cpu）
+内存：peak_rss_mb 为这一段（自上次 record / reset 起）本进程的峰值常驻内存（/proc/self/status 的 VmHWM，
+每段开始时写 /proc/self/clear_refs 清零；不支持时为 null）；lifetime_peak_rss_mb 为截至这一段的累计峰值（各段峰值与已结束子进程峰值的最大值）
+
+汇总报告：python -m utils.profiling logs/profile_2020_1.jsonl
+
+单个函数的微基准（吞吐量 + tracemalloc峰值内存）：bench(name, func, n_lines)，见 bench_ingest.py
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+# 以I/O为主的阶段，其余视为CPU阶段
+IO_STAGES = ["decompress", "read", "write"]
+
+
+def get_peak_rss_mb():
+    """当前进程及已结束子进程启动以来的累计峰值常驻内存（MB），Linux下ru_maxrss单位为KB"""
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_rss, children_rss) / 1024
+
+
+def get_segment_peak_rss_mb():
+    """自上次 reset_peak_rss 以来本进程的峰值常驻内存（MB），读取 /proc/self/status 的 VmHWM，不支持时返回None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """把 VmHWM 重置为当前常驻内存（Linux 4.0+），失败时返回False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler(object):
+
+    def __init__(self, output_path=None):
+        """output_path 为 None 时只计时不写文件"""
+        self.output_path = output_path
+        # clear_refs 会同时清零 ru_maxrss，本进程的累计峰值由各段峰值自行累计
+        self.lifetime_peak_rss_mb = get_peak_rss_mb()
+        self.reset()
+
+    def reset(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.peak_rss_resettable = reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.stages[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, **fields):
+        """生成当前这一段（通常是一天）的记录，写入JSONL后清零"""
+        total_seconds = sum(self.stages.values())
+        io_seconds = sum(v for k, v in self.stages.items() if k in IO_STAGES)
+        cpu_seconds = total_seconds - io_seconds
+        lines = self.counters.get("lines", 0)
+
+        record = dict(fields)
+        record["stages"] = {k: round(v, 4) for k, v in self.stages.items()}
+        record.update(self.counters)
+        record["total_seconds"] = round(total_seconds, 4)
+        record["lines_per_sec"] = lines / total_seconds if total_seconds > 0 else 0
+        record["bytes_per_sec"] = self.counters.get("bytes", 0) / total_seconds if total_seconds > 0 else 0
+        record["match_rate"] = self.counters.get("matched_lines", 0) / lines if lines > 0 else 0
+        record["io_seconds"] = round(io_seconds, 4)
+        record["cpu_seconds"] = round(cpu_seconds, 4)
+        record["bound"] = "io" if io_seconds >= cpu_seconds else "cpu"
+        segment_peak = get_segment_peak_rss_mb() if self.peak_rss_resettable else None
+        record["peak_rss_mb"] = round(segment_peak, 1) if segment_peak is not None else None
+        self.lifetime_peak_rss_mb = max(self.lifetime_peak_rss_mb, segment_peak or 0, get_peak_rss_mb())
+        record["lifetime_peak_rss_mb"] = round(self.lifetime_peak_rss_mb, 1)
+
+        if self.output_path is not None:
+            os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+            with open(self.output_path, "a") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.reset()
+        return record
+
+
+def bench(name, func, n_lines, measure_memory=True):
+    """
+    运行 func 计时；measure_memory=True 时在 tracemalloc 下再运行一次取峰值内存（tracemalloc 会拖慢速度，不计入耗时）
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / (1 << 20)
+
+    result = {
+        "name": name,
+        "lines": n_lines,
+        "seconds": round(seconds, 4),
+        "lines_per_sec": n_lines / seconds if seconds > 0 else 0,
+        "peak_mb": round(peak_mb, 1) if peak_mb is not None else None,
+    }
+    peak_text = f"{peak_mb:8.1f} MB" if peak_mb is not None else "       -"
+    print(f"{name:<16} {n_lines:>10} lines {seconds:8.3f}s {result['lines_per_sec']:>12,.0f} lines/s {peak_text}")
+    return result
+
+
+def load_profile(path):
+    import pandas as pd
+
+    with open(path, "r") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    df = pd.json_normalize(records)
+    df.columns = [c.replace("stages.", "stage_") for c in df.columns]
+    return df
+
+
+def summarize_profile(path):
+    """
+    打印并保存汇总报告：各阶段总耗时及占比、整体吞吐量、最慢的几天及其瓶颈
+    汇总表保存为 {path}_summary.csv（每天一行）
+    """
+    df = load_profile(path)
+    stage_columns = [c for c in df.columns if c.startswith("stage_")]
+    stage_total = df[stage_columns].sum().sort_values(ascending=False)
+    total_seconds = df["total_seconds"].sum()
+
+    print(f"days: {len(df)}, total: {total_seconds:.1f}s")
+    for column, seconds in stage_total.items():
+        print(f"  {column[len('stage_'):]:<12}{seconds:>10.1f}s  {seconds / total_seconds:6.1%}")
+    if "lines" in df.columns:
+        print(f"lines/sec: {df['lines'].sum() / total_seconds:,.0f}")
+    if "bytes" in df.columns:
+        print(f"MB/sec: {df['bytes'].sum() / total_seconds / (1 << 20):,.1f}")
+    if "matched_lines" in df.columns and "lines" in df.columns:
+        print(f"match rate: {df['matched_lines'].sum() / df['lines'].sum():.4%}")
+    if "json_errors" in df.columns:
+        print(f"json errors: {int(df['json_errors'].sum())}")
+    if df["peak_rss_mb"].notna().any():
+        print(f"peak rss (largest day): {df['peak_rss_mb'].max():.1f} MB")
+    if "lifetime_peak_rss_mb" in df.columns:
+        print(f"lifetime peak rss: {df['lifetime_peak_rss_mb'].max():.1f} MB")
+    print(f"io-bound days: {(df['bound'] == 'io').sum()}, cpu-bound days: {(df['bound'] == 'cpu').sum()}")
+
+    slowest = df.sort_values("total_seconds", ascending=False).head(10)
+    print("slowest days:")
+    print(slowest[[c for c in ["date", "total_seconds", "bound", "lines_per_sec", "peak_rss_mb"] if c in df.columns]].to_string(index=False))
+
+    summary_path = f"{os.path.splitext(path)[0]}_summary.csv"
+    df.to_csv(summary_path, index=False)
+    print(f"saved to {summary_path}")
+    return df
+
+
+if __name__ == "__main__":
+    for profile_path in sys.argv[1:]:
+        summarize_profile(profile_path)
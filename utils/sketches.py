@@ -0,0 +1,256 @@
+"""
+有界内存的概率计数结构
+
+HyperLogLog：基数（去重计数）估计，可合并
+- p=12 时 4096 个 uint8 寄存器，每个 sketch 4KB
+- 相对标准误差约 1.04 / sqrt(2^p)，p=12 时约 1.6%（约95%的估计落在 ±3.3% 以内）
+- 两个 sketch 的合并（逐寄存器取最大值）等于对并集的估计，可以任意跨日期、跨关键词汇总
+
+CountMinSketch：任意元素的频次估计，只会高估
+- depth × width 的计数表，高估量不超过 e / width × 总数的概率约为 1 - e^(-depth)
+- 合并即计数表相加
+
+SpaceSaving：固定容量的 top-K（heavy hitters）
+- 最多跟踪 capacity 个元素，每个元素记录 count 和 error，真实频次在 [count - error, count] 之间
+- 频次超过 总数 / capacity 的元素一定在表中
+"""
+
+import heapq
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.utils import atomic_write_parquet
+
+HLL_PRECISION = 12
+
+
+def hash64(value):
+    """任意值的64位无符号哈希（按str编码）"""
+    digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def bit_length(values):
+    """uint64 数组逐元素的 bit_length（精确，不经过浮点）"""
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.uint8)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        high = values >= np.uint64(1 << shift)
+        lengths[high] += shift
+        values[high] >>= np.uint64(shift)
+    lengths[values > 0] += 1
+    return lengths
+
+
+class HyperLogLog(object):
+
+    def __init__(self, p=HLL_PRECISION, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """hashes: uint64 数组（已哈希的值）"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - bit_length(rest) + 1
+        np.maximum.at(self.registers, idx, rho.astype(np.uint8))
+
+    def update(self, values):
+        self.add_hashes(np.fromiter((hash64(v) for v in values), dtype=np.uint64))
+
+    def add(self, value):
+        self.update([value])
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError(f"cannot merge HyperLogLog with p={self.p} and p={other.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros > 0:
+            # 小基数时用线性计数
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, p=HLL_PRECISION):
+        return cls(p, np.frombuffer(data, dtype=np.uint8).copy())
+
+
+def build_sketches(keys, values, p=HLL_PRECISION):
+    """按 key 分组构建 sketch，返回 {key: HyperLogLog}；先分组，每个 key 只做一次向量化更新"""
+    grouped = {}
+    for key, value in zip(keys, values):
+        grouped.setdefault(key, []).append(value)
+    sketches = {}
+    for key, key_values in grouped.items():
+        sketches[key] = HyperLogLog(p)
+        sketches[key].update(key_values)
+    return sketches
+
+
+def write_sketch_table(file_path, sketches, key_name="key", extra_columns=None):
+    """
+    sketches: {key: HyperLogLog}，写为 parquet：key_name, [extra_columns], registers（bytes）
+    extra_columns: {列名: {key: 值}}
+    """
+    keys = list(sketches.keys())
+    df = pd.DataFrame({key_name: keys})
+    for column, mapping in (extra_columns or {}).items():
+        df[column] = [mapping.get(key) for key in keys]
+    df["registers"] = [sketches[key].to_bytes() for key in keys]
+    atomic_write_parquet(df, file_path, object_encoding={"registers": "bytes"})
+
+
+def read_sketch_table(file_path, p=HLL_PRECISION):
+    """返回 DataFrame，registers 列还原为 HyperLogLog 对象（列名 sketch）"""
+    df = pd.read_parquet(file_path, engine="fastparquet")
+    df["sketch"] = [HyperLogLog.from_bytes(bytes(data), p) for data in df["registers"]]
+    return df.drop(columns=["registers"])
+
+
+def merge_sketches(sketches, p=HLL_PRECISION):
+    merged = HyperLogLog(p)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+class CountMinSketch(object):
+
+    def __init__(self, width=2 ** 15, depth=4, table=None, total=0):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+        self.total = total
+
+    def _indices(self, items):
+        """每个元素在各行的列号：由一个64位哈希的高低32位做双重哈希，返回 (depth, n)"""
+        hashes = np.fromiter((hash64(item) for item in items), dtype=np.uint64)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, items):
+        items = list(items)
+        if not items:
+            return
+        idx = self._indices(items)
+        for row in range(self.depth):
+            np.add.at(self.table[row], idx[row], 1)
+        self.total += len(items)
+
+    def add(self, item, count=1):
+        idx = self._indices([item])
+        self.table[np.arange(self.depth), idx[:, 0]] += count
+        self.total += count
+
+    def estimate_many(self, items):
+        items = list(items)
+        if not items:
+            return np.zeros(0, dtype=np.int64)
+        idx = self._indices(items)
+        return self.table[np.arange(self.depth)[:, None], idx].min(axis=0)
+
+    def estimate(self, item):
+        return int(self.estimate_many([item])[0])
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge CountMinSketch of different shapes")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving(object):
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, item) 的最小堆，每个元素恰好一项；元素被累加后不立即更新，出堆时发现过期再放回
+        self.heap = []
+        self.total = 0
+
+    def add(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (count, item))
+            return
+        # 替换当前计数最小的元素，新元素继承其计数作为误差上界
+        while True:
+            min_count, victim = heapq.heappop(self.heap)
+            if self.counts[victim] == min_count:
+                break
+            heapq.heappush(self.heap, (self.counts[victim], victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[item] = min_count + count
+        self.errors[item] = min_count
+        heapq.heappush(self.heap, (min_count + count, item))
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def min_count(self):
+        """表未满时为0，否则为不在表中的元素频次的上界"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def top(self, n=None):
+        """按 count 降序返回 [(item, count, error)]"""
+        items = sorted(self.counts.items(), key=lambda x: -x[1])[:n]
+        return [(item, count, self.errors[item]) for item, count in items]
+
+    def merge(self, other):
+        """
+        合并两个摘要：只在一侧出现的元素，另一侧按其 min_count 计入 count 和 error（保持上界性质），再保留前 capacity 个
+        """
+        min_self, min_other = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.counts.get(item, min_self) + other.counts.get(item, min_other)
+            errors[item] = self.errors.get(item, min_self) + other.errors.get(item, min_other)
+        kept = sorted(counts, key=lambda x: -counts[x])[:self.capacity]
+        self.counts = {item: counts[item] for item in kept}
+        self.errors = {item: errors[item] for item in kept}
+        self.heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self.heap)
+        self.total += other.total
+        return self
+
+    def to_frame(self, key_name="item"):
+        return pd.DataFrame(self.top(), columns=[key_name, "count", "error"])
+
+    @classmethod
+    def from_frame(cls, df, capacity, total, key_name="item"):
+        summary = cls(capacity)
+        summary.counts = dict(zip(df[key_name], df["count"].astype(int)))
+        summary.errors = dict(zip(df[key_name], df["error"].astype(int)))
+        summary.heap = [(count, item) for item, count in summary.counts.items()]
+        heapq.heapify(summary.heap)
+        summary.total = total
+        return summary
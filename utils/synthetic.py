@@ -0,0 +1,319 @@
+"""
+合成的微博freshdata日文件，用于在没有GPFS原始数据时测试和压测抽取流程
+
+三种格式与 get_text_from_keyword.parse_line 对应：
+json - 2019-08-09 及以后：id\t{json}
+csv  - 2020-06-30：所有字段用双引号包裹、以逗号分隔
+tsv  - 2019-08-09 之前：tab分隔，至少24列
+
+用法：
+python -m utils.synthetic --date 2020-01-01 --lines 1000000 --match_rate 0.01 --pack
+生成 synthetic_data/2020/freshdata/weibo_freshdata.2020-01-01.7z，目录结构与 DATA_SOURCE_DIR 一致
+
+另外生成榜单快照文件 weibo_bangdan.{date}（格式见 bangdan_analysis.py 的文档），见 write_bangdan_file
+"""
+
+import os
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import py7zr
+
+# freshdata 的字段顺序，csv 和 tsv 格式按同样的下标取值（3 is_retweet, 8 weibo_id, 9 weibo_content, 22 r_weibo_content ...）
+FRESHDATA_FIELDS = [
+    "id", "crawler_time", "crawler_time_stamp", "is_retweet", "user_id", "nick_name", "tou_xiang", "user_type",
+    "weibo_id", "weibo_content", "zhuan", "ping", "zhan", "url", "device", "locate", "time", "time_stamp",
+    "r_user_id", "r_nick_name", "r_user_type", "r_weibo_id", "r_weibo_content", "r_zhuan", "r_ping", "r_zhan",
+    "r_url", "r_device", "r_location", "r_time", "r_time_stamp", "pic_content", "src", "tag", "vedio",
+    "vedio_image", "edited", "r_edited", "isLongText", "r_isLongText", "lat", "lon", "d",
+]
+
+USER_TYPES = ["普通用户", "黄V", "蓝V", "达人"]
+DEVICES = ["iPhone客户端", "Android", "微博 weibo.com", "Redmi Note 7 Pro", "HUAWEI Mate 30"]
+
+# 填充文本用的常用字，生成时会去掉关键词中出现的字，保证未命中的行不会意外命中
+FILLER_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出成会可主发年动同工也能下过民前面"
+    "样定现所二起政三好十战无农使性得家已明全长党外种事么问你见高将月分新向合些开四常次体如把正"
+    "今天气真很吧呢啊哦就都还没说看想去吃喝玩走跑听写读路车城街楼店书电影音乐风雨雪晴云花草树山水"
+)
+
+
+def get_layout(date):
+    """与 get_text_from_keyword.parse_line 的判断一致"""
+    if date == datetime(2020, 6, 30):
+        return "csv"
+    elif date >= datetime(2019, 8, 9):
+        return "json"
+    return "tsv"
+
+
+def get_filler_chars(keywords):
+    keyword_chars = set("".join(keywords))
+    return [c for c in FILLER_CHARS if c not in keyword_chars]
+
+
+def random_text(rng, filler_chars, length, inserts=()):
+    """长度约为length的随机文本，inserts 中的词插在随机位置"""
+    chars = rng.choices(filler_chars, k=max(length - sum(len(w) for w in inserts), 1))
+    for word in inserts:
+        chars.insert(rng.randrange(len(chars) + 1), word)
+    return "".join(chars)
+
+
+def make_record(rng, date, idx, filler_chars, retweet_ratio, line_length, inserts=()):
+    """一条微博，字段见 FRESHDATA_FIELDS；inserts 放进原创或转发内容中"""
+    record = {field: "" for field in FRESHDATA_FIELDS}
+    post_time = date + timedelta(seconds=rng.randrange(86400))
+    crawl_time = post_time + timedelta(seconds=rng.randrange(3600))
+    is_retweet = rng.random() < retweet_ratio
+    content_length = max(int(rng.gauss(line_length, line_length / 4)), 5)
+
+    record.update({
+        "id": str(40000000000 + idx),
+        "crawler_time": crawl_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "crawler_time_stamp": str(int(crawl_time.timestamp()) * 1000),
+        "is_retweet": "1" if is_retweet else "0",
+        "user_id": str(rng.randrange(1000000000, 7999999999)),
+        "nick_name": random_text(rng, filler_chars, 4),
+        "user_type": rng.choice(USER_TYPES),
+        "weibo_id": str(4400000000000000 + idx),
+        "zhuan": str(rng.randrange(100)),
+        "ping": str(rng.randrange(100)),
+        "zhan": str(rng.randrange(1000)),
+        "url": f"J{idx:08d}",
+        "device": rng.choice(DEVICES),
+        "time": post_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "time_stamp": str(int(post_time.timestamp())),
+        "src": "4",
+        "vedio": "0",
+        "edited": "0",
+        "isLongText": "0",
+        "d": date.strftime("%Y-%m-%d"),
+    })
+    if is_retweet:
+        # 转发：关键词可能出现在转发语或原微博中，与真实数据一致
+        own_inserts, r_inserts = ((), inserts) if rng.random() < 0.5 else (inserts, ())
+        record["weibo_content"] = random_text(rng, filler_chars, max(content_length // 4, 5), own_inserts)
+        record["r_user_id"] = str(rng.randrange(1000000000, 7999999999))
+        record["r_nick_name"] = random_text(rng, filler_chars, 4)
+        record["r_user_type"] = rng.choice(USER_TYPES)
+        record["r_weibo_id"] = str(4300000000000000 + rng.randrange(10 ** 14))
+        record["r_weibo_content"] = random_text(rng, filler_chars, content_length, r_inserts)
+        record["r_zhuan"], record["r_ping"], record["r_zhan"] = "0", "0", "0"
+    else:
+        record["weibo_content"] = random_text(rng, filler_chars, content_length, inserts)
+    return record
+
+
+def format_record(record, layout):
+    if layout == "json":
+        return f"{record['id']}\t{json.dumps(record, ensure_ascii=False)}"
+    values = [record[field] for field in FRESHDATA_FIELDS]
+    if layout == "csv":
+        return '"' + '","'.join(values) + '"'
+    return "\t".join(values)
+
+
+def iter_freshdata_lines(date, n_lines, child_keywords, quality_keywords, match_rate=0.01, retweet_ratio=0.4,
+                         line_length=80, seed=2025, layout=None):
+    """
+    逐行生成一天的数据
+    match_rate: 同时含子女关键词和品质关键词的行的比例；另有同样比例的行只含子女关键词（命中自动机1但最终不输出）
+    retweet_ratio: 转发微博比例
+    line_length: 微博正文的平均字数
+    """
+    rng = random.Random(f"{seed}-{date:%Y-%m-%d}")
+    layout = layout if layout is not None else get_layout(date)
+    filler_chars = get_filler_chars(list(child_keywords) + list(quality_keywords))
+    for idx in range(n_lines):
+        r = rng.random()
+        if r < match_rate:
+            inserts = (rng.choice(child_keywords), rng.choice(quality_keywords))
+        elif r < 2 * match_rate:
+            inserts = (rng.choice(child_keywords),)
+        else:
+            inserts = ()
+        record = make_record(rng, date, idx, filler_chars, retweet_ratio, line_length, inserts)
+        yield format_record(record, layout)
+
+
+def write_freshdata_file(file_path, date, n_lines, child_keywords, quality_keywords, **kwargs):
+    """写入一天的解压后文件，参数见 iter_freshdata_lines；返回 file_path"""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for line in iter_freshdata_lines(date, n_lines, child_keywords, quality_keywords, **kwargs):
+            f.write(line + "\n")
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def get_freshdata_member_name(date):
+    """压缩包内的文件名，与 get_text_from_keyword.get_unzipped_fresh_data_file 对应"""
+    date_str = date.strftime("%Y-%m-%d")
+    if date_str == "2020-06-30":
+        return "weibo_2020-06-30.csv"
+    elif date_str in ["2017-01-11", "2016-07-24", "2016-08-09"]:
+        return f"weibo_log/weibo_freshdata.{date_str}.csv"
+    return f"weibo_freshdata.{date_str}"
+
+
+def pack_7z(file_path, archive_path, arcname):
+    os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+    tmp_path = f"{archive_path}.tmp"
+    with py7zr.SevenZipFile(tmp_path, mode="w") as archive:
+        archive.write(file_path, arcname=arcname)
+    os.replace(tmp_path, archive_path)
+    return archive_path
+
+
+def write_freshdata_day(output_dir, date, n_lines, child_keywords, quality_keywords, pack=False, **kwargs):
+    """
+    按 DATA_SOURCE_DIR 的目录结构生成一天的数据：
+    {output_dir}/{year}/freshdata/{member}，pack=True 时再打包为 weibo_freshdata.{date}.7z 并删除原文件
+    返回生成的文件路径
+    """
+    member = get_freshdata_member_name(date)
+    folder = f"{output_dir}/{date.year}/freshdata"
+    file_path = write_freshdata_file(f"{folder}/{member}", date, n_lines, child_keywords, quality_keywords, **kwargs)
+    if not pack:
+        return file_path
+    archive_path = pack_7z(file_path, f"{folder}/weibo_freshdata.{date:%Y-%m-%d}.7z", member)
+    os.remove(file_path)
+    return archive_path
+
+
+def make_bangdan_topics(rng, filler_chars, n_topics, rear_keywords, rear_rate=0.05, short_rate=0.02):
+    """
+    一天的候选话题；rear_rate 的话题含有育儿关键词（& 规则的各部分都放进去），short_rate 的话题不超过5个字（解析时会被丢掉）
+    """
+    topics = []
+    for _ in range(n_topics):
+        r = rng.random()
+        if r < short_rate:
+            topics.append(random_text(rng, filler_chars, rng.randint(2, 5)))
+        elif r < short_rate + rear_rate:
+            words = tuple(w for w in rng.choice(rear_keywords).split("&") if w)
+            topics.append(random_text(rng, filler_chars, rng.randint(8, 20), words))
+        else:
+            topics.append(random_text(rng, filler_chars, rng.randint(6, 20)))
+    return topics
+
+
+def make_bangdan_payload(rng, topics, hot_base):
+    """内层 bangdan json：一个 card_type 11 的榜单卡片（card_group 中为 card_type 4 的话题），外加一个无关卡片"""
+    card_group = []
+    for rank, topic in enumerate(topics):
+        s_card = {"card_type": 4, "pic": "", "desc": topic}
+        r = rng.random()
+        if r < 0.9:
+            hot = int(hot_base / (rank + 1) * rng.uniform(0.8, 1.2))
+            s_card["desc_extr"] = hot if rng.random() < 0.5 else f"剧集 {hot}"
+        elif r < 0.95:
+            s_card["desc_extr"] = ""
+        card_group.append(s_card)
+    cards = [
+        {"card_type": 11, "title": "实时热点，每分钟更新一次", "show_type": 0, "card_group": card_group, "openurl": ""},
+        {"card_type": 58, "title": "", "card_group": [{"card_type": 4, "desc": "不在榜单中的卡片"}]},
+    ]
+    return {"cards": cards, "cardlistInfo": {"v_p": 42, "page": None}}
+
+
+def corrupt_bangdan_line(rng, line):
+    """注入几种线上出现过的坏行：截断、缺少tab、内层不是json、内层缺少cards"""
+    idx, raw_json = line.split("\t", 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return line[: rng.randrange(len(idx) + 2, len(line))]
+    elif kind == 1:
+        return raw_json
+    data = json.loads(raw_json)
+    data["bangdan"] = "<html>502 Bad Gateway</html>" if kind == 2 else json.dumps({"ok": 0}, ensure_ascii=False)
+    return f"{idx}\t{json.dumps(data, ensure_ascii=False)}"
+
+
+def iter_bangdan_lines(date, rear_keywords, snapshots=288, topics_per_snapshot=50, n_topics=300, type2_ratio=0.5,
+                       rear_rate=0.05, malformed_rate=0.001, seed=2025):
+    """
+    逐行生成一天的榜单快照
+    snapshots: 实时榜（type 1）快照数，默认每5分钟一次；每个快照之后以 type2_ratio 的概率跟一个热门榜（type 2）快照
+    每个实时榜快照取话题池中的一段滑动窗口，话题会在连续多个快照中上榜，排名随机扰动
+    malformed_rate: 坏行比例
+    """
+    rng = random.Random(f"{seed}-bangdan-{date:%Y-%m-%d}")
+    filler_chars = get_filler_chars(rear_keywords)
+    topics = make_bangdan_topics(rng, filler_chars, max(n_topics, topics_per_snapshot), rear_keywords, rear_rate)
+    step = (len(topics) - topics_per_snapshot) / max(snapshots - 1, 1)
+
+    for idx in range(snapshots):
+        # 实时榜之后按 type2_ratio 穿插一个热门榜
+        bangdan_types = ["1", "2"] if rng.random() < type2_ratio else ["1"]
+        for bangdan_type in bangdan_types:
+            if bangdan_type == "1":
+                start = int(idx * step)
+                window = topics[start:start + topics_per_snapshot]
+                if rng.random() < 0.3:
+                    window = rng.sample(window, len(window))
+            else:
+                window = rng.sample(topics, topics_per_snapshot)
+            crawl_time = date + timedelta(seconds=int(86400 * idx / snapshots) + rng.randrange(60))
+            data = {
+                "id": 61543 + idx * 2 + (bangdan_type == "2"),
+                "crawler_time": crawl_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "crawler_time_stamp": str(int(crawl_time.timestamp()) * 1000),
+                "type": bangdan_type,
+                "bangdan": json.dumps(make_bangdan_payload(rng, window, 5000000), ensure_ascii=False),
+                "date": date.strftime("%Y-%m-%d"),
+            }
+            line = f"{data['id']}\t{json.dumps(data, ensure_ascii=False)}"
+            if rng.random() < malformed_rate:
+                line = corrupt_bangdan_line(rng, line)
+            yield line
+
+
+def write_bangdan_file(output_dir, date, rear_keywords, **kwargs):
+    """写入 {output_dir}/{year}/weibo_bangdan.{date}，与 get_bangdan_unzipped_files_dir 的结构一致；参数见 iter_bangdan_lines"""
+    file_path = f"{output_dir}/{date.year}/weibo_bangdan.{date:%Y-%m-%d}"
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for line in iter_bangdan_lines(date, rear_keywords, **kwargs):
+            f.write(line + "\n")
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+if __name__ == "__main__":
+    from get_text_from_keyword import CHILD_KEYWORDS, QUALITY_KEYWORDS
+    from utils.utils import REAR_KEYWORDS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kind", type=str, default="freshdata", choices=["freshdata", "bangdan"])
+    parser.add_argument("--date", type=str, default="2020-01-01")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--match_rate", type=float, default=0.01)
+    parser.add_argument("--retweet_ratio", type=float, default=0.4)
+    parser.add_argument("--line_length", type=int, default=80)
+    parser.add_argument("--layout", type=str, default=None, choices=["json", "csv", "tsv"])
+    parser.add_argument("--snapshots", type=int, default=288)
+    parser.add_argument("--malformed_rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--output_dir", type=str, default="synthetic_data")
+    parser.add_argument("--pack", action="store_true")
+    args = parser.parse_args()
+    date = datetime.strptime(args.date, "%Y-%m-%d")
+    if args.kind == "bangdan":
+        path = write_bangdan_file(
+            args.output_dir, date, REAR_KEYWORDS, snapshots=args.snapshots,
+            malformed_rate=args.malformed_rate, seed=args.seed,
+        )
+    else:
+        path = write_freshdata_day(
+            args.output_dir, date, args.lines, CHILD_KEYWORDS, QUALITY_KEYWORDS,
+            pack=args.pack, match_rate=args.match_rate, retweet_ratio=args.retweet_ratio,
+            line_length=args.line_length, seed=args.seed, layout=args.layout,
+        )
+    print(f"written {path}")
@@ -1,6 +1,11 @@
 import os
 import re
+import time
+import zlib
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import py7zr
+import ahocorasick
 
 REAR_KEYWORDS = ["家庭教育", "家长", "育儿", "教育孩子", "培养孩子", "抚养", "穷养", "富养", "管教孩子", "管孩子", "带娃", "带孩子", "养育", "养娃", "养孩子", "教育方式", "挫折教育", "父母", "父亲", "母亲", "爸爸", "妈妈", "老爸", "老妈", "爸妈", "宝爸", "宝妈", "子女", "女儿", "儿子", "女孩", "男孩", "女童", "男童", "孙女", "孙子", "陪读", "孩子&学习", "辅导&作业", "辅导&功课", "孩子&养", "别人家&孩子"]
 
@@ -8,55 +13,250 @@ REAR_KEYWORDS = ["家庭教育", "家长", "育儿", "教育孩子", "培养孩
 STRICT_REAR_KEYWORDS = ["家庭教育", "家长", "育儿", "教育孩子", "培养孩子", "穷养", "富养", "管教孩子", "管孩子", "带娃", "带孩子", "养育", "养娃", "养孩子", "教育方式", "挫折教育", "宝爸", "宝妈", "子女", "陪读", "孩子&学习", "辅导&作业", "辅导&功课", "孩子&养", "别人家&孩子"]
 
 
-def extract_7z_files(source_folder, target_folder):
-    # 确保目标文件夹存在
-    if not os.path.exists(target_folder):
-        os.makedirs(target_folder)
+def file_crc32(file_path, chunk_size=1 << 20):
+    crc = 0
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
 
-    # 遍历源文件夹中的所有文件
-    for file_name in os.listdir(source_folder):
-        # 检查文件是否是.7z文件
-        if file_name.endswith(".7z"):
-            file_path = os.path.join(source_folder, file_name)
-            with py7zr.SevenZipFile(file_path, mode="r") as archive:
-                # 解压文件到目标文件夹
-                archive.extractall(path=target_folder)
-                print(f"Extracted: {file_name}")
+
+def is_member_extracted(target_folder, info, verify_crc=False):
+    """
+    压缩包中的一个文件是否已经完整解压：大小一致，verify_crc=True时再比较CRC
+    """
+    if info.is_directory:
+        return True
+    path = os.path.join(target_folder, info.filename)
+    if not os.path.exists(path) or os.path.getsize(path) != info.uncompressed:
+        return False
+    if verify_crc and info.crc32 is not None:
+        return file_crc32(path) == info.crc32
+    return True
 
 
-def extract_single_7z_file(file_path, target_folder):
+def extract_single_7z_file(file_path, target_folder, targets=None, resume=True, verify_crc=False):
+    """
+    解压单个7z文件
+    targets: 只解压压缩包内的这些文件（压缩包内的路径），None表示全部
+    resume: 目标文件已完整存在（大小一致，verify_crc时还比较CRC）则跳过
+    返回dict: file, status（success / skipped / error）, error, bytes（解压后字节数）, seconds
+    """
+    result = {"file": file_path, "status": "error", "error": None, "bytes": 0, "seconds": 0.0}
+    start_time = time.time()
+
     # 确保目标文件夹存在
-    if not os.path.exists(target_folder):
-        os.makedirs(target_folder)
+    os.makedirs(target_folder, exist_ok=True)
 
     # 检查文件是否是.7z文件
+    if not file_path.endswith(".7z"):
+        result["error"] = "not a .7z file"
+        return result
+
     try:
-        if file_path.endswith(".7z"):
-            with py7zr.SevenZipFile(file_path, mode="r") as archive:
+        with py7zr.SevenZipFile(file_path, mode="r") as archive:
+            members = [info for info in archive.list() if targets is None or info.filename in targets]
+            if targets is not None:
+                missing = set(targets) - {info.filename for info in members}
+                if missing:
+                    raise KeyError(f"members not in archive: {sorted(missing)}")
+            result["bytes"] = sum(info.uncompressed for info in members if not info.is_directory)
+
+            if resume and all(is_member_extracted(target_folder, info, verify_crc) for info in members):
+                result["status"] = "skipped"
+            elif targets is None:
                 # 解压文件到目标文件夹
                 archive.extractall(path=target_folder)
-                print(f"Extracted: {file_path}")
-                return "success"
-    except:
-        return None
+            else:
+                archive.extract(path=target_folder, targets=[info.filename for info in members])
+
+        if result["status"] != "skipped":
+            incomplete = [info.filename for info in members if not is_member_extracted(target_folder, info, verify_crc)]
+            if incomplete:
+                raise IOError(f"incomplete members after extraction: {incomplete}")
+            result["status"] = "success"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.time() - start_time
+    return result
+
+
+def format_extract_result(result):
+    mb = result["bytes"] / (1 << 20)
+    speed = mb / result["seconds"] if result["seconds"] > 0 else 0
+    line = f"{result['status']}: {result['file']} {mb:.1f} MB in {result['seconds']:.1f}s ({speed:.1f} MB/s)"
+    if result["error"] is not None:
+        line += f" error: {result['error']}"
+    return line
+
+
+def extract_7z_files(source_folder, target_folder, workers=4, targets=None, resume=True, verify_crc=False):
+    """
+    并行解压源文件夹中的所有.7z文件，最多同时解压workers个
+    每完成一个打印进度和吞吐量，最后打印汇总；返回每个压缩包的结果（见 extract_single_7z_file）
+    """
+    # 遍历源文件夹中的所有文件
+    file_paths = [
+        os.path.join(source_folder, file_name)
+        for file_name in sorted(os.listdir(source_folder))
+        # 检查文件是否是.7z文件
+        if file_name.endswith(".7z")
+    ]
+
+    results = []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(extract_single_7z_file, file_path, target_folder, targets, resume, verify_crc)
+            for file_path in file_paths
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(file_paths)}] {format_extract_result(result)}")
+
+    elapsed = time.time() - start_time
+    extracted_bytes = sum(r["bytes"] for r in results if r["status"] == "success")
+    errors = [r for r in results if r["status"] == "error"]
+    print(
+        f"Extracted {sum(r['status'] == 'success' for r in results)}, "
+        f"skipped {sum(r['status'] == 'skipped' for r in results)}, "
+        f"failed {len(errors)} archives in {elapsed:.1f}s, "
+        f"{extracted_bytes / (1 << 20) / elapsed if elapsed > 0 else 0:.1f} MB/s"
+    )
+    for r in errors:
+        print(f"Failed: {r['file']}: {r['error']}")
+    return results
+
+
+# weibo_text_cleaner 使用的正则，模块加载时编译一次
+WEIBO_TEXT_PATTERN = re.compile(
+    r"[a-zA-Z0-9.?/&=:_%,-~#《》]", re.S
+)  # 。，：；“”‘’【】（） ]', re.S)
+# WEIBO_TEXT_PATTERN = re.compile(r'[http|https]*://[a-zA-Z0-9.?/&=:_%,-~]*', re.S)
+WEIBO_MENTION_PATTERN = re.compile(r"[//@].*?[:]", re.S)
+
+# 清洗时直接删除的字符串
+WEIBO_TEXT_REMOVALS = ["“", "”", "…", "点击链接查看更多->"]
 
 
 def weibo_text_cleaner(sentence):
     if len(sentence) < 10:
         return None
-    sentence = sentence.replace("“", "")
-    sentence = sentence.replace("”", "")
-    sentence = sentence.replace("…", "")
-    sentence = sentence.replace("点击链接查看更多->", "")
-    results = re.compile(
-        r"[a-zA-Z0-9.?/&=:_%,-~#《》]", re.S
-    )  # 。，：；“”‘’【】（） ]', re.S)
-    # results = re.compile(r'[http|https]*://[a-zA-Z0-9.?/&=:_%,-~]*', re.S)
-    sentence = re.sub(results, "", sentence)
-    results2 = re.compile(r"[//@].*?[:]", re.S)
-    sentence = re.sub(results2, "", sentence)
+    for removal in WEIBO_TEXT_REMOVALS:
+        sentence = sentence.replace(removal, "")
+    sentence = re.sub(WEIBO_TEXT_PATTERN, "", sentence)
+    sentence = re.sub(WEIBO_MENTION_PATTERN, "", sentence)
     sentence = sentence.replace("\n", " ")
     sentence = sentence.strip()
     if len(sentence) < 10:
         return None
-    return sentence
\ No newline at end of file
+    return sentence
+
+
+def split_retweet(series):
+    """向量化地去除转发部分，只保留 // 之前的原创内容"""
+    return series.str.split("//", n=1).str[0]
+
+
+def clean_weibo_text_series(series):
+    """
+    weibo_text_cleaner 的向量化版本，输入输出都是 pandas.Series
+    清洗前或清洗后长度不足10的返回None
+    """
+    series = series.fillna("")
+    too_short = series.str.len() < 10
+    for removal in WEIBO_TEXT_REMOVALS:
+        series = series.str.replace(removal, "", regex=False)
+    series = series.str.replace(WEIBO_TEXT_PATTERN, "", regex=True)
+    series = series.str.replace(WEIBO_MENTION_PATTERN, "", regex=True)
+    series = series.str.replace("\n", " ", regex=False).str.strip()
+    return series.where(~too_short & (series.str.len() >= 10), None)
+
+
+def atomic_write_parquet(df, file_path, metadata=None, **kwargs):
+    """
+    先写入临时文件再rename，写入中途崩溃不会破坏原文件
+    metadata 为写入parquet文件尾的自定义键值对（如清洗版本）
+    kwargs 透传给 fastparquet（如 object_encoding）
+    """
+    tmp_path = f"{file_path}.tmp"
+    df.to_parquet(tmp_path, engine="fastparquet", index=False, custom_metadata=metadata, **kwargs)
+    os.replace(tmp_path, file_path)
+
+
+def read_parquet_metadata(file_path):
+    """读取parquet文件尾的自定义键值对（不含pandas写入的schema），可以合并新的键后再传给 atomic_write_parquet"""
+    from fastparquet import ParquetFile
+    return {k: v for k, v in ParquetFile(file_path).key_value_metadata.items() if k != "pandas"}
+
+
+def text_hash(text):
+    """
+    文本的64位哈希（有符号，便于存为parquet的int64列），用于大规模去重时代替原文
+    """
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class KeywordMatcher(object):
+    """
+    把多组关键词规则编译成一个 Aho-Corasick 自动机，一次扫描得到所有命中的规则
+
+    rules: dict，key为规则组名（如 "rear"、"delete"、"save"），value为关键词列表
+    关键词可以用 & 连接表示"同时出现"，例如 "孩子&学习"
+
+    例如：
+    matcher = KeywordMatcher({"rear": STRICT_REAR_KEYWORDS, "delete": DELETE_KEYWORD})
+    matcher.match("别人家的孩子又在学习")
+    # {"rear": ["孩子&学习", "别人家&孩子"], "delete": []}
+    """
+
+    def __init__(self, rules):
+        self.rules = {name: list(keywords) for name, keywords in rules.items()}
+        # 每条规则拆成的原子词集合
+        self.rule_words = {}
+        word_to_rules = {}
+        for name, keywords in self.rules.items():
+            for keyword in keywords:
+                words = frozenset(word for word in keyword.split("&") if word)
+                self.rule_words[(name, keyword)] = words
+                for word in words:
+                    word_to_rules.setdefault(word, set()).add((name, keyword))
+
+        self.automaton = ahocorasick.Automaton()
+        for word, rule_keys in word_to_rules.items():
+            self.automaton.add_word(word, (word, tuple(rule_keys)))
+        if word_to_rules:
+            self.automaton.make_automaton()
+
+    def match(self, text):
+        """
+        返回 {规则组名: [命中的关键词（原始写法，含&）]}，每个规则组都有key，未命中为空列表
+        """
+        fired = {name: [] for name in self.rules}
+        if not text or len(self.automaton) == 0:
+            return fired
+
+        found_words = set()
+        candidates = set()
+        for _, (word, rule_keys) in self.automaton.iter(text):
+            if word in found_words:
+                continue
+            found_words.add(word)
+            candidates.update(rule_keys)
+
+        for name, keyword in candidates:
+            if self.rule_words[(name, keyword)] <= found_words:
+                fired[name].append(keyword)
+        for name in fired:
+            fired[name].sort(key=self.rules[name].index)
+        return fired
+
+    def search(self, text, name):
+        """text 是否命中规则组 name 中的任意一条规则"""
+        return len(self.match(text)[name]) > 0
@@ -0,0 +1,216 @@
+"""
+全平台词频基线：在全部微博（不只是育儿子集）上做有界内存的 heavy hitters 统计，作为育儿相关词频的对照（lift）
+
+word_baseline/
+|-2020-01-01_cms.npy      # CountMinSketch 计数表，任意词的频次估计（只会高估）
+|-2020-01-01_topk.parquet # SpaceSaving 的前 TOPK_CAPACITY 个词：word, count, error；文件尾记录 n_posts / n_tokens，最后写入
+|-2020-01.{cms.npy,topk.parquet}   # 当月各天合并的结果
+
+每天的内存上限约为 CMS_DEPTH × CMS_WIDTH × 8 字节 + TOPK_CAPACITY 个词，与当天的微博量无关
+文本口径与育儿子集的 cleaned_weibo_content 相同：weibo_content 去掉 // 之后的转发部分，再经 clean_weibo_text_series 清洗（长度不足10的丢弃）
+之后的分词与 keyword_identify_and_cluster 相同（清洗 + jieba + 长度和停用词过滤）
+
+用法：
+python word_baseline.py --years 2020 2021 --workers 8
+python get_text_from_keyword.py --source corpus --baseline ...   # 或在抽取关键词的同一次扫描中顺带统计
+"""
+
+import os
+import re
+import argparse
+import calendar
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from utils.utils import atomic_write_parquet, read_parquet_metadata, split_retweet, clean_weibo_text_series
+from utils.sketches import CountMinSketch, SpaceSaving
+from utils.corpus import CORPUS_DIR, corpus_partition_exists, iter_corpus_batches
+
+BASELINE_DIR = "word_baseline"
+TOPK_CAPACITY = 20000
+CMS_WIDTH = 2 ** 16
+CMS_DEPTH = 4
+STOPWORDS_FILE = "stopwords.txt"
+
+_jieba_ready = False
+
+
+def init_jieba():
+    """初始化jieba并加入微博特殊词汇，每个进程一次"""
+    global _jieba_ready
+    if _jieba_ready:
+        return
+    jieba.initialize()
+    jieba.add_word('鸡娃', freq=2000)
+    jieba.add_word('双减', freq=2000)
+    jieba.suggest_freq(('亲子', '教育'), True)
+    _jieba_ready = True
+
+
+def load_stopwords(filepath=STOPWORDS_FILE):
+    if not os.path.exists(filepath):
+        return set()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f}
+
+
+def clean_text(text):
+    """移除URL、@用户、话题标签，以及中文标点以外的特殊符号"""
+    if not isinstance(text, str):
+        return ""
+    text = re.sub(r'(https?://\S+|@\w+|#\w+#)', '', text)
+    text = re.sub(r'[^\w\u4e00-\u9fff\，\。\！\？]', '', text)
+    return text.strip()
+
+
+def tokenize(text, stopwords):
+    words = []
+    for word in jieba.cut(clean_text(text)):
+        word = word.strip()
+        if len(word) > 1 and word not in stopwords:
+            words.append(word)
+    return words
+
+
+class WordBaseline(object):
+    """
+    一段时间内的全平台词频摘要：SpaceSaving 给出 top-K，CountMinSketch 估计不在 top-K 中的词
+    """
+
+    def __init__(self, topk=None, cms=None, n_posts=0, stopwords=None):
+        self.topk = topk if topk is not None else SpaceSaving(TOPK_CAPACITY)
+        self.cms = cms if cms is not None else CountMinSketch(CMS_WIDTH, CMS_DEPTH)
+        self.n_posts = n_posts
+        self.stopwords = stopwords
+
+    def update(self, texts):
+        """texts: 原始 weibo_content，先按 text_file_cleaner 的方式得到 cleaned_weibo_content 再分词"""
+        if self.stopwords is None:
+            init_jieba()
+            self.stopwords = load_stopwords()
+        texts = clean_weibo_text_series(split_retweet(pd.Series(list(texts), dtype=object)))
+        batch_words = []
+        for text in texts:
+            if not text:
+                continue
+            words = tokenize(text, self.stopwords)
+            self.topk.update(words)
+            batch_words.extend(words)
+            self.n_posts += 1
+        # CountMinSketch 按批向量化更新
+        self.cms.update(batch_words)
+
+    @property
+    def n_tokens(self):
+        return self.cms.total
+
+    def merge(self, other):
+        self.topk.merge(other.topk)
+        self.cms.merge(other.cms)
+        self.n_posts += other.n_posts
+        return self
+
+    def estimate(self, words):
+        """
+        词频估计：在 top-K 中的取 SpaceSaving 的计数，否则取 CountMinSketch 的估计（两者都是上界，取较小者）
+        """
+        words = list(words)
+        estimates = self.cms.estimate_many(words)
+        return np.array([
+            min(self.topk.counts.get(word, estimate), estimate) for word, estimate in zip(words, estimates)
+        ], dtype=np.int64)
+
+    def save(self, key, baseline_dir=BASELINE_DIR):
+        """key 为日期或月份；topk.parquet 最后写入，存在即说明结果完整"""
+        os.makedirs(baseline_dir, exist_ok=True)
+        cms_path = f"{baseline_dir}/{key}_cms.npy"
+        with open(f"{cms_path}.tmp", "wb") as f:
+            np.save(f, self.cms.table)
+        os.replace(f"{cms_path}.tmp", cms_path)
+        metadata = {"n_posts": str(self.n_posts), "n_tokens": str(self.n_tokens), "capacity": str(self.topk.capacity)}
+        atomic_write_parquet(self.topk.to_frame("word"), f"{baseline_dir}/{key}_topk.parquet", metadata=metadata)
+
+    @classmethod
+    def load(cls, key, baseline_dir=BASELINE_DIR):
+        topk_path = f"{baseline_dir}/{key}_topk.parquet"
+        metadata = read_parquet_metadata(topk_path)
+        n_tokens = int(metadata["n_tokens"])
+        topk = SpaceSaving.from_frame(
+            pd.read_parquet(topk_path, engine="fastparquet"), int(metadata["capacity"]), n_tokens, key_name="word"
+        )
+        table = np.load(f"{baseline_dir}/{key}_cms.npy")
+        cms = CountMinSketch(table.shape[1], table.shape[0], table, n_tokens)
+        return cls(topk, cms, int(metadata["n_posts"]))
+
+
+def baseline_exists(key, baseline_dir=BASELINE_DIR):
+    return os.path.exists(f"{baseline_dir}/{key}_topk.parquet")
+
+
+def count_day(date_str, corpus_dir=CORPUS_DIR, baseline_dir=BASELINE_DIR):
+    """一天的全平台词频摘要，已存在时跳过"""
+    if baseline_exists(date_str, baseline_dir):
+        return "skipped"
+    if not corpus_partition_exists(date_str, corpus_dir):
+        return "missing"
+    baseline = WordBaseline()
+    for batch in iter_corpus_batches(date_str, columns=["weibo_content"], corpus_dir=corpus_dir):
+        baseline.update(batch.column(0).to_pylist())
+    baseline.save(date_str, baseline_dir)
+    return "counted"
+
+
+def build_month(month, baseline_dir=BASELINE_DIR):
+    """
+    month: yyyy-mm，合并当月已有的日摘要；没有任何日摘要时返回None
+    """
+    year, month_num = map(int, month.split("-"))
+    n_days = calendar.monthrange(year, month_num)[1]
+    merged = None
+    for day in range(1, n_days + 1):
+        date_str = f"{month}-{day:02d}"
+        if not baseline_exists(date_str, baseline_dir):
+            continue
+        baseline = WordBaseline.load(date_str, baseline_dir)
+        merged = baseline if merged is None else merged.merge(baseline)
+    if merged is not None:
+        merged.save(month, baseline_dir)
+    return merged
+
+
+def load_month_baseline(month, baseline_dir=BASELINE_DIR):
+    """读取月度基线，不存在时由日摘要合并"""
+    if baseline_exists(month, baseline_dir):
+        return WordBaseline.load(month, baseline_dir)
+    return build_month(month, baseline_dir)
+
+
+def build_baseline(years, workers=4, corpus_dir=CORPUS_DIR, baseline_dir=BASELINE_DIR):
+    dates = []
+    for year in years:
+        start_date = datetime(year, 1, 1)
+        dates += [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((datetime(year, 12, 31) - start_date).days + 1)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(count_day, date_str, corpus_dir, baseline_dir): date_str for date_str in dates}
+        for future in as_completed(futures):
+            status = future.result()
+            if status == "counted":
+                print(f"counted {futures[future]}")
+
+    for month in sorted({date_str[:7] for date_str in dates}):
+        if build_month(month, baseline_dir) is not None:
+            print(f"merged {month}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2024)))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--corpus_dir", type=str, default=CORPUS_DIR)
+    args = parser.parse_args()
+    build_baseline(args.years, args.workers, args.corpus_dir)